@@ -0,0 +1,3 @@
+"""
+Benchmarks of decoding and encoding ITF traces.
+"""
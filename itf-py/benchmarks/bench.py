@@ -0,0 +1,193 @@
+"""
+Benchmarks of decoding and encoding ITF traces.
+
+Run from the directory `itf-py`:
+
+    python -m benchmarks.bench --save baseline.json
+    python -m benchmarks.bench --compare baseline.json
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from itf_py import trace_from_json, trace_to_json, value_from_json, value_to_json
+from itf_py.iterative import value_from_json_iterative, value_to_json_iterative
+
+from .synthetic import synthetic_trace
+
+TFTP_TRACE = Path(__file__).parents[2] / "examples" / "tftp-trace.itf.json"
+
+
+@dataclass
+class Result:
+    """The measurements of a single benchmark."""
+
+    name: str
+    seconds: float
+    states_per_sec: float
+    mb_per_sec: float
+    peak_mb: float
+    allocated_blocks: int
+
+
+def measure(
+    name: str,
+    fun: Callable[[], Any],
+    num_states: int,
+    num_bytes: int,
+    repeat: int,
+) -> Result:
+    """Measure the best time of `fun` over `repeat` runs, and its peak memory
+    and the number of memory blocks that are held by its result."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = fun()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+
+    return Result(
+        name=name,
+        seconds=best,
+        states_per_sec=num_states / best,
+        mb_per_sec=num_bytes / best / 1e6,
+        peak_mb=peak / 1e6,
+        allocated_blocks=blocks,
+    )
+
+
+def bench_trace(label: str, data: Dict[str, Any], repeat: int) -> List[Result]:
+    """Benchmark decoding, encoding, and the round trip of a trace."""
+    text = json.dumps(data)
+    num_bytes = len(text.encode("utf-8"))
+    num_states = len(data["states"])
+    trace = trace_from_json(data)
+
+    def roundtrip() -> str:
+        return json.dumps(trace_to_json(trace_from_json(json.loads(text))))
+
+    raw_values = [v for s in data["states"] for k, v in s.items() if k != "#meta"]
+    values = [v for s in trace.states for v in s.values.values()]
+
+    cases: List[Tuple[str, Callable[[], Any]]] = [
+        ("trace_from_json", lambda: trace_from_json(data)),
+        ("trace_to_json", lambda: trace_to_json(trace)),
+        ("roundtrip", roundtrip),
+        # the recursive and the iterative implementations over the same values
+        ("value_from_json", lambda: [value_from_json(v) for v in raw_values]),
+        (
+            "value_from_json_iterative",
+            lambda: [value_from_json_iterative(v) for v in raw_values],
+        ),
+        ("value_to_json", lambda: [value_to_json(v) for v in values]),
+        (
+            "value_to_json_iterative",
+            lambda: [value_to_json_iterative(v) for v in values],
+        ),
+    ]
+    return [
+        measure(f"{label}/{name}", fun, num_states, num_bytes, repeat)
+        for name, fun in cases
+    ]
+
+
+def print_results(
+    results: List[Result], baseline: Optional[Dict[str, Dict[str, Any]]]
+) -> None:
+    header = f"{'benchmark':<36} {'states/s':>12} {'MB/s':>8} {'peak MB':>8}"
+    header += f" {'blocks':>9}"
+    if baseline is not None:
+        header += f" {'vs base':>8}"
+    print(header)
+    for r in results:
+        line = f"{r.name:<36} {r.states_per_sec:>12.0f} {r.mb_per_sec:>8.2f}"
+        line += f" {r.peak_mb:>8.2f} {r.allocated_blocks:>9}"
+        if baseline is not None:
+            base = baseline.get(r.name)
+            if base is None:
+                line += f" {'n/a':>8}"
+            else:
+                # above 1.0 means that the benchmark has become slower
+                line += f" {r.seconds / base['seconds']:>7.2f}x"
+        print(line)
+
+
+def find_regressions(
+    results: List[Result], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """Find the benchmarks that are slower than the baseline beyond the tolerance."""
+    return [
+        r.name
+        for r in results
+        if r.name in baseline
+        and r.seconds > baseline[r.name]["seconds"] * (1.0 + tolerance)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--states", type=int, default=1000)
+    parser.add_argument("--set-size", type=int, default=10)
+    parser.add_argument("--map-size", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--bigint-density", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="save the results to a JSON file")
+    parser.add_argument("--compare", help="compare with the results in a JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="the slowdown that is reported as a regression, default 0.2",
+    )
+    args = parser.parse_args(argv)
+
+    with open(TFTP_TRACE, "r") as f:
+        tftp = json.load(f)
+    synthetic = synthetic_trace(
+        states=args.states,
+        set_size=args.set_size,
+        map_size=args.map_size,
+        depth=args.depth,
+        bigint_density=args.bigint_density,
+    )
+    results = bench_trace("tftp", tftp, args.repeat)
+    results += bench_trace("synthetic", synthetic, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({r.name: asdict(r) for r in results}, f, indent=2)
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
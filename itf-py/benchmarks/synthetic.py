@@ -0,0 +1,109 @@
+"""
+Generator of synthetic ITF traces with tunable shapes.
+"""
+
+import random
+from typing import Any, Dict, List
+
+# the integers beyond this bound do not fit into 64 bits
+_BIG = 2**64
+
+
+def _int_json(rnd: random.Random, bigint_density: float) -> Dict[str, str]:
+    if rnd.random() < bigint_density:
+        return {"#bigint": str(_BIG + rnd.randrange(_BIG))}
+    return {"#bigint": str(rnd.randrange(1000))}
+
+
+def _nested_json(rnd: random.Random, depth: int, bigint_density: float) -> Any:
+    """A value nested `depth` times: records, tuples, and sequences in turn."""
+    if depth == 0:
+        return _int_json(rnd, bigint_density)
+    inner = _nested_json(rnd, depth - 1, bigint_density)
+    if depth % 3 == 0:
+        return {"next": inner, "tag_": f"n{depth}"}
+    elif depth % 3 == 1:
+        return {"#tup": [inner, f"t{depth}"]}
+    else:
+        return [inner]
+
+
+def _nested_type(depth: int) -> str:
+    if depth == 0:
+        return "Int"
+    inner = _nested_type(depth - 1)
+    if depth % 3 == 0:
+        return f"{{ next: {inner}, tag_: Str }}"
+    elif depth % 3 == 1:
+        return f"<<{inner}, Str>>"
+    else:
+        return f"Seq({inner})"
+
+
+def synthetic_trace(
+    states: int = 1000,
+    set_size: int = 10,
+    map_size: int = 10,
+    depth: int = 3,
+    bigint_density: float = 0.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Generate the JSON of a trace whose consecutive states differ slightly,
+    as in the traces produced by model checkers.
+
+    Every state has a clock, a set of records, a map from integers to sets,
+    a variant of the last action, and a value nested `depth` levels deep.
+    The fraction `bigint_density` of integers do not fit into 64 bits."""
+    rnd = random.Random(seed)
+
+    def new_record() -> Dict[str, Any]:
+        # Apalache writes the record fields in the alphabetical order
+        return {
+            "active": rnd.random() < 0.5,
+            "id": _int_json(rnd, bigint_density),
+            "name": f"p{rnd.randrange(100)}",
+        }
+
+    procs = [new_record() for _ in range(set_size)]
+    table: Dict[int, List[Any]] = {
+        k: [_int_json(rnd, bigint_density) for _ in range(3)] for k in range(map_size)
+    }
+    raw_states = []
+    for i in range(states):
+        # change a few elements, as a single transition would do
+        if procs:
+            procs[rnd.randrange(len(procs))] = new_record()
+        if table:
+            table[rnd.randrange(len(table))] = [_int_json(rnd, bigint_density)]
+        if rnd.random() < 0.5:
+            action = {"tag": "Tick", "value": {"delta": _int_json(rnd, 0.0)}}
+        else:
+            action = {"tag": "Init", "value": "u_OF_UNIT"}
+        raw_states.append(
+            {
+                "#meta": {"index": i},
+                "clock": {"#bigint": str(i)},
+                "procs": {"#set": list(procs)},
+                "table": {
+                    "#map": [
+                        [{"#bigint": str(k)}, {"#set": list(v)}]
+                        for k, v in table.items()
+                    ]
+                },
+                "lastAction": action,
+                "nested": _nested_json(rnd, depth, bigint_density),
+            }
+        )
+
+    var_types = {
+        "clock": "Int",
+        "procs": "Set({ active: Bool, id: Int, name: Str })",
+        "table": "(Int -> Set(Int))",
+        "lastAction": "Init(UNIT) | Tick({ delta: Int })",
+        "nested": _nested_type(depth),
+    }
+    return {
+        "#meta": {"format": "ITF", "varTypes": var_types},
+        "vars": list(var_types.keys()),
+        "states": raw_states,
+    }
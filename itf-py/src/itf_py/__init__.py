@@ -2,10 +2,40 @@
 Python library to parse and emit Apalache ITF traces.
 """
 
+from .aio import aiter_states
+from .binary import BinaryTrace, open_binary_trace, write_binary_trace
+from .cache import load_trace
+from .columnar import ColumnarTrace, extract_ints
+from .corpus import TraceCorpus
+from .delta import DeltaTrace, trace_from_delta, trace_to_delta
+from .diff import Change, StateDiff, TraceDiff, diff_states, diff_traces, diff_values
+from .fingerprint import (
+    Fingerprinter,
+    find_loop,
+    find_repeated_states,
+    state_fingerprint,
+    validate_loop,
+    value_fingerprint,
+)
+from .instrument import (
+    Profile,
+    Profiler,
+    profile_trace_from_json,
+    profile_trace_to_json,
+)
+from .iterative import value_from_json_iterative, value_to_json_iterative
 from .itf import (
+    LazyValues,
+    SlotValues,
     State,
     Trace,
+    ValuePool,
+    VarIndex,
+    compile_decoder,
+    compile_var_decoders,
     itf_variant,
+    record_class_cache_clear,
+    record_class_cache_info,
     state_from_json,
     state_to_json,
     trace_from_json,
@@ -13,16 +43,96 @@ from .itf import (
     value_from_json,
     value_to_json,
 )
+from .jsonio import available_backends, dump, dumps, load, loads
+from .parallel import (
+    LoadResult,
+    decode_trace_parallel,
+    load_trace_parallel,
+    load_traces,
+)
+from .persistent import PMap, PSet
+from .query import TraceQuery
+from .shard import (
+    ShardedTrace,
+    ShardedTraceWriter,
+    merge_sharded_trace,
+    open_sharded_trace,
+    write_sharded_trace,
+)
+from .stream import TraceHeader, iter_raw_states, iter_states, read_trace_header
+from .vartypes import parse_type
+from .writer import dump_trace, value_to_text
 
 __version__ = "0.2.1"
 __all__ = [
+    "BinaryTrace",
+    "Change",
+    "ColumnarTrace",
+    "DeltaTrace",
+    "Fingerprinter",
+    "LazyValues",
+    "LoadResult",
+    "PMap",
+    "PSet",
+    "Profile",
+    "Profiler",
+    "ShardedTrace",
+    "ShardedTraceWriter",
+    "SlotValues",
     "State",
+    "StateDiff",
     "Trace",
+    "TraceCorpus",
+    "TraceDiff",
+    "TraceHeader",
+    "TraceQuery",
+    "ValuePool",
+    "VarIndex",
+    "aiter_states",
+    "available_backends",
+    "compile_decoder",
+    "compile_var_decoders",
+    "decode_trace_parallel",
+    "diff_states",
+    "diff_traces",
+    "diff_values",
+    "dump",
+    "dump_trace",
+    "dumps",
+    "extract_ints",
+    "find_loop",
+    "find_repeated_states",
     "itf_variant",
+    "iter_raw_states",
+    "iter_states",
+    "load",
+    "load_trace",
+    "load_trace_parallel",
+    "load_traces",
+    "loads",
+    "merge_sharded_trace",
+    "open_binary_trace",
+    "open_sharded_trace",
+    "parse_type",
+    "profile_trace_from_json",
+    "profile_trace_to_json",
+    "read_trace_header",
+    "record_class_cache_clear",
+    "record_class_cache_info",
+    "state_fingerprint",
     "state_from_json",
     "state_to_json",
+    "trace_from_delta",
     "trace_from_json",
+    "trace_to_delta",
     "trace_to_json",
+    "validate_loop",
+    "value_fingerprint",
     "value_from_json",
+    "value_from_json_iterative",
     "value_to_json",
+    "value_to_json_iterative",
+    "value_to_text",
+    "write_binary_trace",
+    "write_sharded_trace",
 ]
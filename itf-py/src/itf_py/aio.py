@@ -0,0 +1,76 @@
+"""
+Reading ITF traces in asyncio services, one state at a time.
+"""
+
+import asyncio
+import codecs
+from concurrent.futures import Executor
+from typing import AsyncIterator, Dict, List, Optional
+
+from .itf import Decoder, State, compile_var_decoders, state_from_json
+from .stream import CHUNK_SIZE, TraceScanner
+
+
+class _ChunkDecoder:
+    """Decodes the states that are completed by every chunk of bytes.
+    The chunks are decoded one after another, in one thread at a time."""
+
+    def __init__(self) -> None:
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._scanner = TraceScanner()
+        self._decoders: Dict[str, Decoder] = {}
+
+    def decode(self, chunk: bytes) -> List[State]:
+        """Feed the next chunk, or the end of the text if the chunk is empty,
+        and decode the completed states."""
+        if chunk:
+            self._scanner.feed(self._text.decode(chunk))
+        else:
+            self._scanner.feed(self._text.decode(b"", final=True))
+            self._scanner.feed_eof()
+        states = []
+        for kind, payload in self._scanner.events():
+            if kind == "state":
+                states.append(state_from_json(payload, self._decoders))
+            elif payload[0] == "#meta" and isinstance(payload[1], dict):
+                self._decoders = compile_var_decoders(payload[1])
+        return states
+
+
+async def aiter_states(
+    reader: asyncio.StreamReader,
+    chunk_size: int = CHUNK_SIZE,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[State]:
+    """Deserialize the states of an ITF trace that arrives over a stream,
+    e.g., a socket or a pipe, yielding the states as soon as they are complete:
+
+        async for state in aiter_states(reader):
+            ...
+
+    The JSON text is scanned and decoded in the executor, by default, in the
+    thread pool of the event loop, so the loop is not blocked by large states.
+    While a chunk is decoded and its states are consumed, the next chunk is
+    read. No more text is read until the states of the previous chunk have
+    been consumed, so a slow
+    consumer makes the stream apply back-pressure to the sender.
+    As in `iter_states`, if `#meta.varTypes` precedes the states, the states
+    are decoded according to the variable types."""
+    loop = asyncio.get_running_loop()
+    decoder = _ChunkDecoder()
+    chunk = await reader.read(chunk_size)
+    while True:
+        decoded = loop.run_in_executor(executor, decoder.decode, chunk)
+        if not chunk:
+            for state in await decoded:
+                yield state
+            return
+        # the states that are complete are yielded while the next chunk is
+        # being read, instead of waiting for the next chunk to arrive
+        reading = asyncio.ensure_future(reader.read(chunk_size))
+        try:
+            for state in await decoded:
+                yield state
+            chunk = await reading
+        finally:
+            reading.cancel()
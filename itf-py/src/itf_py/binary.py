@@ -0,0 +1,386 @@
+"""
+Compact binary container of ITF traces with memory-mapped random access.
+
+The file layout is as follows:
+
+    magic "ITFB", version (4 bytes)
+    states: the encoded states, one after another
+    string table: offsets (n + 1 unsigned 64-bit ints), then UTF-8 bytes
+    state index: offsets of the states (unsigned 64-bit ints)
+    header: JSON of `#meta`, `params`, `vars`, `loop`, and the record shapes
+    footer: offsets and sizes of the above sections, and the magic "ITFB"
+
+A state is encoded as the length and the JSON of its `#meta`, followed by
+the number of variables and pairs of a variable name and its value.
+Strings are stored in the string table once and referenced by their index.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .itf import (
+    ImmutableDict,
+    ImmutableList,
+    ITFUnserializable,
+    State,
+    Trace,
+    _record_classes,
+    value_from_json,
+    value_to_json,
+)
+from .persistent import PMap, PSet
+
+MAGIC = b"ITFB"
+VERSION = 1
+
+_PREAMBLE = struct.Struct("<4sI")
+_FOOTER = struct.Struct("<QQQQQ4s")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+
+# the tags of the encoded values
+_FALSE = 0
+_TRUE = 1
+_NONE = 2
+_INT = 3
+_BIGINT = 4
+_STR = 5
+_LIST = 6
+_TUPLE = 7
+_SET = 8
+_MAP = 9
+_RECORD = 10
+_UNSERIALIZABLE = 11
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+TracePath = Union[str, "os.PathLike[str]"]
+
+
+class _Encoder:
+    """Encoder of values that collects the string table and the record shapes."""
+
+    def __init__(self) -> None:
+        self.strings: Dict[str, int] = {}
+        self.shapes: Dict[Tuple[str, Tuple[str, ...], bool], int] = {}
+
+    def string(self, s: str) -> bytes:
+        index = self.strings.setdefault(s, len(self.strings))
+        return _U32.pack(index)
+
+    def encode(self, val: Any, out: bytearray) -> None:
+        cls = val.__class__
+        if cls is bool:
+            out.append(_TRUE if val else _FALSE)
+        elif val is None:
+            out.append(_NONE)
+        elif cls is int:
+            if _INT64_MIN <= val <= _INT64_MAX:
+                out.append(_INT)
+                out += _I64.pack(val)
+            else:
+                data = val.to_bytes((val.bit_length() + 8) // 8, "little", signed=True)
+                out.append(_BIGINT)
+                out += _U32.pack(len(data))
+                out += data
+        elif cls is str:
+            out.append(_STR)
+            out += self.string(val)
+        elif cls is ImmutableList or cls is list:
+            self.encode_items(_LIST, val, out)
+        elif cls is tuple:
+            self.encode_items(_TUPLE, val, out)
+        elif cls is frozenset or cls is PSet:
+            self.encode_items(_SET, val, out)
+        elif cls is ImmutableDict or cls is PMap:
+            out.append(_MAP)
+            out += _U32.pack(len(val))
+            for k, v in val.items():
+                self.encode(k, out)
+                self.encode(v, out)
+        elif isinstance(val, tuple) and hasattr(cls, "_fields"):
+            shape = (cls.__name__, tuple(cls._fields), hasattr(cls, "_itf_variant"))
+            out.append(_RECORD)
+            out += _U32.pack(self.shapes.setdefault(shape, len(self.shapes)))
+            for v in val:
+                self.encode(v, out)
+        elif cls is ITFUnserializable:
+            out.append(_UNSERIALIZABLE)
+            out += self.string(val.value)
+        elif isinstance(val, str):
+            # subclasses of str and int, e.g., enumerations, as in the JSON
+            self.encode(str.__str__(val), out)
+        elif isinstance(val, int):
+            self.encode(int(val), out)
+        else:
+            # other objects, e.g., data classes, are stored as decoded from JSON
+            decoded = value_from_json(value_to_json(val))
+            if decoded.__class__ is cls:
+                raise TypeError(f"Cannot encode a value of {cls}")
+            self.encode(decoded, out)
+
+    def encode_items(self, tag: int, items: Any, out: bytearray) -> None:
+        out.append(tag)
+        out += _U32.pack(len(items))
+        for v in items:
+            self.encode(v, out)
+
+    def encode_state(self, state: State) -> bytearray:
+        out = bytearray()
+        meta = json.dumps(state.meta).encode("utf-8")
+        out += _U32.pack(len(meta))
+        out += meta
+        out += _U32.pack(len(state.values))
+        for name, value in state.values.items():
+            out += self.string(name)
+            self.encode(value, out)
+        return out
+
+
+def _u64_bytes(numbers: List[int]) -> bytes:
+    """Pack unsigned 64-bit integers in the little-endian order."""
+    packed = array("Q", numbers)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _u64_view(view: memoryview) -> Any:
+    """View unsigned 64-bit integers in the little-endian order without copying,
+    unless the machine is big-endian."""
+    if sys.byteorder == "little":
+        return view.cast("Q")
+    numbers = array("Q", view.tobytes())
+    numbers.byteswap()
+    return memoryview(numbers)
+
+
+def dump_binary_trace(trace: Trace, fileobj: IO[bytes]) -> None:
+    """Write a Trace in the binary format to a file object opened in binary mode.
+    The states are written one by one."""
+    encoder = _Encoder()
+    offsets: List[int] = []
+    fileobj.write(_PREAMBLE.pack(MAGIC, VERSION))
+    pos = _PREAMBLE.size
+    for state in trace.states:
+        data = encoder.encode_state(state)
+        offsets.append(pos)
+        fileobj.write(data)
+        pos += len(data)
+
+    strings_offset = pos
+    encoded = [s.encode("utf-8") for s in encoder.strings]
+    string_offsets = [0]
+    for encoded_string in encoded:
+        string_offsets.append(string_offsets[-1] + len(encoded_string))
+    table = _u64_bytes(string_offsets)
+    fileobj.write(table)
+    fileobj.writelines(encoded)
+    pos += len(table) + string_offsets[-1]
+
+    index_offset = pos
+    fileobj.write(_u64_bytes(offsets))
+    pos += 8 * len(offsets)
+
+    header = {
+        "#meta": trace.meta,
+        "params": trace.params,
+        "vars": trace.vars,
+        "loop": trace.loop,
+        "shapes": [[n, list(f), v] for (n, f, v) in encoder.shapes],
+    }
+    header_data = json.dumps(header).encode("utf-8")
+    fileobj.write(header_data)
+    fileobj.write(
+        _FOOTER.pack(
+            strings_offset,
+            len(encoder.strings),
+            index_offset,
+            len(offsets),
+            len(header_data),
+            MAGIC,
+        )
+    )
+
+
+def write_binary_trace(trace: Trace, path: TracePath) -> None:
+    """Write a Trace in the binary format to a file."""
+    with open(path, "wb") as f:
+        dump_binary_trace(trace, f)
+
+
+class BinaryTrace:
+    """A trace in the binary format that is mapped into memory.
+
+    Opening the trace reads only its header. Accessing `trace[i]` decodes
+    only the state i. The mapped pages are shared by all processes that open
+    the same file."""
+
+    def __init__(self, path: TracePath):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except Exception:
+            self._mm.close()
+            raise
+
+    def _open(self) -> None:
+        mm = self._mm
+        if len(mm) < _PREAMBLE.size + _FOOTER.size:
+            raise ValueError("Not an ITF binary trace: the file is too short")
+        magic, version = _PREAMBLE.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an ITF binary trace: no magic number")
+        if version != VERSION:
+            raise ValueError(f"Unsupported version of ITF binary trace: {version}")
+        footer_pos = len(mm) - _FOOTER.size
+        (
+            strings_offset,
+            num_strings,
+            index_offset,
+            num_states,
+            header_len,
+            magic,
+        ) = _FOOTER.unpack_from(mm, footer_pos)
+        if magic != MAGIC:
+            raise ValueError("Not an ITF binary trace: truncated file")
+
+        header = json.loads(mm[footer_pos - header_len : footer_pos])
+        self.meta: Dict[str, Any] = header["#meta"]
+        self.params: List[str] = header["params"]
+        self.vars: List[str] = header["vars"]
+        self.loop: Optional[int] = header["loop"]
+        self._shapes = [
+            _record_classes.get(name, tuple(fields), variant)
+            for name, fields, variant in header["shapes"]
+        ]
+
+        view = memoryview(mm)
+        table_end = strings_offset + 8 * (num_strings + 1)
+        self._string_offsets = _u64_view(view[strings_offset:table_end])
+        self._strings_data = table_end
+        self._strings: Dict[int, str] = {}
+        index_end = index_offset + 8 * num_states
+        self._index = _u64_view(view[index_offset:index_end])
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._string_offsets.release()
+        self._index.release()
+        self._mm.close()
+
+    def __enter__(self) -> "BinaryTrace":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, index: int) -> State:
+        """Decode the state at the given index."""
+        if index < 0:
+            index += len(self._index)
+        if not 0 <= index < len(self._index):
+            raise IndexError("state index out of range")
+        return self._decode_state(self._index[index])
+
+    def __iter__(self) -> Iterator[State]:
+        for i in range(len(self._index)):
+            yield self[i]
+
+    def to_trace(self) -> Trace:
+        """Decode all states into a Trace."""
+        return Trace(
+            meta=self.meta,
+            params=self.params,
+            vars=self.vars,
+            states=list(self),
+            loop=self.loop,
+        )
+
+    def _string(self, index: int) -> str:
+        s = self._strings.get(index)
+        if s is None:
+            start = self._strings_data + self._string_offsets[index]
+            end = self._strings_data + self._string_offsets[index + 1]
+            s = self._mm[start:end].decode("utf-8")
+            self._strings[index] = s
+        return s
+
+    def _decode_state(self, pos: int) -> State:
+        mm = self._mm
+        (meta_len,) = _U32.unpack_from(mm, pos)
+        pos += 4
+        meta = json.loads(mm[pos : pos + meta_len])
+        pos += meta_len
+        (num_values,) = _U32.unpack_from(mm, pos)
+        pos += 4
+        values = {}
+        for _ in range(num_values):
+            (name_index,) = _U32.unpack_from(mm, pos)
+            value, pos = self._decode(pos + 4)
+            values[self._string(name_index)] = value
+        return State(meta=meta, values=values)
+
+    def _decode(self, pos: int) -> Tuple[Any, int]:
+        mm = self._mm
+        tag = mm[pos]
+        pos += 1
+        if tag == _INT:
+            return _I64.unpack_from(mm, pos)[0], pos + 8
+        elif tag == _STR:
+            return self._string(_U32.unpack_from(mm, pos)[0]), pos + 4
+        elif tag == _FALSE:
+            return False, pos
+        elif tag == _TRUE:
+            return True, pos
+        elif tag == _NONE:
+            return None, pos
+        elif tag == _BIGINT:
+            (size,) = _U32.unpack_from(mm, pos)
+            pos += 4
+            return int.from_bytes(mm[pos : pos + size], "little", signed=True), (
+                pos + size
+            )
+        elif tag == _UNSERIALIZABLE:
+            value = ITFUnserializable(self._string(_U32.unpack_from(mm, pos)[0]))
+            return value, pos + 4
+        elif tag == _RECORD:
+            cls: Any = self._shapes[_U32.unpack_from(mm, pos)[0]]
+            items, pos = self._decode_items(pos + 4, len(cls._fields))
+            return cls._make(items), pos
+        elif tag == _MAP:
+            (size,) = _U32.unpack_from(mm, pos)
+            items, pos = self._decode_items(pos + 4, 2 * size)
+            return ImmutableDict(dict(zip(items[::2], items[1::2]))), pos
+        else:
+            (size,) = _U32.unpack_from(mm, pos)
+            items, pos = self._decode_items(pos + 4, size)
+            if tag == _LIST:
+                return ImmutableList(items), pos
+            elif tag == _TUPLE:
+                return tuple(items), pos
+            elif tag == _SET:
+                return frozenset(items), pos
+            raise ValueError(f"Unexpected tag {tag} in ITF binary trace")
+
+    def _decode_items(self, pos: int, count: int) -> Tuple[List[Any], int]:
+        items = []
+        for _ in range(count):
+            item, pos = self._decode(pos)
+            items.append(item)
+        return items, pos
+
+
+def open_binary_trace(path: TracePath) -> BinaryTrace:
+    """Map a trace in the binary format into memory."""
+    return BinaryTrace(path)
@@ -0,0 +1,140 @@
+"""
+Persistent cache of decoded traces, keyed by the content of the trace files.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+from importlib import metadata
+from typing import List, Optional, Tuple, Union
+
+from .itf import Trace, trace_from_json
+
+TracePath = Union[str, "os.PathLike[str]"]
+
+# the default bound on the total size of the cache directory
+MAX_CACHE_BYTES = 1 << 30
+
+# increase when the layout of the cached objects changes
+CACHE_FORMAT = 1
+
+_SUFFIX = ".trace.pickle"
+
+
+@lru_cache(maxsize=None)
+def _library_version() -> str:
+    try:
+        return metadata.version("itf-py")
+    except metadata.PackageNotFoundError:
+        pass
+    # e.g., a source checkout: the version and the hash of the sources
+    from . import __version__
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith(".py"):
+            h.update(name.encode())
+            with open(os.path.join(package_dir, name), "rb") as f:
+                h.update(f.read())
+    return f"{__version__}+{h.hexdigest()[:16]}"
+
+
+def cache_key(content: bytes, use_var_types: bool, intern: bool) -> str:
+    """The key of a cached trace: the hash of the file content, the library
+    version, and the decoding options."""
+    h = hashlib.sha256(content)
+    h.update(f"|{CACHE_FORMAT}|{_library_version()}|{use_var_types}|{intern}".encode())
+    return h.hexdigest()
+
+
+def load_trace(
+    path: TracePath,
+    cache_dir: Optional[TracePath] = None,
+    max_cache_bytes: int = MAX_CACHE_BYTES,
+    use_var_types: bool = True,
+    intern: bool = False,
+) -> Trace:
+    """Load a trace from a JSON file, reusing the decoded trace from the cache
+    directory if the file content has been decoded before.
+
+    On a cache miss, the trace is decoded with `trace_from_json` and stored in
+    the cache. Corrupt cache entries are replaced. When the cache directory
+    grows beyond `max_cache_bytes`, the least recently used entries are removed.
+    Since the entries are pickled, use only cache directories that you trust."""
+    with open(path, "rb") as f:
+        content = f.read()
+    if cache_dir is None:
+        return trace_from_json(json.loads(content), use_var_types, intern)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, cache_key(content, use_var_types, intern) + _SUFFIX)
+    trace = _read_entry(entry)
+    if trace is not None:
+        return trace
+
+    trace = trace_from_json(json.loads(content), use_var_types, intern)
+    _write_entry(entry, trace)
+    evict(cache_dir, max_cache_bytes)
+    return trace
+
+
+def _read_entry(entry: str) -> Optional[Trace]:
+    try:
+        with open(entry, "rb") as f:
+            trace = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # a corrupt or outdated entry, replace it
+        _remove(entry)
+        return None
+    if not isinstance(trace, Trace):
+        _remove(entry)
+        return None
+    # mark the entry as recently used
+    try:
+        os.utime(entry)
+    except FileNotFoundError:
+        # the entry has just been evicted by another process
+        return None
+    return trace
+
+
+def _write_entry(entry: str, trace: Trace) -> None:
+    # write to a temporary file first, so readers never see a partial entry
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(trace, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, entry)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict(cache_dir: TracePath, max_cache_bytes: int) -> None:
+    """Remove the least recently used entries until the total size of the cache
+    directory does not exceed `max_cache_bytes`."""
+    entries: List[Tuple[float, int, str]] = []
+    with os.scandir(cache_dir) as it:
+        for e in it:
+            if e.name.endswith(_SUFFIX) and e.is_file():
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_cache_bytes:
+            break
+        _remove(path)
+        total -= size
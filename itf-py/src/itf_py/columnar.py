@@ -0,0 +1,145 @@
+"""
+Columnar view of ITF traces: one column of values per state variable.
+"""
+
+from array import array
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Union
+
+from .itf import Trace
+
+# A column of values, one per state.
+Column = Union["array[int]", List[Any]]
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+
+def _make_column(values: List[Any]) -> Column:
+    """Store the integers that fit into 64 bits compactly, and other values
+    in a list."""
+    if values and all(v.__class__ is int for v in values):
+        if _INT64_MIN <= min(values) and max(values) <= _INT64_MAX:
+            return array("q", values)
+    return values
+
+
+def _import_numpy(feature: str) -> Any:
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(f"{feature} requires NumPy: pip install numpy") from e
+    return np
+
+
+class ColumnarTrace:
+    """A trace stored as columns: for every state variable, the sequence of its
+    values in all states. Integer variables are stored in `array('q')`, unless
+    their values do not fit into 64 bits. The values of missing variables
+    are None."""
+
+    def __init__(self, columns: Dict[str, Column], num_states: int):
+        self._columns = columns
+        self.num_states = num_states
+
+    @staticmethod
+    def from_trace(trace: Trace) -> "ColumnarTrace":
+        """Collect the columns of the variables `trace.vars`."""
+        columns = {
+            name: _make_column([s.values.get(name) for s in trace.states])
+            for name in trace.vars
+        }
+        return ColumnarTrace(columns, len(trace.states))
+
+    @property
+    def vars(self) -> List[str]:
+        """The names of the columns."""
+        return list(self._columns.keys())
+
+    def __len__(self) -> int:
+        return self.num_states
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> Column:
+        """The column of a variable."""
+        return self._columns[name]
+
+    def column(self, name: str, start: int = 0, stop: Optional[int] = None) -> Column:
+        """The values of a variable in the states from `start` up to `stop`."""
+        return self._columns[name][start:stop]
+
+    def slice(self, start: int = 0, stop: Optional[int] = None) -> "ColumnarTrace":
+        """The columns of the states from `start` up to `stop`."""
+        columns = {name: col[start:stop] for name, col in self._columns.items()}
+        return ColumnarTrace(columns, len(range(self.num_states)[start:stop]))
+
+    def to_numpy(self, name: str) -> Any:
+        """Convert a column to a NumPy array. The integer columns are converted
+        without copying, as arrays of int64. Requires NumPy."""
+        np = _import_numpy("to_numpy")
+        col = self._columns[name]
+        if isinstance(col, array):
+            return np.frombuffer(col, dtype=np.int64)
+        result = np.empty(len(col), dtype=object)
+        # assign one by one, so NumPy does not unpack tuples and lists
+        for i, v in enumerate(col):
+            result[i] = v
+        return result
+
+
+def extract_ints(
+    data: Mapping[str, Any],
+    name: str,
+    path: Sequence[str] = (),
+    out: Any = None,
+) -> Any:
+    """Extract the integer values of a variable, or of a field nested in its
+    records, from the JSON of a trace into a NumPy array of int64, one value
+    per state. Neither the states nor the other values are decoded:
+
+        clock = extract_ints(json.load(f), "clock")
+        ids = extract_ints(data, "lastAction", ["msg", "id"])
+
+    The fields of the path are looked up in the records, and in the records
+    of tagged unions. If a value does not fit into 64 bits, an array of the
+    dtype `object` is returned instead. If `out` is given, it is filled with
+    the values and returned, and OverflowError is raised if it cannot hold
+    the values. Requires NumPy."""
+    np = _import_numpy("extract_ints")
+    states = data["states"]
+    path = tuple(path)
+    values: List[int] = []
+    append = values.append
+    i = 0
+    try:
+        for i, raw_state in enumerate(states):
+            val = raw_state[name]
+            for field in path:
+                if field not in val and "tag" in val and "value" in val:
+                    # a field of the record in a tagged union
+                    val = val["value"]
+                val = val[field]
+            if val.__class__ is int:
+                append(val)
+            else:
+                append(int(val["#bigint"]))
+    except (KeyError, TypeError) as e:
+        where = ".".join((name,) + path)
+        raise ValueError(f"No integer at {where} in state {i}") from e
+    if out is not None:
+        try:
+            out[:] = values
+        except OverflowError as e:
+            where = ".".join((name,) + path)
+            raise OverflowError(f"The values of {where} do not fit into out") from e
+        return out
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        result = np.empty(len(values), dtype=object)
+        result[:] = values
+        return result
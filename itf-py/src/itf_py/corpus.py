@@ -0,0 +1,134 @@
+"""
+Collections of many ITF traces that share their values.
+"""
+
+import json
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple, Union
+
+from .itf import (
+    Decoder,
+    State,
+    Trace,
+    ValuePool,
+    compile_var_decoders,
+    state_from_json,
+)
+
+TracePath = Union[str, "os.PathLike[str]"]
+
+
+class TraceCorpus:
+    """A collection of traces, e.g., produced by randomized simulation, that are
+    decoded into one shared pool of values.
+
+    Equal values of all traces are represented by the same object, and the
+    states with equal values share one mapping of values. Hence, the memory
+    grows with the distinct values and states rather than with the total size
+    of the traces. Do not modify the values of the states in a corpus,
+    since they may be shared with other states."""
+
+    def __init__(self, use_var_types: bool = True):
+        self.use_var_types = use_var_types
+        self.pool = ValuePool()
+        self.traces: List[Trace] = []
+        # the distinct mappings of values, by the names and the interned values
+        self._values: Dict[Tuple[Tuple[str, int], ...], Mapping[str, Any]] = {}
+        # the compiled decoders of the variable types seen so far
+        self._decoders: Dict[str, Dict[str, Decoder]] = {}
+
+    @staticmethod
+    def from_files(
+        paths: Iterable[TracePath], use_var_types: bool = True
+    ) -> "TraceCorpus":
+        """Read the traces from JSON files into a new corpus."""
+        corpus = TraceCorpus(use_var_types)
+        for path in paths:
+            corpus.add_file(path)
+        return corpus
+
+    def add_file(self, path: TracePath) -> Trace:
+        """Read a trace from a JSON file and add it to the corpus."""
+        with open(path, "r", encoding="utf-8") as f:
+            return self.add(json.load(f))
+
+    def add(self, data: Dict[str, Any]) -> Trace:
+        """Deserialize a trace from JSON, as `trace_from_json` does, and add it
+        to the corpus."""
+        meta = data["#meta"] if "#meta" in data else {}
+        decoders = self._var_decoders(meta) if self.use_var_types else None
+        states = []
+        for raw_state in data["states"]:
+            state = state_from_json(raw_state, decoders, self.pool)
+            states.append(State(meta=state.meta, values=self._share(state.values)))
+        trace = Trace(
+            meta=meta,
+            params=data.get("params", []),
+            vars=data["vars"],
+            states=states,
+            loop=data.get("loop", None),
+        )
+        self.traces.append(trace)
+        return trace
+
+    def _var_decoders(self, meta: Dict[str, Any]) -> Dict[str, Decoder]:
+        key = json.dumps(meta.get("varTypes", {}), sort_keys=True)
+        decoders = self._decoders.get(key)
+        if decoders is None:
+            decoders = compile_var_decoders(meta, self.pool)
+            self._decoders[key] = decoders
+        return decoders
+
+    def _share(self, values: Any) -> Any:
+        # the values are interned, so their identities stand for them
+        key = tuple(sorted((k, id(v)) for k, v in values.items()))
+        return self._values.setdefault(key, values)
+
+    def __len__(self) -> int:
+        return len(self.traces)
+
+    def __iter__(self) -> Iterator[Trace]:
+        return iter(self.traces)
+
+    def __getitem__(self, index: int) -> Trace:
+        return self.traces[index]
+
+    def states(self) -> Iterator[State]:
+        """The states of all traces."""
+        for trace in self.traces:
+            yield from trace.states
+
+    def distinct_states(self) -> List[Mapping[str, Any]]:
+        """The distinct values of the states of all traces, in the order of
+        their first occurrence."""
+        return list(self._values.values())
+
+    def tag_coverage(self, name: str) -> Dict[str, int]:
+        """How many states of all traces have every tag of a tagged union,
+        e.g., of `lastAction`. The states with other values are skipped."""
+        counts: Counter[str] = Counter()
+        for state in self.states():
+            cls = state.values.get(name).__class__
+            if hasattr(cls, "_itf_variant"):
+                counts[cls.__name__] += 1
+        return dict(counts)
+
+    def histogram(self, name: str) -> List[Tuple[Any, int]]:
+        """The values of a variable in the states of all traces with the number
+        of their occurrences, from the most common. The missing values are
+        counted as None."""
+        counts: Dict[int, List[Any]] = {}
+        for state in self.states():
+            value = state.values.get(name)
+            # the values are interned, so count them by their identities
+            entry = counts.get(id(value))
+            if entry is None:
+                counts[id(value)] = [value, 1]
+            else:
+                entry[1] += 1
+        return sorted(
+            ((value, count) for value, count in counts.values()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
@@ -0,0 +1,192 @@
+"""
+Delta encoding of ITF traces: every state is stored as its difference from
+the previous state, except for the periodic keyframes that are stored in full.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .fingerprint import Fingerprinter
+from .itf import (
+    ImmutableDict,
+    State,
+    Trace,
+    state_from_json,
+    state_to_json,
+    value_from_json,
+    value_to_json,
+)
+
+# the default number of states between two keyframes
+KEYFRAME_INTERVAL = 64
+
+
+def _value_delta(old: Any, new: Any, digest: Callable[[Any], bytes]) -> Tuple[str, Any]:
+    """Compute the JSON delta between two values of a variable. It is either
+    `("#patch", patch)` for sets and maps, or `("#assign", new_json)`.
+    The elements, keys and values are compared by their fingerprints, since
+    the Python equality does not distinguish, e.g., `1` from `True`, or
+    the tagged unions with the same payload and different tags."""
+    if old.__class__ is frozenset and new.__class__ is frozenset:
+        old_elems = {digest(v): v for v in old}
+        new_elems = {digest(v): v for v in new}
+        added = [v for d, v in new_elems.items() if d not in old_elems]
+        removed = [v for d, v in old_elems.items() if d not in new_elems]
+        if len(added) + len(removed) < len(new):
+            return "#patch", {
+                "#add": [value_to_json(v) for v in added],
+                "#remove": [value_to_json(v) for v in removed],
+            }
+    elif old.__class__ is ImmutableDict and new.__class__ is ImmutableDict:
+        old_items = {digest(k): (k, digest(v)) for k, v in old.items()}
+        new_keys = {digest(k) for k in new}
+        put = []
+        for k, v in new.items():
+            entry = old_items.get(digest(k))
+            if entry is None or entry[1] != digest(v):
+                put.append((k, v))
+        removed_keys = [k for d, (k, _) in old_items.items() if d not in new_keys]
+        if len(put) + len(removed_keys) < len(new):
+            return "#patch", {
+                "#put": [[value_to_json(k), value_to_json(v)] for k, v in put],
+                "#remove": [value_to_json(k) for k in removed_keys],
+            }
+    return "#assign", value_to_json(new)
+
+
+def state_delta(
+    prev: State, curr: State, fingerprinter: Optional[Fingerprinter] = None
+) -> Dict[str, Any]:
+    """Compute the JSON delta from the previous state to the current one:
+    the assigned variables, the removed variables, and the patches
+    of the sets and maps. The values are compared by their fingerprints,
+    see `Fingerprinter`."""
+    digest = (Fingerprinter() if fingerprinter is None else fingerprinter).digest
+    assign: Dict[str, Any] = {}
+    patch: Dict[str, Any] = {}
+    prev_values = prev.values
+    for name, value in curr.values.items():
+        if name in prev_values:
+            old = prev_values[name]
+            if old is value or digest(old) == digest(value):
+                continue
+            kind, change = _value_delta(old, value, digest)
+            (patch if kind == "#patch" else assign)[name] = change
+        else:
+            assign[name] = value_to_json(value)
+    result: Dict[str, Any] = {"#meta": curr.meta}
+    if assign:
+        result["#assign"] = assign
+    removed = [name for name in prev_values if name not in curr.values]
+    if removed:
+        result["#remove"] = removed
+    if patch:
+        result["#patch"] = patch
+    return result
+
+
+def _apply_patch(old: Any, patch: Dict[str, Any]) -> Any:
+    if "#put" in patch:
+        d = dict(old)
+        for k in patch["#remove"]:
+            del d[value_from_json(k)]
+        for k, v in patch["#put"]:
+            d[value_from_json(k)] = value_from_json(v)
+        return ImmutableDict(d)
+    else:
+        removed = frozenset(value_from_json(v) for v in patch["#remove"])
+        added = frozenset(value_from_json(v) for v in patch["#add"])
+        return (old - removed) | added
+
+
+def apply_state_delta(prev: State, delta: Dict[str, Any]) -> State:
+    """Reconstruct the current state from the previous one and the delta."""
+    values = dict(prev.values)
+    for name in delta.get("#remove", []):
+        del values[name]
+    for name, raw in delta.get("#assign", {}).items():
+        values[name] = value_from_json(raw)
+    for name, patch in delta.get("#patch", {}).items():
+        values[name] = _apply_patch(values[name], patch)
+    return State(meta=delta.get("#meta", {}), values=values)
+
+
+def trace_to_delta(
+    trace: Trace, keyframe_interval: int = KEYFRAME_INTERVAL
+) -> Dict[str, Any]:
+    """Serialize a Trace to the delta JSON. Every `keyframe_interval`-th state
+    is a keyframe that is stored as in `trace_to_json`, whereas other states
+    are stored as deltas from their previous states."""
+    if keyframe_interval < 1:
+        raise ValueError("keyframe_interval must be positive")
+    fp = Fingerprinter()
+    states: List[Dict[str, Any]] = []
+    prev: Optional[State] = None
+    for i, state in enumerate(trace.states):
+        if prev is None or i % keyframe_interval == 0:
+            states.append(state_to_json(state))
+        else:
+            states.append(state_delta(prev, state, fp))
+        prev = state
+    return {
+        "#meta": trace.meta,
+        "params": trace.params,
+        "vars": trace.vars,
+        "loop": trace.loop,
+        "keyframeInterval": keyframe_interval,
+        "states": states,
+    }
+
+
+class DeltaTrace:
+    """A trace in the delta JSON with random access to its states.
+
+    A state is reconstructed from the closest keyframe before it. The last
+    reconstructed state is remembered, so iterating over the states in order
+    applies every delta once."""
+
+    def __init__(self, data: Mapping[str, Any]):
+        self.meta: Dict[str, Any] = data.get("#meta", {})
+        self.params: List[str] = data.get("params", [])
+        self.vars: List[str] = data["vars"]
+        self.loop: Optional[int] = data.get("loop", None)
+        self.keyframe_interval: int = data["keyframeInterval"]
+        self._raw_states: List[Dict[str, Any]] = data["states"]
+        self._last: Optional[Tuple[int, State]] = None
+
+    def __len__(self) -> int:
+        return len(self._raw_states)
+
+    def __getitem__(self, index: int) -> State:
+        if index < 0:
+            index += len(self._raw_states)
+        if not 0 <= index < len(self._raw_states):
+            raise IndexError("state index out of range")
+        keyframe = index - index % self.keyframe_interval
+        if self._last is not None and keyframe <= self._last[0] <= index:
+            start, state = self._last
+        else:
+            start, state = keyframe, state_from_json(self._raw_states[keyframe])
+        for i in range(start + 1, index + 1):
+            state = apply_state_delta(state, self._raw_states[i])
+        self._last = (index, state)
+        return state
+
+    def __iter__(self) -> Iterator[State]:
+        for i in range(len(self._raw_states)):
+            yield self[i]
+
+    def to_trace(self) -> Trace:
+        """Reconstruct all states of the trace."""
+        return Trace(
+            meta=self.meta,
+            params=self.params,
+            vars=self.vars,
+            states=list(self),
+            loop=self.loop,
+        )
+
+
+def trace_from_delta(data: Mapping[str, Any]) -> Trace:
+    """Deserialize a Trace from the delta JSON that is produced by
+    `trace_to_delta`."""
+    return DeltaTrace(data).to_trace()
@@ -0,0 +1,269 @@
+"""
+Comparing ITF traces: aligning their states and finding where they diverge.
+
+The states and values are compared by their fingerprints, see `Fingerprinter`.
+Since the fingerprints of the components are remembered, the identical parts
+of two traces are compared in time that is linear in their size, and the
+identical subtrees of two values are skipped without being traversed again.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .fingerprint import Fingerprinter, state_fingerprints
+from .itf import ImmutableDict, State, Trace
+from .persistent import PMap, PSet
+
+
+class Change(NamedTuple):
+    """A difference between two values. The path leads from the compared
+    values to the changed component: a record field, a map key, or a list
+    index. The kind is "added" or "removed" for set elements, map keys,
+    list elements, and state variables, and "changed" otherwise."""
+
+    path: Tuple[Any, ...]
+    kind: str
+    old: Any
+    new: Any
+
+
+def diff_values(
+    old: Any, new: Any, fingerprinter: Optional[Fingerprinter] = None
+) -> List[Change]:
+    """The structural differences between two values. Sets are compared by
+    their elements, maps by their keys, records and tagged unions of the same
+    shape by their fields, and lists and tuples by their positions.
+    Other values are reported as changed as a whole."""
+    fp = Fingerprinter() if fingerprinter is None else fingerprinter
+    changes: List[Change] = []
+    _diff(fp, (), old, new, changes)
+    return changes
+
+
+def _diff(
+    fp: Fingerprinter, path: Tuple[Any, ...], old: Any, new: Any, out: List[Change]
+) -> None:
+    # the pairs of components that remain to be compared, the next one on top
+    digest = fp.digest
+    stack = [(path, old, new)]
+    while stack:
+        path, old, new = stack.pop()
+        if old is new or digest(old) == digest(new):
+            continue
+        if isinstance(old, (frozenset, PSet)) and isinstance(new, (frozenset, PSet)):
+            old_elems = {digest(e): e for e in old}
+            new_elems = {digest(e): e for e in new}
+            for d, e in old_elems.items():
+                if d not in new_elems:
+                    out.append(Change(path, "removed", e, None))
+            for d, e in new_elems.items():
+                if d not in old_elems:
+                    out.append(Change(path, "added", None, e))
+        elif isinstance(old, (ImmutableDict, PMap)) and isinstance(
+            new, (ImmutableDict, PMap)
+        ):
+            # the keys are matched by their digests, since the Python equality
+            # does not distinguish, e.g., 1 from True
+            old_items = {digest(k): (k, v) for k, v in old.items()}
+            new_items = {digest(k): (k, v) for k, v in new.items()}
+            for d, (k, v) in old_items.items():
+                if d not in new_items:
+                    out.append(Change(path + (k,), "removed", v, None))
+            shared = []
+            for d, (k, v) in new_items.items():
+                entry = old_items.get(d)
+                if entry is None:
+                    out.append(Change(path + (k,), "added", None, v))
+                else:
+                    shared.append((path + (k,), entry[1], v))
+            stack.extend(reversed(shared))
+        elif isinstance(old, tuple) and old.__class__ is new.__class__:
+            fields = getattr(old, "_fields", None)
+            if fields is None and len(old) != len(new):
+                out.append(Change(path, "changed", old, new))
+                continue
+            names = range(len(old)) if fields is None else fields
+            stack.extend(
+                (path + (n,), o, v) for n, o, v in reversed(list(zip(names, old, new)))
+            )
+        elif isinstance(old, list) and isinstance(new, list):
+            common = min(len(old), len(new))
+            out.extend(
+                Change(path + (i,), "removed", old[i], None)
+                for i in range(common, len(old))
+            )
+            out.extend(
+                Change(path + (i,), "added", None, new[i])
+                for i in range(common, len(new))
+            )
+            stack.extend((path + (i,), old[i], new[i]) for i in reversed(range(common)))
+        else:
+            out.append(Change(path, "changed", old, new))
+
+
+@dataclass
+class StateDiff:
+    """The differences between two aligned states, by their indices in the
+    compared traces. The index is None if the state has no counterpart.
+    The path of every change starts with the name of the state variable."""
+
+    old_index: Optional[int]
+    new_index: Optional[int]
+    changes: List[Change] = field(default_factory=list)
+
+
+@dataclass
+class TraceDiff:
+    """The differences between two traces: the alignment of their states,
+    as pairs of indices, and the differences of the aligned states that are
+    not equal."""
+
+    alignment: List[Tuple[Optional[int], Optional[int]]]
+    states: List[StateDiff]
+
+    @property
+    def equal(self) -> bool:
+        """Whether the traces have equal states."""
+        return not self.states
+
+    @property
+    def first_divergence(self) -> Optional[StateDiff]:
+        """The differences of the first aligned states that are not equal."""
+        return self.states[0] if self.states else None
+
+
+def diff_states(
+    old: State, new: State, fingerprinter: Optional[Fingerprinter] = None
+) -> List[Change]:
+    """The differences between the values of two states. The metadata is
+    ignored."""
+    fp = Fingerprinter() if fingerprinter is None else fingerprinter
+    changes: List[Change] = []
+    old_values, new_values = old.values, new.values
+    for name, value in old_values.items():
+        if name not in new_values:
+            changes.append(Change((name,), "removed", value, None))
+    for name, value in new_values.items():
+        if name not in old_values:
+            changes.append(Change((name,), "added", None, value))
+        else:
+            _diff(fp, (name,), old_values[name], value, changes)
+    return changes
+
+
+def align_states(
+    old: Sequence[int], new: Sequence[int]
+) -> List[Tuple[Optional[int], Optional[int]]]:
+    """Align two sequences of state fingerprints, e.g., computed by
+    `state_fingerprints`. The result is the sequence of the pairs of aligned
+    indices, where one index is None if the state has no counterpart.
+
+    The equal states are matched as in patience diff: the common prefix and
+    suffix are matched first, and the rest is split at the states that occur
+    exactly once in both sequences. The states between these anchors that
+    cannot be matched are paired by their positions, so the divergent states
+    of two traces of the same length are compared one by one."""
+    result: List[Tuple[Optional[int], Optional[int]]] = []
+    # the ranges to align, and the anchors that have been matched, which are
+    # marked with negative lower bounds, to be processed in the reverse order
+    stack: List[Tuple[int, int, int, int]] = [(0, len(old), 0, len(new))]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        if a_lo < 0:
+            # an anchor that has been matched
+            result.append((a_hi, b_hi))
+            continue
+        while a_lo < a_hi and b_lo < b_hi and old[a_lo] == new[b_lo]:
+            result.append((a_lo, b_lo))
+            a_lo, b_lo = a_lo + 1, b_lo + 1
+        suffix = 0
+        while (
+            a_lo < a_hi - suffix
+            and b_lo < b_hi - suffix
+            and old[a_hi - suffix - 1] == new[b_hi - suffix - 1]
+        ):
+            suffix += 1
+        a_mid, b_mid = a_hi - suffix, b_hi - suffix
+        anchors = _unique_anchors(old, new, a_lo, a_mid, b_lo, b_mid)
+        if not anchors:
+            common = min(a_mid - a_lo, b_mid - b_lo)
+            result.extend((a_lo + i, b_lo + i) for i in range(common))
+            result.extend((i, None) for i in range(a_lo + common, a_mid))
+            result.extend((None, j) for j in range(b_lo + common, b_mid))
+            result.extend((a_mid + i, b_mid + i) for i in range(suffix))
+            continue
+        # the suffix, the anchors and the ranges between them, in reverse order
+        parts = [(-1, a_mid + i, -1, b_mid + i) for i in reversed(range(suffix))]
+        prev_a, prev_b = a_mid, b_mid
+        for i, j in reversed(anchors):
+            parts.append((i + 1, prev_a, j + 1, prev_b))
+            parts.append((-1, i, -1, j))
+            prev_a, prev_b = i, j
+        parts.append((a_lo, prev_a, b_lo, prev_b))
+        stack.extend(parts)
+    return result
+
+
+def _unique_anchors(
+    old: Sequence[int], new: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int
+) -> List[Tuple[int, int]]:
+    """The longest increasing sequence of the pairs of the indices of
+    the fingerprints that occur exactly once in both ranges."""
+    counts: Dict[int, List[int]] = {}
+    for i in range(a_lo, a_hi):
+        entry = counts.setdefault(old[i], [0, 0, i, 0])
+        entry[0] += 1
+    for j in range(b_lo, b_hi):
+        found = counts.get(new[j])
+        if found is not None:
+            found[1] += 1
+            found[3] = j
+    pairs = sorted((e[2], e[3]) for e in counts.values() if e[0] == 1 and e[1] == 1)
+    # patience sorting of the indices in the new range
+    tails: List[int] = []
+    tail_pairs: List[int] = []
+    back: List[int] = []
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        back.append(tail_pairs[pos - 1] if pos > 0 else -1)
+        if pos == len(tails):
+            tails.append(j)
+            tail_pairs.append(k)
+        else:
+            tails[pos] = j
+            tail_pairs[pos] = k
+    anchors = []
+    k = tail_pairs[-1] if tail_pairs else -1
+    while k >= 0:
+        anchors.append(pairs[k])
+        k = back[k]
+    anchors.reverse()
+    return anchors
+
+
+def diff_traces(
+    old: Trace, new: Trace, fingerprinter: Optional[Fingerprinter] = None
+) -> TraceDiff:
+    """Compare two traces, e.g., a trace of a specification and a trace that
+    is replayed by an implementation. The states are aligned by
+    `align_states`, and the aligned states that are not equal are compared
+    by `diff_states`:
+
+        diff = diff_traces(spec_trace, impl_trace)
+        if not diff.equal:
+            print(diff.first_divergence)
+    """
+    fp = Fingerprinter() if fingerprinter is None else fingerprinter
+    old_fps = state_fingerprints(old.states, fp)
+    new_fps = state_fingerprints(new.states, fp)
+    alignment = align_states(old_fps, new_fps)
+    states = []
+    for i, j in alignment:
+        if i is None or j is None:
+            states.append(StateDiff(i, j))
+        elif old_fps[i] != new_fps[j]:
+            states.append(
+                StateDiff(i, j, diff_states(old.states[i], new.states[j], fp))
+            )
+    return TraceDiff(alignment, states)
@@ -0,0 +1,206 @@
+"""
+Stable fingerprints of ITF values and states, for finding repeated states.
+"""
+
+import json
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .itf import ITFUnserializable, State, Trace, value_from_json, value_to_json
+from .persistent import PMap, PSet
+
+# the classes of the values that are fingerprinted by their values
+_SCALARS = frozenset([str, int, bool])
+
+
+class Fingerprinter:
+    """Computes fingerprints of values and states: 64-bit or 128-bit integers
+    that are equal for equal values. Unlike `hash`, the fingerprints do not
+    depend on the process, so they can be stored and compared across runs.
+
+    A fingerprint is computed from the fingerprints of the components, and
+    it is remembered for every object, as long as the fingerprinter is alive.
+    Hence, the values that are shared by many states, e.g., interned with
+    `trace_from_json(data, intern=True)`, are fingerprinted once. The values
+    and the states must not be modified after they are fingerprinted."""
+
+    def __init__(self, bits: int = 128):
+        if bits not in (64, 128):
+            raise ValueError("The fingerprints have 64 or 128 bits")
+        self.bits = bits
+        self._size = bits // 8
+        # the fingerprinted objects, by their identities, with their digests
+        self._digests: Dict[int, Tuple[Any, bytes]] = {}
+        # the digests of the scalars, by their classes and values, since
+        # equal scalars are often different objects
+        self._scalars: Dict[Tuple[type, Any], bytes] = {}
+
+    def value(self, val: Any) -> int:
+        """The fingerprint of a value."""
+        return int.from_bytes(self.digest(val), "little")
+
+    def state(self, state: State) -> int:
+        """The fingerprint of the values of a state. The metadata is ignored."""
+        entry = self._digests.get(id(state))
+        if entry is None:
+            digests = sorted(
+                self.digest(name) + self.digest(value)
+                for name, value in state.values.items()
+            )
+            entry = (state, self._hash(b"V", digests))
+            self._digests[id(state)] = entry
+        return int.from_bytes(entry[1], "little")
+
+    def digest(self, val: Any) -> bytes:
+        """The fingerprint of a value as bytes."""
+        cls = val.__class__
+        if cls in _SCALARS:
+            digest = self._scalars.get((cls, val))
+            if digest is None:
+                digest = self._leaf(val)
+                self._scalars[(cls, val)] = digest
+            return digest
+        entry = self._digests.get(id(val))
+        if entry is None:
+            entry = (val, self._digest(val))
+            self._digests[id(val)] = entry
+        return entry[1]
+
+    def _hash(self, kind: bytes, parts: Iterable[bytes]) -> bytes:
+        h = blake2b(kind, digest_size=self._size)
+        for part in parts:
+            h.update(part)
+        return h.digest()
+
+    def _digest(self, val: Any) -> bytes:
+        # the digests are computed after the digests of the components, with
+        # an explicit stack, so deep values do not exhaust the recursion limit
+        digests = self._digests
+        stack: List[Tuple[Any, Optional[List[Any]]]] = [(val, None)]
+        while stack:
+            node, components = stack.pop()
+            if components is not None:
+                digests[id(node)] = (node, self._combine(node, components))
+                continue
+            components = self._components(node)
+            if components is None:
+                digests[id(node)] = (node, self._leaf(node))
+                continue
+            stack.append((node, components))
+            # the scalars and the known values are fingerprinted on demand
+            for c in components:
+                if c.__class__ not in _SCALARS and id(c) not in digests:
+                    stack.append((c, None))
+        return digests[id(val)][1]
+
+    def _leaf(self, val: Any) -> bytes:
+        # the kinds of values are distinguished by the first byte, and
+        # the digests of the components have fixed size
+        if val.__class__ is bool:
+            return self._hash(b"B1" if val else b"B0", ())
+        elif isinstance(val, str):
+            # also the subclasses of str, e.g., enumerations, as in the JSON
+            return self._hash(b"S", (str.__str__(val).encode("utf-8"),))
+        elif isinstance(val, int):
+            return self._hash(b"I", (int.__repr__(val).encode("ascii"),))
+        elif val is None:
+            return self._hash(b"N", ())
+        else:
+            return self._hash(b"U", (val.value.encode("utf-8"),))
+
+    def _components(self, val: Any) -> Optional[List[Any]]:
+        """The components of a value, whose digests make up its digest,
+        or None if the value has no components."""
+        if isinstance(val, (tuple, frozenset, PSet, list)):
+            return list(val)
+        elif isinstance(val, (dict, PMap)):
+            return [x for kv in val.items() for x in kv]
+        elif isinstance(val, (str, int)) or val is None:
+            return None
+        elif val.__class__ is ITFUnserializable:
+            return None
+        # other objects, e.g., data classes, as decoded from their JSON
+        decoded = value_from_json(value_to_json(val))
+        if decoded.__class__ is val.__class__:
+            raise TypeError(f"Cannot fingerprint a value of {val.__class__}")
+        return [decoded]
+
+    def _combine(self, val: Any, components: List[Any]) -> bytes:
+        # the components have been fingerprinted already
+        digest = self.digest
+        cls = val.__class__
+        if isinstance(val, (frozenset, PSet)):
+            return self._hash(b"F", sorted(map(digest, components)))
+        elif isinstance(val, (dict, PMap)):
+            pairs = [digest(k) + digest(v) for k, v in val.items()]
+            return self._hash(b"M", sorted(pairs))
+        elif isinstance(val, list):
+            return self._hash(b"L", map(digest, components))
+        elif isinstance(val, tuple) and hasattr(val, "_fields"):
+            # records are identified by their fields, and tagged unions by
+            # their tags too, as in the JSON
+            tag = cls.__name__ if hasattr(cls, "_itf_variant") else None
+            shape = json.dumps([tag, list(val._fields)]).encode("utf-8")
+            return self._hash(b"R", [shape, *map(digest, components)])
+        elif isinstance(val, tuple):
+            return self._hash(b"T", map(digest, components))
+        else:
+            return digest(components[0])
+
+
+def value_fingerprint(val: Any, bits: int = 128) -> int:
+    """The fingerprint of a value, see `Fingerprinter`."""
+    return Fingerprinter(bits).value(val)
+
+
+def state_fingerprint(state: State, bits: int = 128) -> int:
+    """The fingerprint of the values of a state, see `Fingerprinter`."""
+    return Fingerprinter(bits).state(state)
+
+
+def state_fingerprints(
+    states: Iterable[State], fingerprinter: Optional[Fingerprinter] = None
+) -> List[int]:
+    """The fingerprints of the states, e.g., of `trace.states`."""
+    fp = Fingerprinter() if fingerprinter is None else fingerprinter
+    return [fp.state(s) for s in states]
+
+
+def find_repeated_states(
+    states: Iterable[State], fingerprinter: Optional[Fingerprinter] = None
+) -> List[List[int]]:
+    """Find the states that have equal values, by comparing their fingerprints.
+    The result contains the indices of every group of at least two equal
+    states, in the order of their first occurrence. To find the states that
+    repeat across several traces, chain their states."""
+    groups: Dict[int, List[int]] = {}
+    for i, f in enumerate(state_fingerprints(states, fingerprinter)):
+        groups.setdefault(f, []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def find_loop(
+    trace: Trace, fingerprinter: Optional[Fingerprinter] = None
+) -> Optional[int]:
+    """The index of the first state that is equal to the last state, other than
+    the last state itself, if there is such a state. This is the start of
+    the loop of a lasso-shaped trace that ends in a repeated state."""
+    fingerprints = state_fingerprints(trace.states, fingerprinter)
+    if len(fingerprints) < 2:
+        return None
+    last = fingerprints[-1]
+    for i, f in enumerate(fingerprints[:-1]):
+        if f == last:
+            return i
+    return None
+
+
+def validate_loop(trace: Trace, fingerprinter: Optional[Fingerprinter] = None) -> bool:
+    """Check that `trace.loop` is either None, or the index of an earlier state
+    that is equal to the last state."""
+    if trace.loop is None:
+        return True
+    if not 0 <= trace.loop < len(trace.states) - 1:
+        return False
+    fp = Fingerprinter() if fingerprinter is None else fingerprinter
+    return fp.state(trace.states[trace.loop]) == fp.state(trace.states[-1])
@@ -0,0 +1,319 @@
+"""
+Profiling of decoding and encoding of ITF traces.
+
+Decoding is profiled by passing a `Profiler` to `trace_from_json`, which
+measures the time of every state, every variable, and every kind of values.
+Encoding is profiled by `profile_trace_to_json`, which encodes traces as
+`trace_to_json` does. Without a profiler, nothing is instrumented, so there
+is no overhead.
+"""
+
+import json
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .itf import (
+    Decoder,
+    ImmutableDict,
+    ImmutableList,
+    ITFUnserializable,
+    Trace,
+    ValuePool,
+    trace_from_json,
+    value_to_json,
+)
+from .persistent import PMap, PSet
+
+# the kinds of ITF values that are counted
+KINDS = (
+    "bool",
+    "int",
+    "str",
+    "list",
+    "#bigint",
+    "#tup",
+    "#set",
+    "#map",
+    "#unserializable",
+    "record",
+    "variant",
+)
+
+
+def count_kinds(val: Any) -> Dict[str, int]:
+    """Count the nodes of a JSON value by their ITF kinds, see `KINDS`."""
+    counts: Counter[str] = Counter()
+    stack = [val]
+    while stack:
+        val = stack.pop()
+        if isinstance(val, bool):
+            counts["bool"] += 1
+        elif isinstance(val, int):
+            counts["int"] += 1
+        elif isinstance(val, str):
+            counts["str"] += 1
+        elif isinstance(val, list):
+            counts["list"] += 1
+            stack.extend(val)
+        elif isinstance(val, dict):
+            if "#bigint" in val:
+                counts["#bigint"] += 1
+            elif "#tup" in val:
+                counts["#tup"] += 1
+                stack.extend(val["#tup"])
+            elif "#set" in val:
+                counts["#set"] += 1
+                stack.extend(val["#set"])
+            elif "#map" in val:
+                counts["#map"] += 1
+                for k, v in val["#map"]:
+                    stack += (k, v)
+            elif "#unserializable" in val:
+                counts["#unserializable"] += 1
+            elif len(val) == 2 and "tag" in val and "value" in val:
+                counts["variant"] += 1
+                payload = val["value"]
+                if isinstance(payload, dict):
+                    stack.extend(payload.values())
+                else:
+                    stack.append(payload)
+            else:
+                counts["record"] += 1
+                stack.extend(val.values())
+    return dict(counts)
+
+
+# the kinds of decoded values by their classes, except for records and
+# tagged unions, whose classes are created on demand
+_CLASS_KINDS = {
+    bool: "bool",
+    int: "int",
+    str: "str",
+    ImmutableList: "list",
+    tuple: "#tup",
+    frozenset: "#set",
+    PSet: "#set",
+    ImmutableDict: "#map",
+    PMap: "#map",
+    ITFUnserializable: "#unserializable",
+}
+
+
+def _kind_of(value: Any) -> str:
+    cls = value.__class__
+    kind = _CLASS_KINDS.get(cls)
+    if kind is not None:
+        return kind
+    if hasattr(cls, "_itf_variant"):
+        return "variant"
+    return "record" if hasattr(cls, "_fields") else cls.__name__
+
+
+@dataclass
+class VarProfile:
+    """The measurements of a state variable over all states."""
+
+    seconds: float = 0.0
+    # the size of the JSON text of the values
+    json_bytes: int = 0
+    # the number of memory blocks allocated by decoding, or by encoding
+    blocks: int = 0
+    kinds: Dict[str, int] = field(default_factory=dict)
+    # the time of decoding the values of every kind, apart from their
+    # components, where "int" includes "#bigint"
+    kind_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class Profile:
+    """The measurements of decoding or encoding a trace."""
+
+    seconds: float = 0.0
+    state_seconds: List[float] = field(default_factory=list)
+    vars: Dict[str, VarProfile] = field(default_factory=dict)
+    # the time of decoding the values of every kind in all variables
+    kind_seconds: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def kinds(self) -> Dict[str, int]:
+        """The number of the nodes of every kind in all variables."""
+        counts: Counter[str] = Counter()
+        for var in self.vars.values():
+            counts.update(var.kinds)
+        return dict(counts)
+
+    def to_json(self) -> Dict[str, Any]:
+        """The report as JSON."""
+        result = asdict(self)
+        result["kinds"] = self.kinds
+        return result
+
+    def summary(self) -> str:
+        """The report as a table, from the slowest variable."""
+        lines = [f"total {self.seconds * 1e3:.1f} ms, {len(self.state_seconds)} states"]
+        by_kind = sorted(self.kind_seconds.items(), key=lambda kv: -kv[1])
+        if by_kind:
+            lines.append(", ".join(f"{k}: {s * 1e3:.2f} ms" for k, s in by_kind))
+        lines.append(f"{'variable':<24} {'ms':>9} {'KB':>9} {'blocks':>9}  kinds")
+        by_time = sorted(self.vars.items(), key=lambda kv: -kv[1].seconds)
+        for name, var in by_time:
+            kinds = ", ".join(f"{k}: {n}" for k, n in sorted(var.kinds.items()))
+            lines.append(
+                f"{name:<24} {var.seconds * 1e3:>9.2f} {var.json_bytes / 1e3:>9.1f}"
+                f" {var.blocks:>9}  {kinds}"
+            )
+        return "\n".join(lines)
+
+    def _var(self, name: str) -> VarProfile:
+        var = self.vars.get(name)
+        if var is None:
+            var = self.vars[name] = VarProfile()
+        return var
+
+    def _add(self, name: str, seconds: float, raw: Any, blocks: int) -> None:
+        var = self._var(name)
+        var.seconds += seconds
+        var.blocks += blocks
+        var.json_bytes += len(json.dumps(raw))
+        counts = Counter(var.kinds)
+        counts.update(count_kinds(raw))
+        var.kinds = dict(counts)
+
+
+class _TimingPool(ValuePool):
+    """The pool of a profiler: it measures the time between the interned
+    values, and interns them in the pool of the caller, if any."""
+
+    def __init__(self, profiler: "Profiler", pool: Optional[ValuePool]) -> None:
+        # the values are stored in the pool of the caller, not here
+        self.profiler = profiler
+        self.pool = pool
+
+    def __len__(self) -> int:
+        return 0 if self.pool is None else len(self.pool)
+
+    def intern(self, value: Any) -> Any:
+        if self.pool is not None:
+            value = self.pool.intern(value)
+        profiler = self.profiler
+        now = time.perf_counter()
+        kind = _kind_of(value)
+        seconds = now - profiler._last
+        total = profiler.profile.kind_seconds
+        total[kind] = total.get(kind, 0.0) + seconds
+        if profiler._var is not None:
+            var = profiler._var.kind_seconds
+            var[kind] = var.get(kind, 0.0) + seconds
+        # do not count the time of the profiler
+        profiler._last = time.perf_counter()
+        return value
+
+
+class Profiler:
+    """Measures decoding, when it is passed to `trace_from_json`:
+
+        profiler = Profiler()
+        trace = trace_from_json(data, profiler=profiler)
+        print(profiler.report().summary())
+
+    The time between two decoded values is attributed to the kind of the
+    latter value, which is the time of decoding this value apart from its
+    components. Besides, the time of every state and every variable, the
+    memory blocks allocated by decoding the variables, the size of their
+    JSON, and the kinds of their values are measured. To measure the time
+    by kinds in `value_from_json` or in compiled decoders, pass them the
+    pool `profiler.wrap_pool(pool)`."""
+
+    def __init__(self) -> None:
+        self.profile = Profile()
+        # the variable that is being decoded, if any
+        self._var: Optional[VarProfile] = None
+        self._last = time.perf_counter()
+        self._measurements: List[Tuple[str, float, Any, int]] = []
+
+    def wrap_pool(self, pool: Optional[ValuePool] = None) -> ValuePool:
+        """A pool that measures the time of every interned value, and interns
+        the values in `pool`, if it is given."""
+        if isinstance(pool, _TimingPool) and pool.profiler is self:
+            return pool
+        return _TimingPool(self, pool)
+
+    def decode_values(
+        self, raw_state: Dict[str, Any], decoders: Dict[str, Decoder], generic: Decoder
+    ) -> Dict[str, Any]:
+        """Decode the variables of a state with their decoders, or with the
+        generic decoder, and measure them."""
+        perf_counter = time.perf_counter
+        allocated_blocks = sys.getallocatedblocks
+        state_start = perf_counter()
+        values = {}
+        for name, raw in raw_state.items():
+            if name == "#meta":
+                continue
+            self._var = self.profile._var(name)
+            blocks = allocated_blocks()
+            var_start = self._last = perf_counter()
+            values[name] = decoders.get(name, generic)(raw)
+            seconds = perf_counter() - var_start
+            self._measurements.append((name, seconds, raw, allocated_blocks() - blocks))
+        self._var = None
+        self.profile.state_seconds.append(perf_counter() - state_start)
+        return values
+
+    def report(self) -> Profile:
+        """The measurements so far. The JSON of the variables is analyzed
+        here, after the time has been measured."""
+        for measurement in self._measurements:
+            self.profile._add(*measurement)
+        self._measurements.clear()
+        return self.profile
+
+
+def profile_trace_from_json(
+    data: Dict[str, Any], use_var_types: bool = True, intern: bool = False
+) -> Tuple[Trace, Profile]:
+    """Deserialize a Trace from JSON with `trace_from_json` and a `Profiler`,
+    and report the measurements."""
+    profiler = Profiler()
+    start = time.perf_counter()
+    trace = trace_from_json(data, use_var_types, intern, profiler=profiler)
+    seconds = time.perf_counter() - start
+    profile = profiler.report()
+    profile.seconds = seconds
+    return trace, profile
+
+
+def profile_trace_to_json(trace: Trace) -> Tuple[Dict[str, Any], Profile]:
+    """Serialize a Trace to JSON, as `trace_to_json` does, with the same
+    measurements as `profile_trace_from_json`."""
+    perf_counter = time.perf_counter
+    allocated_blocks = sys.getallocatedblocks
+    profile = Profile()
+    start = perf_counter()
+    measurements: List[Tuple[str, float, Any, int]] = []
+    states = []
+    for state in trace.states:
+        state_start = perf_counter()
+        raw_state: Dict[str, Any] = {"#meta": state.meta}
+        for name, value in state.values.items():
+            blocks = allocated_blocks()
+            var_start = perf_counter()
+            raw = raw_state[name] = value_to_json(value)
+            seconds = perf_counter() - var_start
+            measurements.append((name, seconds, raw, allocated_blocks() - blocks))
+        states.append(raw_state)
+        profile.state_seconds.append(perf_counter() - state_start)
+    result = {
+        "#meta": trace.meta,
+        "params": trace.params,
+        "vars": trace.vars,
+        "loop": trace.loop,
+        "states": states,
+    }
+    profile.seconds = perf_counter() - start
+    for measurement in measurements:
+        profile._add(*measurement)
+    return result, profile
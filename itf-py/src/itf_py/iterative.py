@@ -0,0 +1,266 @@
+"""
+Decoding and encoding of ITF values with an explicit stack instead of recursion.
+
+The results are the same as of `value_from_json` and `value_to_json`, but the
+depth of the values is not bounded by the recursion limit of Python.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .itf import (
+    ImmutableDict,
+    ImmutableList,
+    ITFUnserializable,
+    ValuePool,
+    _make_encoder,
+    _record_classes,
+)
+from .persistent import PMap, PSet
+
+# Builds a decoded value from the decoded components.
+Builder = Callable[[List[Any]], Any]
+
+# marks the values whose components have not been processed yet
+_PENDING = object()
+
+
+def _build_map(items: List[Any]) -> Any:
+    return ImmutableDict(dict(zip(items[::2], items[1::2])))
+
+
+def _build_pmap(items: List[Any]) -> Any:
+    return PMap(zip(items[::2], items[1::2]))
+
+
+def value_from_json_iterative(
+    val: Any, pool: Optional[ValuePool] = None, persistent: bool = False
+) -> Any:
+    """Deserialize a Python value from JSON, as `value_from_json` does.
+    The components are decoded with an explicit stack."""
+    intern = None if pool is None else pool.intern
+    build_set: Builder = PSet if persistent else frozenset
+    build_map = _build_pmap if persistent else _build_map
+    # the stack of the values under construction: the builder, the JSON of
+    # the components, and the components that have been decoded so far
+    stack: List[Tuple[Builder, List[Any], List[Any]]] = []
+    current = val
+    while True:
+        # decode the current JSON value, or start decoding its components
+        cls = current.__class__
+        build: Optional[Builder] = None
+        items: List[Any]
+        value: Any
+        if cls is list:
+            build, items = ImmutableList, current
+        elif cls is dict:
+            if "#bigint" in current:
+                value = int(current["#bigint"])
+            elif "#tup" in current:
+                build, items = tuple, current["#tup"]
+            elif "#set" in current:
+                build, items = build_set, current["#set"]
+            elif "#map" in current:
+                build, items = build_map, [x for kv in current["#map"] for x in kv]
+            elif "#unserializable" in current:
+                value = ITFUnserializable(value=current["#unserializable"])
+            elif len(current) == 2 and "tag" in current and "value" in current:
+                payload = current["value"]
+                if payload.__class__ is dict:
+                    rec: Any = _record_classes.get(current["tag"], tuple(payload), True)
+                    build, items = rec._make, list(payload.values())
+                else:
+                    rec = _record_classes.get(current["tag"], ("value",), True)
+                    build, items = rec._make, [payload]
+            else:
+                rec = _record_classes.get("Rec", tuple(current), False)
+                build, items = rec._make, list(current.values())
+        else:
+            value = current  # int, str, bool
+        if build is None:
+            if intern is not None:
+                value = intern(value)
+        else:
+            stack.append((build, items, []))
+            value = _PENDING
+
+        # pass the decoded value to the enclosing values, and find the next
+        # component that has components itself, decoding the others in place
+        while stack:
+            build, items, decoded = stack[-1]
+            if value is not _PENDING:
+                decoded.append(value)
+            i = len(decoded)
+            n = len(items)
+            while i < n:
+                item = items[i]
+                cls = item.__class__
+                if cls is str or cls is int or cls is bool:
+                    decoded.append(item if intern is None else intern(item))
+                else:
+                    break
+                i += 1
+            if i < n:
+                current = items[i]
+                break
+            stack.pop()
+            value = build(decoded)
+            if intern is not None:
+                value = intern(value)
+        else:
+            return value
+
+
+# The components of a Python value and the builder of its JSON from the JSON
+# of the components, or None and the encoder of the values without components.
+IterEncoder = Tuple[Optional[Callable[[Any], List[Any]]], Callable[..., Any]]
+
+# the iterative encoders of the classes that have been serialized so far
+_iter_encoders: Dict[type, IterEncoder] = {}
+
+# evict the encoders when there are too many classes, e.g., dynamic records
+_MAX_ENCODERS = 4096
+
+
+def value_to_json_iterative(val: Any) -> Any:
+    """Serialize a Python value into JSON, as `value_to_json` does.
+    The components are encoded with an explicit stack."""
+    # the stack of the values under construction: the value, the builder,
+    # the components, and the JSON of the components encoded so far
+    stack: List[Tuple[Any, Callable[..., Any], List[Any], List[Any]]] = []
+    current = val
+    while True:
+        cls = current.__class__
+        result: Any
+        if cls is str or cls is bool:
+            result = current
+        elif cls is int:
+            result = {"#bigint": str(current)}
+        else:
+            encoder = _iter_encoders.get(cls)
+            if encoder is None:
+                encoder = _make_iter_encoder(current)
+                if len(_iter_encoders) >= _MAX_ENCODERS:
+                    _iter_encoders.clear()
+                _iter_encoders[cls] = encoder
+            components, build = encoder
+            if components is None:
+                result = build(current)
+            else:
+                stack.append((current, build, components(current), []))
+                result = _PENDING
+
+        # pass the JSON to the enclosing values, and find the next component
+        # that has components itself, encoding the other components in place
+        while stack:
+            parent, build, items, encoded = stack[-1]
+            if result is not _PENDING:
+                encoded.append(result)
+            i = len(encoded)
+            n = len(items)
+            while i < n:
+                item = items[i]
+                cls = item.__class__
+                if cls is str or cls is bool:
+                    encoded.append(item)
+                elif cls is int:
+                    encoded.append({"#bigint": str(item)})
+                else:
+                    break
+                i += 1
+            if i < n:
+                current = items[i]
+                break
+            stack.pop()
+            result = build(parent, encoded)
+        else:
+            return result
+
+
+def _make_iter_encoder(val: Any) -> IterEncoder:
+    """Choose the iterative encoder of the class of the value, following
+    the cases of `_make_encoder`."""
+    cls = val.__class__
+    if isinstance(val, (bool, str, int)):
+        return None, _make_encoder(val)
+    elif isinstance(val, tuple) and not hasattr(val, "_fields"):
+        return list, _build_tuple
+    elif isinstance(val, (frozenset, PSet)):
+        return list, _build_set
+    elif isinstance(val, (dict, PMap)):
+        return _map_items, _build_map_json
+    elif isinstance(val, list):
+        return list, _build_list
+    elif hasattr(val, "__dict__"):
+        if not hasattr(cls, "_itf_variant"):
+            return _object_items, _build_object
+        else:
+            return _object_items, _build_object_variant
+    elif isinstance(val, tuple) and hasattr(val, "_fields"):
+        fields = tuple(val._fields)
+        if not hasattr(cls, "_itf_variant"):
+            return list, _make_record_builder(fields)
+        elif len(fields) == 0:
+            return None, _make_encoder(val)
+        else:
+            return list, _make_variant_builder(cls.__name__, fields)
+    else:
+        return None, _make_encoder(val)
+
+
+def _map_items(val: Any) -> List[Any]:
+    return [x for kv in val.items() for x in kv]
+
+
+def _object_items(val: Any) -> List[Any]:
+    return list(val.__dict__.values())
+
+
+def _build_tuple(val: Any, items: List[Any]) -> Any:
+    return {"#tup": items}
+
+
+def _build_set(val: Any, items: List[Any]) -> Any:
+    return {"#set": items}
+
+
+def _build_map_json(val: Any, items: List[Any]) -> Any:
+    return {"#map": [list(kv) for kv in zip(items[::2], items[1::2])]}
+
+
+def _build_list(val: Any, items: List[Any]) -> Any:
+    return items
+
+
+def _build_object(val: Any, items: List[Any]) -> Any:
+    return dict(zip(val.__dict__.keys(), items))
+
+
+def _build_object_variant(val: Any, items: List[Any]) -> Any:
+    keys = list(val.__dict__.keys())
+    if len(keys) == 0:
+        return {"tag": val.__class__.__name__, "value": None}
+    elif keys == ["value"]:
+        return {"tag": val.__class__.__name__, "value": items[0]}
+    else:
+        return {"tag": val.__class__.__name__, "value": dict(zip(keys, items))}
+
+
+def _make_record_builder(fields: Tuple[str, ...]) -> Callable[..., Any]:
+    def build_record(val: Any, items: List[Any]) -> Any:
+        return dict(zip(fields, items))
+
+    return build_record
+
+
+def _make_variant_builder(tag_name: str, fields: Tuple[str, ...]) -> Callable[..., Any]:
+    if fields == ("value",):
+
+        def build_variant(val: Any, items: List[Any]) -> Any:
+            return {"tag": tag_name, "value": items[0]}
+
+    else:
+
+        def build_variant(val: Any, items: List[Any]) -> Any:
+            return {"tag": tag_name, "value": dict(zip(fields, items))}
+
+    return build_variant
@@ -1,9 +1,42 @@
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping, MutableMapping
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, NoReturn, Optional, SupportsIndex
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    NoReturn,
+    Optional,
+    SupportsIndex,
+    Tuple,
+)
 
 from frozendict import frozendict
 
+from .persistent import PMap, PSet
+from .vartypes import (
+    ConstType,
+    FunType,
+    ITFType,
+    PrimType,
+    RecordType,
+    SeqType,
+    SetType,
+    TupleType,
+    VariantType,
+    parse_type,
+)
+
+if TYPE_CHECKING:
+    from .columnar import ColumnarTrace
+    from .instrument import Profiler
+    from .query import TraceQuery
+
 
 def itf_variant(cls):  # type: ignore[no-untyped-def]
     """Decorator to mark a class as an ITF variant type as opposed to a record."""
@@ -12,15 +45,15 @@ def itf_variant(cls):  # type: ignore[no-untyped-def]
     return cls
 
 
-@dataclass
+@dataclass(slots=True)
 class State:
     """A single state in an ITF trace as a Python object."""
 
     meta: Dict[str, Any]
-    values: Dict[str, Any]
+    values: MutableMapping[str, Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class Trace:
     """An ITF trace as a Python object."""
 
@@ -30,6 +63,18 @@ class Trace:
     states: List[State]
     loop: Optional[int]
 
+    def columns(self) -> "ColumnarTrace":
+        """View the trace as columns, one per state variable."""
+        from .columnar import ColumnarTrace
+
+        return ColumnarTrace.from_trace(self)
+
+    def query(self) -> "TraceQuery":
+        """Query the states of the trace, see `TraceQuery`."""
+        from .query import TraceQuery
+
+        return TraceQuery(self)
+
 
 class ImmutableList(list):
     """An immutable wrapper around list that supports hashing,
@@ -38,11 +83,21 @@ class ImmutableList(list):
     # frozenlist.FrozenList is what we want, but it does not display
     # nicely in pretty-printing.
 
+    __slots__ = ("_hash",)
+
     def __init__(self, items: Iterable[Any]):
         super().__init__(items)
+        self._hash: Optional[int] = None
 
     def __hash__(self) -> int:  # type: ignore
-        return hash(tuple(self))
+        # the list cannot be modified, so its hash is computed once
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __reduce__(self) -> Any:
+        # the default protocol of list subclasses calls `extend`
+        return (ImmutableList, (list(self),))
 
     def _forbid_modification(self) -> NoReturn:
         """Forbid modification of the list."""
@@ -75,6 +130,15 @@ class ImmutableList(list):
     def reverse(self) -> NoReturn:
         self._forbid_modification()
 
+    def sort(self, *_args: Any, **_kwargs: Any) -> NoReturn:
+        self._forbid_modification()
+
+    def __iadd__(self, _values: Iterable[Any]) -> NoReturn:  # type: ignore
+        self._forbid_modification()
+
+    def __imul__(self, _count: SupportsIndex) -> NoReturn:
+        self._forbid_modification()
+
 
 class ImmutableDict(frozendict):
     """A wrapper around frozendict that displays dictionaries as
@@ -100,22 +164,131 @@ class ITFUnserializable:
     value: str
 
 
-def value_from_json(val: Any) -> Any:
-    """Deserialize a Python value from JSON"""
+class RecordCacheInfo(NamedTuple):
+    """Statistics of the record class cache, similar to `functools.lru_cache`."""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class RecordClassCache:
+    """A bounded cache of the named-tuple classes that represent records and
+    tagged unions. The classes are keyed by their shape, that is, by the tag
+    (or "Rec"), the field names, and whether the class is a variant.
+
+    Records of the same shape share one class. When the cache is full,
+    the least recently used class is evicted."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._classes: OrderedDict[Tuple[str, Tuple[str, ...], bool], type] = (
+            OrderedDict()
+        )
+
+    def get(self, name: str, fields: Tuple[str, ...], variant: bool) -> type:
+        """Get the class for the given shape, creating it if needed."""
+        key = (name, fields, variant)
+        cached = self._classes.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._classes.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        cls = namedtuple(name, fields)  # type: ignore[misc]
+        # the class cannot be found by its name, so pickle its shape
+        cls.__reduce__ = _reduce_record  # type: ignore[method-assign,assignment]
+        if variant:
+            itf_variant(cls)
+        self._classes[key] = cls
+        if len(self._classes) > self.maxsize:
+            self._classes.popitem(last=False)
+        return cls
+
+    def info(self) -> RecordCacheInfo:
+        """Report the cache statistics."""
+        return RecordCacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            maxsize=self.maxsize,
+            currsize=len(self._classes),
+        )
+
+    def clear(self) -> None:
+        """Remove all classes from the cache and reset the statistics."""
+        self._classes.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_record_classes = RecordClassCache()
+
+
+def _reduce_record(rec: Any) -> Any:
+    cls = rec.__class__
+    shape = (cls.__name__, cls._fields, hasattr(cls, "_itf_variant"))
+    return (_restore_record, (shape, tuple(rec)))
+
+
+def _restore_record(shape: Tuple[str, Tuple[str, ...], bool], values: Any) -> Any:
+    """Restore a pickled record or a tagged union."""
+    return _record_classes.get(*shape)._make(values)  # type: ignore[attr-defined]
+
+
+def record_class_cache_info() -> RecordCacheInfo:
+    """Report the hits and misses of the record class cache
+    that is used by `value_from_json`."""
+    return _record_classes.info()
+
+
+def record_class_cache_clear() -> None:
+    """Clear the record class cache that is used by `value_from_json`."""
+    _record_classes.clear()
+
+
+def value_from_json(
+    val: Any, pool: Optional["ValuePool"] = None, persistent: bool = False
+) -> Any:
+    """Deserialize a Python value from JSON. If a pool is given, equal values
+    are interned in the pool, that is, they are represented by the same object.
+    If `persistent` is True, sets and maps are decoded as `PSet` and `PMap`
+    instead of `frozenset` and `ImmutableDict`.
+    The values that are nested too deeply for recursion are decoded with
+    `value_from_json_iterative`."""
+    try:
+        return _value_from_json(val, pool, persistent)
+    except RecursionError:
+        from .iterative import value_from_json_iterative
+
+        return value_from_json_iterative(val, pool, persistent)
+
+
+def _value_from_json(val: Any, pool: Optional["ValuePool"], persistent: bool) -> Any:
+    result: Any
     if isinstance(val, list):
-        return ImmutableList([value_from_json(v) for v in val])
+        result = ImmutableList([_value_from_json(v, pool, persistent) for v in val])
     elif isinstance(val, dict):
         if "#bigint" in val:
-            return int(val["#bigint"])
+            result = int(val["#bigint"])
         elif "#tup" in val:
-            return tuple(value_from_json(v) for v in val["#tup"])
+            result = tuple(_value_from_json(v, pool, persistent) for v in val["#tup"])
         elif "#set" in val:
-            return frozenset(value_from_json(v) for v in val["#set"])
+            elems = [_value_from_json(v, pool, persistent) for v in val["#set"]]
+            result = PSet(elems) if persistent else frozenset(elems)
         elif "#map" in val:
-            d = {value_from_json(k): value_from_json(v) for (k, v) in val["#map"]}
-            return ImmutableDict(d)
+            d = {
+                _value_from_json(k, pool, persistent): _value_from_json(
+                    v, pool, persistent
+                )
+                for (k, v) in val["#map"]
+            }
+            result = PMap(d) if persistent else ImmutableDict(d)
         elif "#unserializable" in val:
-            return ITFUnserializable(value=val["#unserializable"])
+            result = ITFUnserializable(value=val["#unserializable"])
         else:
             ks = val.keys()
             if len(ks) == 2 and "tag" in ks and "value" in ks:
@@ -125,123 +298,681 @@ def value_from_json(val: Any) -> Any:
                 if isinstance(value_field, dict):
                     # The value is a record: {"tag": "Banana", "value": {"length": 5}}
                     # Decorate it with @itf_variant.
-                    union_type_record = itf_variant(
-                        namedtuple(val["tag"], value_field.keys())
+                    union_type_record = _record_classes.get(
+                        val["tag"], tuple(value_field.keys()), True
                     )
-                    return union_type_record(
-                        **{k: value_from_json(v) for k, v in value_field.items()}
+                    result = union_type_record(
+                        **{
+                            k: _value_from_json(v, pool, persistent)
+                            for k, v in value_field.items()
+                        }
                     )
                 else:
                     # The value is a scalar: {"tag": "Banana", "value": "u_OF_UNIT"}
                     # Decorate it with @itf_variant.
-                    union_type_scalar = itf_variant(namedtuple(val["tag"], ["value"]))
-                    return union_type_scalar(value=value_from_json(value_field))
+                    union_type_scalar = _record_classes.get(
+                        val["tag"], ("value",), True
+                    )
+                    result = union_type_scalar(
+                        value=_value_from_json(value_field, pool, persistent)
+                    )
             else:
                 # This is a general record, e.g., {"field1": ..., "field2": ...}.
-                rec_type = namedtuple("Rec", list(val.keys()))  # type: ignore[misc]
-                return rec_type(**{k: value_from_json(v) for k, v in val.items()})
+                rec_type = _record_classes.get("Rec", tuple(val.keys()), False)
+                result = rec_type(
+                    **{k: _value_from_json(v, pool, persistent) for k, v in val.items()}
+                )
     else:
-        return val  # int, str, bool
+        result = val  # int, str, bool
+    return result if pool is None else pool.intern(result)
+
+
+class ValuePool:
+    """A pool of interned values. Equal values that are interned in the pool
+    are represented by the same object, which saves memory and makes comparison
+    of equal values cheap.
+
+    The pool assumes that the components of an interned value have been
+    interned already, as `value_from_json` does. Hence, the values are compared
+    by their types and by the identities of their components."""
+
+    def __init__(self) -> None:
+        self._values: Dict[Any, Any] = {}
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def intern(self, value: Any) -> Any:
+        """Return the value in the pool that is equal to the given one,
+        adding the given value to the pool if there is no such value."""
+        cls = value.__class__
+        key: Any
+        if cls is frozenset or cls is PSet:
+            key = (cls, frozenset(map(id, value)))
+        elif cls is ImmutableDict or cls is PMap:
+            key = (cls, frozenset([(id(k), id(v)) for k, v in value.items()]))
+        elif cls is ImmutableList or isinstance(value, tuple):
+            key = (cls, tuple(map(id, value)))
+        elif cls is ITFUnserializable:
+            key = (cls, value.value)
+        else:
+            # int, str, bool, None
+            key = (cls, value)
+        interned = self._values.setdefault(key, value)
+        if interned is not value:
+            self.hits += 1
+        return interned
+
+
+# A function that decodes the JSON values of a fixed type.
+Decoder = Callable[[Any], Any]
+
+
+# The typed decoders fall back to `value_from_json` on the values that do not
+# have the expected shape, e.g., {"#unserializable": "Nat"} of any type.
+
+
+def _decode_int(val: Any) -> Any:
+    if val.__class__ is dict:
+        return int(val["#bigint"]) if "#bigint" in val else value_from_json(val)
+    return val
+
+
+def _decode_as_is(val: Any) -> Any:
+    return value_from_json(val) if val.__class__ is dict else val
+
+
+def compile_decoder(
+    typ: ITFType, pool: Optional[ValuePool] = None, persistent: bool = False
+) -> Decoder:
+    """Compile a decoder of the JSON values of the given type.
+
+    The decoder produces the same values as `value_from_json`, but it does not
+    have to inspect the JSON values to find out how to decode them.
+    Type variables and unsupported types are decoded via `value_from_json`.
+    If a pool is given, the decoded values are interned in the pool.
+    If `persistent` is True, sets and maps are decoded as `PSet` and `PMap`."""
+    decode = _compile_decoder(typ, pool, persistent)
+    if pool is None:
+        return decode
+
+    intern = pool.intern
+
+    def decode_and_intern(val: Any) -> Any:
+        return intern(decode(val))
+
+    return decode_and_intern
+
+
+def _compile_decoder(
+    typ: ITFType, pool: Optional[ValuePool], persistent: bool
+) -> Decoder:
+    if isinstance(typ, PrimType):
+        if typ.name == "Int":
+            return _decode_int
+        if typ.name in ("Bool", "Str"):
+            return _decode_as_is
+        return _generic_decoder(pool, persistent)
+    elif isinstance(typ, ConstType):
+        # uninterpreted values are serialized as strings, e.g., "u_OF_UNIT"
+        return _decode_as_is
+    elif isinstance(typ, SetType):
+        decode_elem = compile_decoder(typ.elem, pool, persistent)
+        make_set: Callable[[Iterable[Any]], Any] = PSet if persistent else frozenset
+        generic = _generic_decoder(pool, persistent)
+
+        def decode_set(val: Any) -> Any:
+            if val.__class__ is not dict or "#set" not in val:
+                return generic(val)
+            return make_set(map(decode_elem, val["#set"]))
+
+        return decode_set
+    elif isinstance(typ, SeqType):
+        decode_elem = compile_decoder(typ.elem, pool, persistent)
+        generic = _generic_decoder(pool, persistent)
+
+        def decode_seq(val: Any) -> Any:
+            if val.__class__ is not list:
+                return generic(val)
+            return ImmutableList(map(decode_elem, val))
+
+        return decode_seq
+    elif isinstance(typ, FunType):
+        decode_arg = compile_decoder(typ.arg, pool, persistent)
+        decode_res = compile_decoder(typ.res, pool, persistent)
+        make_map: Callable[[Dict[Any, Any]], Any] = (
+            PMap if persistent else ImmutableDict
+        )
+        generic = _generic_decoder(pool, persistent)
+
+        def decode_map(val: Any) -> Any:
+            if val.__class__ is not dict or "#map" not in val:
+                return generic(val)
+            return make_map({decode_arg(k): decode_res(v) for k, v in val["#map"]})
+
+        return decode_map
+    elif isinstance(typ, TupleType):
+        decode_elems = tuple(compile_decoder(t, pool, persistent) for t in typ.elems)
+        generic = _generic_decoder(pool, persistent)
+
+        def decode_tuple(val: Any) -> Any:
+            elems = val.get("#tup") if val.__class__ is dict else None
+            if elems is None or len(elems) != len(decode_elems):
+                return generic(val)
+            return tuple([d(v) for d, v in zip(decode_elems, elems)])
+
+        return decode_tuple
+    elif isinstance(typ, RecordType):
+        decode_fields = _compile_fields_decoder(typ, "Rec", False, pool, persistent)
+        generic = _generic_decoder(pool, persistent)
+
+        def decode_record(val: Any) -> Any:
+            result = decode_fields(val)
+            return generic(val) if result is None else result
+
+        return decode_record
+    elif isinstance(typ, VariantType):
+        return _compile_variant_decoder(typ, pool, persistent)
+    else:
+        return _generic_decoder(pool, persistent)
+
+
+def _generic_decoder(pool: Optional[ValuePool], persistent: bool = False) -> Decoder:
+    if pool is None and not persistent:
+        return value_from_json
+
+    def decode_generic(val: Any) -> Any:
+        return value_from_json(val, pool, persistent)
+
+    return decode_generic
+
+
+def _compile_fields_decoder(
+    typ: RecordType,
+    name: str,
+    variant: bool,
+    pool: Optional[ValuePool],
+    persistent: bool,
+) -> Decoder:
+    """Compile a decoder of the record fields, for a record or for a variant
+    whose value is a record. The decoder returns None if the fields do not
+    match the type."""
+    fields = tuple(f for f, _ in typ.fields)
+    decode_fields = tuple(compile_decoder(t, pool, persistent) for _, t in typ.fields)
+    rec_type: Any = _record_classes.get(name, fields, variant)
+
+    def decode_record_fields(val: Any) -> Any:
+        if val.__class__ is not dict or tuple(val) != fields:
+            # the fields come in a different order, or the type has a row variable
+            return None
+        return rec_type._make([d(v) for d, v in zip(decode_fields, val.values())])
+
+    return decode_record_fields
+
+
+def _compile_variant_decoder(
+    typ: VariantType, pool: Optional[ValuePool], persistent: bool
+) -> Decoder:
+    """Compile a decoder of tagged unions."""
+    options: Dict[str, Decoder] = {}
+    for tag, value_type in typ.options:
+        if isinstance(value_type, RecordType):
+            options[tag] = _compile_fields_decoder(
+                value_type, tag, True, pool, persistent
+            )
+        else:
+            scalar_type = _record_classes.get(tag, ("value",), True)
+            options[tag] = _compile_scalar_variant_decoder(
+                scalar_type, compile_decoder(value_type, pool, persistent)
+            )
+    generic = _generic_decoder(pool, persistent)
+
+    def decode_variant(val: Any) -> Any:
+        if val.__class__ is not dict or len(val) != 2:
+            return generic(val)
+        decode_value = options.get(val.get("tag", ""))
+        result = None if decode_value is None else decode_value(val["value"])
+        return generic(val) if result is None else result
+
+    return decode_variant
+
+
+def _compile_scalar_variant_decoder(union_type: Any, decode_value: Decoder) -> Decoder:
+    def decode_scalar_variant(val: Any) -> Any:
+        return union_type(decode_value(val))
+
+    return decode_scalar_variant
+
+
+def compile_var_decoders(
+    meta: Dict[str, Any], pool: Optional[ValuePool] = None, persistent: bool = False
+) -> Dict[str, Decoder]:
+    """Compile the decoders of the state variables from `#meta.varTypes`.
+
+    The variables whose types cannot be parsed are left out."""
+    decoders = {}
+    for name, type_text in meta.get("varTypes", {}).items():
+        try:
+            decoders[name] = compile_decoder(parse_type(type_text), pool, persistent)
+        except ValueError:
+            pass
+    return decoders
+
+
+# A function that encodes the Python values of a fixed class.
+Encoder = Callable[[Any], Any]
+
+# the encoders of the classes that have been serialized so far
+_encoders: Dict[type, Encoder] = {}
+
+# evict the encoders when there are too many classes, e.g., dynamic records
+_MAX_ENCODERS = 4096
 
 
 def value_to_json(val: Any) -> Any:
-    """Serialize a Python value into JSON"""
-    if isinstance(val, bool):
-        return val
-    elif isinstance(val, str):
-        return val
+    """Serialize a Python value into JSON. The values that are nested too deeply
+    for recursion are encoded with `value_to_json_iterative`."""
+    try:
+        return _value_to_json(val)
+    except RecursionError:
+        from .iterative import value_to_json_iterative
+
+        return value_to_json_iterative(val)
+
+
+def _value_to_json(val: Any) -> Any:
+    encoder = _encoders.get(val.__class__)
+    if encoder is None:
+        encoder = _make_encoder(val)
+        if len(_encoders) >= _MAX_ENCODERS:
+            _encoders.clear()
+        _encoders[val.__class__] = encoder
+    return encoder(val)
+
+
+def _make_encoder(val: Any) -> Encoder:
+    """Choose the encoder of the class of the value. All instances of the class
+    are encoded the same way."""
+    if isinstance(val, (bool, str)):
+        return _encode_as_is
     elif isinstance(val, int):
-        return {"#bigint": str(val)}
+        return _encode_int
     elif isinstance(val, tuple) and not hasattr(val, "_fields"):
-        return {"#tup": [value_to_json(v) for v in val]}
-    elif isinstance(val, frozenset):
-        return {"#set": [value_to_json(v) for v in val]}
-    elif isinstance(val, dict):
-        return {"#map": [[value_to_json(k), value_to_json(v)] for k, v in val.items()]}
+        return _encode_tuple
+    elif isinstance(val, (frozenset, PSet)):
+        return _encode_set
+    elif isinstance(val, (dict, PMap)):
+        return _encode_map
     elif isinstance(val, list):
-        return [value_to_json(v) for v in val]
+        return _encode_list
     elif hasattr(val, "__dict__"):
         # An object-like structure, e.g., a record, or a union.
         # Note that we cannot distinguish between a record and a tagged union here.
         if not hasattr(val.__class__, "_itf_variant"):
-            return {k: value_to_json(v) for k, v in val.__dict__.items()}
+            return _encode_object
         else:
-            # This is a tagged union
-            tag_name = val.__class__.__name__
-            fields_dict = val.__dict__
-            if len(fields_dict) == 0:
-                # No fields: {"tag": "Banana", "value": null}
-                return {
-                    "tag": tag_name,
-                    "value": None,
-                }
-            elif list(fields_dict.keys()) == ["value"]:
-                # Single field named "value": {"tag": "Banana", "value": ...}
-                return {
-                    "tag": tag_name,
-                    "value": value_to_json(fields_dict["value"]),
-                }
-            else:
-                # Multiple fields or a non-value field:
-                #   {"tag": "Banana", "value": {...}}
-                return {
-                    "tag": tag_name,
-                    "value": {k: value_to_json(v) for k, v in fields_dict.items()},
-                }
+            return _encode_object_variant
     elif isinstance(val, tuple) and hasattr(val, "_fields"):
+        fields = tuple(val._fields)
         if not hasattr(val.__class__, "_itf_variant"):
             # Regular record
-            fields_dict = val._asdict()  # type: ignore[attr-defined]
-            return {k: value_to_json(v) for k, v in fields_dict.items()}
+            return _make_record_encoder(fields)
         else:
             # This is a tagged union
-            tag_name = val.__class__.__name__
-            fields_dict = val._asdict()  # type: ignore[attr-defined]
-            if len(fields_dict) == 0:
-                # No fields: {"tag": "Banana", "value": null}
-                return {
-                    "tag": tag_name,
-                    "value": None,
-                }
-            elif list(fields_dict.keys()) == ["value"]:
-                # Single field named "value": {"tag": "Banana", "value": ...}
-                return {
-                    "tag": tag_name,
-                    "value": value_to_json(fields_dict["value"]),
-                }
-            else:
-                # Multiple fields or a non-value field:
-                #   {"tag": "Banana", "value": {...}}
-                return {
-                    "tag": tag_name,
-                    "value": {k: value_to_json(v) for k, v in fields_dict.items()},
-                }
+            return _make_variant_encoder(val.__class__.__name__, fields)
     else:
-        return ITFUnserializable(value=str(val))
+        return _encode_unserializable
+
+
+def _encode_as_is(val: Any) -> Any:
+    return val
+
+
+def _encode_int(val: Any) -> Any:
+    return {"#bigint": str(val)}
+
 
+def _encode_tuple(val: Any) -> Any:
+    return {"#tup": [_value_to_json(v) for v in val]}
 
-def state_from_json(raw_state: Dict[str, Any]) -> State:
-    """Deserialize a single State from JSON"""
+
+def _encode_set(val: Any) -> Any:
+    return {"#set": [_value_to_json(v) for v in val]}
+
+
+def _encode_map(val: Any) -> Any:
+    return {"#map": [[_value_to_json(k), _value_to_json(v)] for k, v in val.items()]}
+
+
+def _encode_list(val: Any) -> Any:
+    return [_value_to_json(v) for v in val]
+
+
+def _encode_object(val: Any) -> Any:
+    return {k: _value_to_json(v) for k, v in val.__dict__.items()}
+
+
+def _encode_unserializable(val: Any) -> Any:
+    return ITFUnserializable(value=str(val))
+
+
+def _make_record_encoder(fields: Tuple[str, ...]) -> Encoder:
+    def encode_record(val: Any) -> Any:
+        return {k: _value_to_json(v) for k, v in zip(fields, val)}
+
+    return encode_record
+
+
+def _make_variant_encoder(tag_name: str, fields: Tuple[str, ...]) -> Encoder:
+    """Make an encoder of the tagged unions that are named tuples."""
+    if len(fields) == 0:
+        # No fields: {"tag": "Banana", "value": null}
+        def encode_variant(val: Any) -> Any:
+            return {"tag": tag_name, "value": None}
+
+    elif fields == ("value",):
+        # Single field named "value": {"tag": "Banana", "value": ...}
+        def encode_variant(val: Any) -> Any:
+            return {"tag": tag_name, "value": _value_to_json(val[0])}
+
+    else:
+        # Multiple fields or a non-value field:
+        #   {"tag": "Banana", "value": {...}}
+        def encode_variant(val: Any) -> Any:
+            return {
+                "tag": tag_name,
+                "value": {k: _value_to_json(v) for k, v in zip(fields, val)},
+            }
+
+    return encode_variant
+
+
+def _encode_object_variant(val: Any) -> Any:
+    """Encode a tagged union that is an object, e.g., a data class."""
+    tag_name = val.__class__.__name__
+    fields_dict = val.__dict__
+    if len(fields_dict) == 0:
+        # No fields: {"tag": "Banana", "value": null}
+        return {"tag": tag_name, "value": None}
+    elif list(fields_dict.keys()) == ["value"]:
+        # Single field named "value": {"tag": "Banana", "value": ...}
+        return {"tag": tag_name, "value": _value_to_json(fields_dict["value"])}
+    else:
+        # Multiple fields or a non-value field:
+        #   {"tag": "Banana", "value": {...}}
+        return {
+            "tag": tag_name,
+            "value": {k: _value_to_json(v) for k, v in fields_dict.items()},
+        }
+
+
+# marks the variables in LazyValues that do not have up-to-date JSON
+_NO_RAW = object()
+
+
+class LazyValues(MutableMapping[str, Any]):
+    """The values of a state that are decoded from JSON on first access.
+
+    The raw JSON of a variable is kept until it is decoded, and the decoded
+    value is memoized. The variables that have not been assigned since
+    deserialization are serialized by reusing their raw JSON."""
+
+    def __init__(
+        self,
+        raw_values: Dict[str, Any],
+        decoders: Optional[Dict[str, Decoder]] = None,
+        pool: Optional[ValuePool] = None,
+    ):
+        self._raw = raw_values
+        self._decoded: Dict[str, Any] = {}
+        self._decoders = decoders or {}
+        self._pool = pool
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._decoded[key]
+        except KeyError:
+            raw = self._raw[key]
+        decoder = self._decoders.get(key)
+        value = value_from_json(raw, self._pool) if decoder is None else decoder(raw)
+        self._decoded[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._decoded[key] = value
+        self._raw[key] = _NO_RAW
+
+    def __delitem__(self, key: str) -> None:
+        del self._raw[key]
+        self._decoded.pop(key, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the compiled decoders cannot be pickled, use value_from_json instead;
+        # the marker _NO_RAW would not be the same object after unpickling,
+        # so the assigned variables are pickled with their JSON
+        raw = dict(self.json_items())
+        return {**self.__dict__, "_raw": raw, "_decoders": {}, "_pool": None}
+
+    def is_decoded(self, key: str) -> bool:
+        """Whether the value of the variable has been decoded."""
+        return key in self._decoded
+
+    def json_items(self) -> Iterator[Tuple[str, Any]]:
+        """Produce the JSON of every variable, decoding none of them."""
+        for key, raw in self._raw.items():
+            yield key, value_to_json(self._decoded[key]) if raw is _NO_RAW else raw
+
+
+class VarIndex:
+    """The positions of the state variables in `SlotValues`. It is shared by
+    all states of a trace, so the states do not store the variable names."""
+
+    __slots__ = ("names", "positions")
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = []
+        self.positions: Dict[str, int] = {}
+        for name in names:
+            self.position(name)
+
+    def position(self, name: str) -> int:
+        """The position of a variable, adding the variable if needed."""
+        pos = self.positions.get(name)
+        if pos is None:
+            pos = len(self.names)
+            self.names.append(name)
+            self.positions[name] = pos
+        return pos
+
+
+# marks the variables that are missing in a state
+_MISSING = object()
+
+
+class SlotValues(MutableMapping[str, Any]):
+    """The values of a state stored in a tuple, in the order of a variable index
+    that is shared by all states of the trace."""
+
+    __slots__ = ("_index", "_slots")
+
+    def __init__(self, index: VarIndex, values: Mapping[str, Any]):
+        slots = [_MISSING] * len(index.names)
+        for name, value in values.items():
+            pos = index.position(name)
+            if pos >= len(slots):
+                slots.extend([_MISSING] * (pos + 1 - len(slots)))
+            slots[pos] = value
+        self._index = index
+        self._slots = tuple(slots)
+
+    def __getitem__(self, key: str) -> Any:
+        pos = self._index.positions.get(key)
+        if pos is None or pos >= len(self._slots):
+            raise KeyError(key)
+        value = self._slots[pos]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        pos = self._index.position(key)
+        slots = list(self._slots)
+        if pos >= len(slots):
+            slots.extend([_MISSING] * (pos + 1 - len(slots)))
+        slots[pos] = value
+        self._slots = tuple(slots)
+
+    def __delitem__(self, key: str) -> None:
+        self[key]  # raise KeyError if there is no such variable
+        pos = self._index.positions[key]
+        self._slots = self._slots[:pos] + (_MISSING,) + self._slots[pos + 1 :]
+
+    def __iter__(self) -> Iterator[str]:
+        names = self._index.names
+        return (names[i] for i, v in enumerate(self._slots) if v is not _MISSING)
+
+    def __len__(self) -> int:
+        return sum(1 for v in self._slots if v is not _MISSING)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __reduce__(self) -> Any:
+        return (SlotValues, (self._index, dict(self.items())))
+
+
+def _check_decode_options(
+    lazy: bool, compact: bool, persistent: bool, profiler: Optional["Profiler"]
+) -> None:
+    # the variables of lazy states are decoded on access, only by `LazyValues`
+    if lazy and compact:
+        raise ValueError("The options lazy and compact are exclusive")
+    if lazy and persistent:
+        raise ValueError("The options lazy and persistent are exclusive")
+    if lazy and profiler is not None:
+        raise ValueError("The lazy decoding cannot be profiled")
+
+
+def state_from_json(
+    raw_state: Dict[str, Any],
+    decoders: Optional[Dict[str, Decoder]] = None,
+    pool: Optional[ValuePool] = None,
+    *,
+    lazy: bool = False,
+    var_index: Optional[VarIndex] = None,
+    persistent: bool = False,
+    profiler: Optional["Profiler"] = None,
+) -> State:
+    """Deserialize a single State from JSON. The variables that have decoders,
+    e.g., compiled by `compile_var_decoders`, are decoded with them.
+    The other variables are decoded with `value_from_json`, the pool, and
+    the option `persistent`.
+    If `lazy` is True, every variable is decoded on first access.
+    If a variable index is given, the values are stored compactly
+    in `SlotValues`. If a profiler is given, the values are decoded by it,
+    see `itf_py.instrument.Profiler`. The values of the generic decoder are
+    measured by kinds, and so are the values of the decoders that were
+    compiled with `profiler.wrap_pool(pool)`. The option `lazy` cannot be
+    combined with a variable index, `persistent`, or a profiler."""
+    _check_decode_options(lazy, var_index is not None, persistent, profiler)
     state_meta = raw_state["#meta"] if "#meta" in raw_state else {}
-    values = {k: value_from_json(v) for k, v in raw_state.items() if k != "#meta"}
+    values: MutableMapping[str, Any]
+    if lazy:
+        raw_values = {k: v for k, v in raw_state.items() if k != "#meta"}
+        values = LazyValues(raw_values, decoders, pool)
+    elif profiler is not None:
+        generic = _generic_decoder(profiler.wrap_pool(pool), persistent)
+        values = profiler.decode_values(raw_state, decoders or {}, generic)
+    elif decoders:
+        generic = _generic_decoder(pool, persistent)
+        values = {
+            k: decoders.get(k, generic)(v) for k, v in raw_state.items() if k != "#meta"
+        }
+    else:
+        values = {
+            k: value_from_json(v, pool, persistent)
+            for k, v in raw_state.items()
+            if k != "#meta"
+        }
+    if var_index is not None:
+        values = SlotValues(var_index, values)
     return State(meta=state_meta, values=values)
 
 
 def state_to_json(state: State) -> Dict[str, Any]:
     """Serialize a single State to JSON"""
     result = {"#meta": state.meta}
+    if isinstance(state.values, LazyValues):
+        # reuse the JSON of the variables that have not been decoded
+        result.update(state.values.json_items())
+        return result
     for k, v in state.values.items():
         result[k] = value_to_json(v)
     return result
 
 
-def trace_from_json(data: Dict[str, Any]) -> Trace:
-    """Deserialize a Trace from JSON"""
+def trace_from_json(
+    data: Dict[str, Any],
+    use_var_types: bool = True,
+    intern: bool = False,
+    lazy: bool = False,
+    compact: bool = False,
+    persistent: bool = False,
+    profiler: Optional["Profiler"] = None,
+) -> Trace:
+    """Deserialize a Trace from JSON. If the trace carries `#meta.varTypes`,
+    as the traces by Apalache do, the variables are decoded according to their
+    types, unless `use_var_types` is False.
+
+    If `intern` is True, equal values across all states are represented by
+    the same object. This saves memory when consecutive states share most of
+    their values.
+
+    If `lazy` is True, the variables of every state are decoded only on first
+    access, see `LazyValues`. If `compact` is True, the states store their
+    values in `SlotValues` instead of dictionaries, which saves memory when
+    there are many states. The options `lazy` and `compact` are exclusive.
+
+    If `persistent` is True, sets and maps are decoded as `PSet` and `PMap`,
+    which can be updated in O(log n) without copying. This option cannot be
+    combined with `lazy`.
+
+    If a profiler is given, it measures the decoding of all values and
+    states, see `itf_py.instrument.Profiler`. It cannot be combined with
+    `lazy` either."""
+    _check_decode_options(lazy, compact, persistent, profiler)
     meta = data["#meta"] if "#meta" in data else {}
     params = data.get("params", [])
     vars_ = data["vars"]
     loop = data.get("loop", None)
-    states = [state_from_json(s) for s in data["states"]]
+    pool = ValuePool() if intern else None
+    if profiler is not None:
+        # the values are interned in the pool, if any, by the profiler
+        pool = profiler.wrap_pool(pool)
+    decoders = compile_var_decoders(meta, pool, persistent) if use_var_types else None
+    var_index = VarIndex(params + vars_) if compact else None
+    states = [
+        state_from_json(
+            s,
+            decoders,
+            pool,
+            lazy=lazy,
+            var_index=var_index,
+            persistent=persistent,
+            profiler=profiler,
+        )
+        for s in data["states"]
+    ]
     return Trace(meta=meta, params=params, vars=vars_, states=states, loop=loop)
 
 
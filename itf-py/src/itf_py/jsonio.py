@@ -0,0 +1,188 @@
+"""
+Reading and writing ITF traces as JSON text with the fastest available parser.
+
+If orjson is installed, it parses the text, and the values are decoded with
+`trace_from_json`. Otherwise, the standard `json` module parses the text and
+decodes the ITF values in its `object_hook`, while the text is being parsed.
+"""
+
+import io
+import json
+from typing import IO, Any, Dict, List, Optional, Union
+
+from .itf import (
+    ImmutableDict,
+    ImmutableList,
+    ITFUnserializable,
+    State,
+    Trace,
+    ValuePool,
+    _record_classes,
+    trace_from_json,
+    trace_to_json,
+)
+from .writer import dump_trace
+
+# the supported JSON backends, from the fastest
+BACKENDS = ("orjson", "json")
+
+
+def available_backends() -> List[str]:
+    """The names of the JSON backends that are installed."""
+    return [name for name in BACKENDS if _import_backend(name) is not None]
+
+
+def _import_backend(name: str) -> Any:
+    if name == "json":
+        return json
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def _choose_backend(backend: Optional[str]) -> Any:
+    """The module of the given backend, or of the fastest installed backend."""
+    if backend is None:
+        for name in BACKENDS:
+            module = _import_backend(name)
+            if module is not None:
+                return module
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend}")
+    module = _import_backend(backend)
+    if module is None:
+        raise ImportError(f"The JSON backend {backend} is not installed")
+    return module
+
+
+def loads(
+    s: Union[str, bytes],
+    use_var_types: bool = True,
+    intern: bool = False,
+    backend: Optional[str] = None,
+) -> Trace:
+    """Deserialize a Trace from JSON text. The backend is "orjson" or "json";
+    by default, the fastest installed backend is used. The options are as in
+    `trace_from_json`; the `json` backend does not need the types of the
+    variables, since it decodes the values while parsing."""
+    module = _choose_backend(backend)
+    if module is not json:
+        try:
+            data = module.loads(s)
+        except module.JSONDecodeError:
+            # e.g., integers that do not fit into 64 bits, try the standard parser
+            pass
+        else:
+            return trace_from_json(data, use_var_types=use_var_types, intern=intern)
+    return _HookDecoder(ValuePool() if intern else None).loads(s)
+
+
+def load(
+    fp: IO[Any],
+    use_var_types: bool = True,
+    intern: bool = False,
+    backend: Optional[str] = None,
+) -> Trace:
+    """Deserialize a Trace from a file object with JSON text, see `loads`."""
+    return loads(fp.read(), use_var_types, intern, backend)
+
+
+def dumps(trace: Trace, backend: Optional[str] = None) -> str:
+    """Serialize a Trace into JSON text. The text of the `json` backend is
+    the same as of `dump_trace`, whereas orjson produces compact text."""
+    module = _choose_backend(backend)
+    if module is not json:
+        try:
+            return str(module.dumps(trace_to_json(trace)).decode("utf-8"))
+        except TypeError:
+            # e.g., integers that do not fit into 64 bits in the metadata
+            pass
+    out = io.StringIO()
+    dump_trace(trace, out)
+    return out.getvalue()
+
+
+def dump(trace: Trace, fp: IO[str], backend: Optional[str] = None) -> None:
+    """Write a Trace as JSON text to a file object, see `dumps`. The `json`
+    backend writes the text state by state."""
+    if _choose_backend(backend) is json:
+        dump_trace(trace, fp)
+    else:
+        fp.write(dumps(trace, backend))
+
+
+class _HookDecoder:
+    """Decoding of ITF values in the `object_hook` of `json.loads`.
+
+    The hook is called on every JSON object, from the innermost ones, without
+    knowing whether the object is a value, a state, or the metadata. Hence,
+    the hook decodes only the objects with the keys `#bigint`, `#tup`, `#set`,
+    `#map`, and `#unserializable`, and their components. The records, tagged
+    unions, and lists that are not inside such objects are decoded in the
+    states after parsing."""
+
+    def __init__(self, pool: Optional[ValuePool]):
+        self.pool = pool
+
+    def loads(self, s: Union[str, bytes]) -> Trace:
+        data = json.loads(s, object_hook=self.hook)
+        finish = self.finish
+        states = []
+        for raw_state in data["states"]:
+            meta = raw_state.pop("#meta", {})
+            values = {k: finish(v) for k, v in raw_state.items()}
+            states.append(State(meta=meta, values=values))
+        return Trace(
+            meta=data["#meta"] if "#meta" in data else {},
+            params=data.get("params", []),
+            vars=data["vars"],
+            states=states,
+            loop=data.get("loop", None),
+        )
+
+    def hook(self, obj: Dict[str, Any]) -> Any:
+        if len(obj) != 1:
+            return obj
+        finish = self.finish
+        result: Any
+        if "#bigint" in obj:
+            result = int(obj["#bigint"])
+        elif "#set" in obj:
+            result = frozenset([finish(v) for v in obj["#set"]])
+        elif "#tup" in obj:
+            result = tuple([finish(v) for v in obj["#tup"]])
+        elif "#map" in obj:
+            result = ImmutableDict({finish(k): finish(v) for k, v in obj["#map"]})
+        elif "#unserializable" in obj:
+            result = ITFUnserializable(value=obj["#unserializable"])
+        else:
+            return obj
+        return result if self.pool is None else self.pool.intern(result)
+
+    def finish(self, val: Any) -> Any:
+        """Decode the records, tagged unions, and lists, as `value_from_json`
+        does, reusing the values that have been decoded by the hook."""
+        cls = val.__class__
+        result: Any
+        if cls is dict:
+            if len(val) == 2 and "tag" in val and "value" in val:
+                payload = val["value"]
+                if payload.__class__ is dict:
+                    variant: Any = _record_classes.get(val["tag"], tuple(payload), True)
+                    result = variant._make([self.finish(v) for v in payload.values()])
+                else:
+                    scalar: Any = _record_classes.get(val["tag"], ("value",), True)
+                    result = scalar._make([self.finish(payload)])
+            else:
+                record: Any = _record_classes.get("Rec", tuple(val), False)
+                result = record._make([self.finish(v) for v in val.values()])
+        elif cls is list:
+            result = ImmutableList([self.finish(v) for v in val])
+        elif self.pool is None or cls is not int and cls is not str and cls is not bool:
+            # no pool, or a value that has been decoded and interned by the hook
+            return val
+        else:
+            result = val
+        return result if self.pool is None else self.pool.intern(result)
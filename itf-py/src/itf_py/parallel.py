@@ -0,0 +1,269 @@
+"""
+Loading many ITF traces in parallel, and decoding the states of a single large
+trace in parallel.
+"""
+
+import json
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .itf import (
+    ImmutableDict,
+    ImmutableList,
+    State,
+    Trace,
+    ValuePool,
+    compile_var_decoders,
+    state_from_json,
+    trace_from_json,
+)
+
+TracePath = Union[str, "os.PathLike[str]"]
+
+
+@dataclass
+class LoadResult:
+    """The outcome of loading a single trace: either the trace or the error."""
+
+    path: TracePath
+    trace: Optional[Trace] = None
+    error: Optional[BaseException] = None
+
+
+def load_trace_file(
+    path: TracePath, use_var_types: bool = True, intern: bool = False
+) -> Trace:
+    """Read and deserialize a trace from a JSON file."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return trace_from_json(data, use_var_types=use_var_types, intern=intern)
+
+
+def load_traces(
+    paths: Iterable[TracePath],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    use_var_types: bool = True,
+    intern: bool = False,
+) -> Iterator[LoadResult]:
+    """Load the traces from the given files in a pool of worker processes.
+
+    The results come in the order of `paths` if `ordered` is True, and in
+    the order of completion otherwise. An error in one file is reported in
+    its result and does not stop loading of the other files. So are the errors
+    of the pool, e.g., when a trace cannot be pickled, or a worker dies and
+    the traces that it has not returned are lost.
+    By default, there are as many workers as CPUs. With `workers=1`, the traces
+    are loaded in the current process."""
+    paths = list(paths)
+    if workers == 1:
+        for path in paths:
+            yield _load_result(path, use_var_types, intern)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures: Dict[Future[LoadResult], TracePath] = {
+            executor.submit(_load_result, path, use_var_types, intern): path
+            for path in paths
+        }
+        for future in futures if ordered else as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # e.g., PicklingError or BrokenProcessPool
+                result = LoadResult(futures[future], error=e)
+            yield result
+
+
+def _load_result(path: TracePath, use_var_types: bool, intern: bool) -> LoadResult:
+    try:
+        return LoadResult(path, trace=load_trace_file(path, use_var_types, intern))
+    except Exception as e:
+        return LoadResult(path, error=e)
+
+
+# the number of chunks of states per worker, to balance the load
+CHUNKS_PER_WORKER = 4
+
+_WHITESPACE = " \t\n\r"
+
+
+def locate_states(text: str) -> Tuple[Dict[str, Any], List[Tuple[int, int]]]:
+    """Find the states in the JSON text of a trace without decoding them.
+    The result is the other top-level fields of the trace, and the start and
+    end positions of every state in the text."""
+    decoder = json.JSONDecoder()
+    raw_decode = decoder.raw_decode
+    fields: Dict[str, Any] = {}
+    spans: List[Tuple[int, int]] = []
+
+    def skip(pos: int) -> int:
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        if pos == len(text):
+            raise ValueError("Unexpected end of the ITF trace")
+        return pos
+
+    def expect(pos: int, ch: str) -> int:
+        pos = skip(pos)
+        if text[pos] != ch:
+            raise ValueError(f"Expected '{ch}' at {pos}, found '{text[pos]}'")
+        return pos + 1
+
+    pos = expect(0, "{")
+    while True:
+        pos = skip(pos)
+        if text[pos] == "}":
+            break
+        if text[pos] == ",":
+            pos += 1
+            continue
+        key, pos = raw_decode(text, pos)
+        pos = expect(pos, ":")
+        if key != "states":
+            fields[key], pos = raw_decode(text, skip(pos))
+            continue
+        pos = expect(pos, "[")
+        while True:
+            pos = skip(pos)
+            if text[pos] == "]":
+                pos += 1
+                break
+            if text[pos] == ",":
+                pos += 1
+                continue
+            # decoding the state is the fastest way to find its end
+            _, end = raw_decode(text, pos)
+            spans.append((pos, end))
+            pos = end
+    return fields, spans
+
+
+def decode_trace_parallel(
+    text: Union[str, bytes],
+    workers: Optional[int] = None,
+    use_var_types: bool = True,
+    intern: bool = False,
+    executor: Optional[Executor] = None,
+) -> Trace:
+    """Deserialize a Trace from its JSON text, decoding the states in a pool of
+    worker processes. The result is equal to that of `trace_from_json`.
+
+    The states are located in the text by `locate_states`, split into chunks
+    of similar size, and decoded in the workers. The values are interned in
+    every chunk, which makes sending them back cheaper. If `intern` is True,
+    the values are also interned across the chunks, as `trace_from_json` does.
+    By default, there are as many workers as CPUs. With `workers=1`, the states
+    are decoded in the current process. The worker processes of `executor` are
+    used if given, e.g., to decode many traces in the same pool."""
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    fields, spans = locate_states(text)
+    meta = fields.get("#meta", {})
+    num_workers = workers or os.cpu_count() or 1
+    chunks = _split_spans(spans, num_workers * CHUNKS_PER_WORKER)
+    texts = [
+        "[" + ", ".join(text[start:end] for start, end in chunk) + "]"
+        for chunk in chunks
+    ]
+    var_meta = meta if use_var_types else {}
+    if workers == 1 and executor is None:
+        decoded = [_decode_states(t, var_meta) for t in texts]
+    elif executor is not None:
+        decoded = list(executor.map(_decode_states, texts, [var_meta] * len(texts)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            decoded = list(pool.map(_decode_states, texts, [var_meta] * len(texts)))
+    states = [state for chunk_states in decoded for state in chunk_states]
+    if intern:
+        _intern_states(states)
+    return Trace(
+        meta=meta,
+        params=fields.get("params", []),
+        vars=fields["vars"],
+        states=states,
+        loop=fields.get("loop", None),
+    )
+
+
+def load_trace_parallel(
+    path: TracePath,
+    workers: Optional[int] = None,
+    use_var_types: bool = True,
+    intern: bool = False,
+    executor: Optional[Executor] = None,
+) -> Trace:
+    """Read a trace from a JSON file and decode its states in parallel,
+    see `decode_trace_parallel`."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return decode_trace_parallel(text, workers, use_var_types, intern, executor)
+
+
+def _split_spans(
+    spans: List[Tuple[int, int]], num_chunks: int
+) -> List[List[Tuple[int, int]]]:
+    """Split the spans of the states into consecutive chunks of similar size."""
+    if not spans:
+        return []
+    total = spans[-1][1] - spans[0][0]
+    target = max(1, total // num_chunks)
+    chunks: List[List[Tuple[int, int]]] = [[]]
+    chunk_start = spans[0][0]
+    for span in spans:
+        if chunks[-1] and span[0] - chunk_start >= target:
+            chunks.append([])
+            chunk_start = span[0]
+        chunks[-1].append(span)
+    return chunks
+
+
+def _decode_states(text: str, meta: Dict[str, Any]) -> List[State]:
+    """Decode the JSON array of states in a worker."""
+    pool = ValuePool()
+    decoders = compile_var_decoders(meta, pool)
+    return [state_from_json(s, decoders, pool) for s in json.loads(text)]
+
+
+def _intern_states(states: List[State]) -> None:
+    """Intern the values of the states in one pool, replacing the values.
+    The values that have been interned already, e.g., shared by several
+    states, are looked up by their identity. A value is rebuilt only if some
+    of its components have been replaced."""
+    intern = ValuePool().intern
+    # the original values, kept alive so their identities are not reused,
+    # and the interned values
+    memo: Dict[int, Tuple[Any, Any]] = {}
+    get = memo.get
+
+    def intern_deep(value: Any) -> Any:
+        entry = get(id(value))
+        if entry is not None:
+            return entry[1]
+        cls = value.__class__
+        result = value
+        if cls is ImmutableDict:
+            items = [(intern_deep(k), intern_deep(v)) for k, v in value.items()]
+            if any(
+                k is not k0 or v is not v0
+                for (k, v), (k0, v0) in zip(items, value.items())
+            ):
+                result = ImmutableDict(dict(items))
+        elif cls is ImmutableList or cls is frozenset or isinstance(value, tuple):
+            elems = [intern_deep(v) for v in value]
+            if any(e is not e0 for e, e0 in zip(elems, value)):
+                if cls is ImmutableList or cls is frozenset or cls is tuple:
+                    result = cls(elems)
+                else:
+                    # records and tagged unions
+                    result = cls._make(elems)
+        result = intern(result)
+        memo[id(value)] = (value, result)
+        return result
+
+    for state in states:
+        values = state.values
+        for name, value in values.items():
+            values[name] = intern_deep(value)
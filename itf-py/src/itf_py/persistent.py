@@ -0,0 +1,351 @@
+"""
+Persistent sets and maps: immutable collections with cheap updates.
+
+The collections are hash array mapped tries. An update copies only the path
+from the root to the changed entry, at most one node of 32 entries per 5 bits
+of the hash, and shares the rest of the trie with the original collection.
+"""
+
+from collections.abc import ItemsView, Iterable, Iterator, Mapping, Set, ValuesView
+from typing import Any, List, Optional, Tuple
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+
+# A leaf of the trie: the hash of the key, the key, and the value.
+_Leaf = Tuple[int, Any, Any]
+
+
+class _Node:
+    """An inner node of the trie. The bitmap tells which of the 32 slots
+    are occupied; the entries of the occupied slots are stored in order."""
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap: int, entries: Tuple[Any, ...]):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision:
+    """A node of the keys that have the same hash."""
+
+    __slots__ = ("hash", "leaves")
+
+    def __init__(self, hash: int, leaves: Tuple[_Leaf, ...]):
+        self.hash = hash
+        self.leaves = leaves
+
+
+_EMPTY = _Node(0, ())
+
+# marks the missing keys
+_MISSING = object()
+
+
+def _hash(key: Any) -> int:
+    return hash(key) & _HASH_MASK
+
+
+def _find(node: Any, h: int, key: Any) -> Any:
+    shift = 0
+    while True:
+        if node.__class__ is _Collision:
+            for leaf in node.leaves:
+                if leaf[1] is key or leaf[1] == key:
+                    return leaf[2]
+            return _MISSING
+        bit = 1 << ((h >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return _MISSING
+        entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+        if entry.__class__ is tuple:
+            if entry[0] == h and (entry[1] is key or entry[1] == key):
+                return entry[2]
+            return _MISSING
+        node = entry
+        shift += _BITS
+
+
+def _merge(shift: int, a: _Leaf, b: _Leaf) -> Any:
+    """Make a node of two leaves with different keys."""
+    if a[0] == b[0]:
+        return _Collision(a[0], (a, b))
+    ia = (a[0] >> shift) & _MASK
+    ib = (b[0] >> shift) & _MASK
+    if ia == ib:
+        return _Node(1 << ia, (_merge(shift + _BITS, a, b),))
+    return _Node((1 << ia) | (1 << ib), (a, b) if ia < ib else (b, a))
+
+
+def _assoc(node: Any, shift: int, leaf: _Leaf) -> Tuple[Any, bool]:
+    """Put the leaf into the trie, returning the new node and whether the key
+    has been added. The node is returned unchanged if it has the leaf."""
+    h, key, value = leaf
+    if node.__class__ is _Collision:
+        if node.hash != h:
+            # push the collision node one level down
+            wrapper = _Node(1 << ((node.hash >> shift) & _MASK), (node,))
+            return _assoc(wrapper, shift, leaf)
+        leaves = node.leaves
+        for i, old in enumerate(leaves):
+            if old[1] is key or old[1] == key:
+                if old[2] is value:
+                    return node, False
+                return _Collision(h, leaves[:i] + (leaf,) + leaves[i + 1 :]), False
+        return _Collision(h, leaves + (leaf,)), True
+
+    bit = 1 << ((h >> shift) & _MASK)
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    if not node.bitmap & bit:
+        return (
+            _Node(node.bitmap | bit, entries[:index] + (leaf,) + entries[index:]),
+            True,
+        )
+    entry = entries[index]
+    if entry.__class__ is tuple:
+        if entry[0] == h and (entry[1] is key or entry[1] == key):
+            if entry[2] is value:
+                return node, False
+            new, added = leaf, False
+        else:
+            new, added = _merge(shift + _BITS, entry, leaf), True
+    else:
+        new, added = _assoc(entry, shift + _BITS, leaf)
+        if new is entry:
+            return node, False
+    return _Node(node.bitmap, entries[:index] + (new,) + entries[index + 1 :]), added
+
+
+def _dissoc(node: Any, shift: int, h: int, key: Any) -> Any:
+    """Remove the key from the trie. The result is the node unchanged if there
+    is no such key, None if nothing is left, a leaf if only one leaf is left
+    below an inner node, or the new node."""
+    if node.__class__ is _Collision:
+        leaves = node.leaves
+        for i, old in enumerate(leaves):
+            if old[1] is key or old[1] == key:
+                rest = leaves[:i] + leaves[i + 1 :]
+                return rest[0] if len(rest) == 1 else _Collision(h, rest)
+        return node
+
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    entry = entries[index]
+    if entry.__class__ is tuple:
+        if not (entry[0] == h and (entry[1] is key or entry[1] == key)):
+            return node
+        new = None
+    else:
+        new = _dissoc(entry, shift + _BITS, h, key)
+        if new is entry:
+            return node
+    if new is None:
+        bitmap = node.bitmap & ~bit
+        rest = entries[:index] + entries[index + 1 :]
+        if not rest:
+            return None
+        if shift > 0 and len(rest) == 1 and rest[0].__class__ is tuple:
+            # let the parent hold the only leaf
+            return rest[0]
+        return _Node(bitmap, rest)
+    if shift > 0 and len(entries) == 1 and new.__class__ is tuple:
+        return new
+    return _Node(node.bitmap, entries[:index] + (new,) + entries[index + 1 :])
+
+
+def _leaves(root: _Node) -> Iterator[_Leaf]:
+    stack: List[Any] = [root]
+    while stack:
+        node = stack.pop()
+        for entry in node.leaves if node.__class__ is _Collision else node.entries:
+            if entry.__class__ is tuple:
+                yield entry
+            else:
+                stack.append(entry)
+
+
+def _root_of(node: Any) -> _Node:
+    """Turn the result of `_dissoc` at the root into a root node."""
+    if node is None:
+        return _EMPTY
+    if node.__class__ is tuple:
+        return _Node(1 << (node[0] & _MASK), (node,))
+    return node  # type: ignore[no-any-return]
+
+
+class PMap(Mapping[Any, Any]):
+    """A persistent map. It is equal to the dictionaries and to `ImmutableDict`
+    with the same items, and has the same hash as `ImmutableDict`.
+    The updates `set` and `delete` return new maps in O(log n)."""
+
+    __slots__ = ("_root", "_len", "_cached_hash")
+
+    def __init__(self, items: Any = ()):
+        root, size = _EMPTY, 0
+        pairs = items.items() if isinstance(items, Mapping) else items
+        for key, value in pairs:
+            root, added = _assoc(root, 0, (_hash(key), key, value))
+            size += added
+        self._root: _Node = root
+        self._len = size
+        self._cached_hash: Optional[int] = None
+
+    @staticmethod
+    def _make(root: _Node, size: int) -> "PMap":
+        result = PMap.__new__(PMap)
+        result._root, result._len, result._cached_hash = root, size, None
+        return result
+
+    def __getitem__(self, key: Any) -> Any:
+        value = _find(self._root, _hash(key), key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return _find(self._root, _hash(key), key) is not _MISSING
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = _find(self._root, _hash(key), key)
+        return default if value is _MISSING else value
+
+    def __iter__(self) -> Iterator[Any]:
+        return (leaf[1] for leaf in _leaves(self._root))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def items(self) -> "_PMapItems":
+        return _PMapItems(self)
+
+    def values(self) -> "_PMapValues":
+        return _PMapValues(self)
+
+    def set(self, key: Any, value: Any) -> "PMap":
+        """The map with the key bound to the value."""
+        root, added = _assoc(self._root, 0, (_hash(key), key, value))
+        return self if root is self._root else PMap._make(root, self._len + added)
+
+    def delete(self, key: Any) -> "PMap":
+        """The map without the key. Raises KeyError if there is no such key."""
+        root = _dissoc(self._root, 0, _hash(key), key)
+        if root is self._root:
+            raise KeyError(key)
+        return PMap._make(_root_of(root), self._len - 1)
+
+    def update(self, items: Any) -> "PMap":
+        """The map with the items of a mapping or an iterable of pairs."""
+        root, size = self._root, self._len
+        pairs = items.items() if isinstance(items, Mapping) else items
+        for key, value in pairs:
+            root, added = _assoc(root, 0, (_hash(key), key, value))
+            size += added
+        return self if root is self._root else PMap._make(root, size)
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        if len(other) != self._len:
+            return False
+        return all(other.get(k, _MISSING) == v for _, k, v in _leaves(self._root))
+
+    def __hash__(self) -> int:
+        if self._cached_hash is None:
+            self._cached_hash = hash(frozenset(self.items()))
+        return self._cached_hash
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __reduce__(self) -> Any:
+        return (PMap, (list(self.items()),))
+
+
+class _PMapItems(ItemsView[Any, Any]):
+    _mapping: PMap
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        return ((leaf[1], leaf[2]) for leaf in _leaves(self._mapping._root))
+
+
+class _PMapValues(ValuesView[Any]):
+    _mapping: PMap
+
+    def __iter__(self) -> Iterator[Any]:
+        return (leaf[2] for leaf in _leaves(self._mapping._root))
+
+
+class PSet(Set[Any]):
+    """A persistent set. It is equal to the sets and frozensets with the same
+    elements, and has the same hash as `frozenset`.
+    The updates `add` and `remove` return new sets in O(log n)."""
+
+    __slots__ = ("_root", "_len", "_cached_hash")
+
+    def __init__(self, elements: Iterable[Any] = ()):
+        root, size = _EMPTY, 0
+        for elem in elements:
+            root, added = _assoc(root, 0, (_hash(elem), elem, None))
+            size += added
+        self._root: _Node = root
+        self._len = size
+        self._cached_hash: Optional[int] = None
+
+    @staticmethod
+    def _make(root: _Node, size: int) -> "PSet":
+        result = PSet.__new__(PSet)
+        result._root, result._len, result._cached_hash = root, size, None
+        return result
+
+    def __contains__(self, elem: object) -> bool:
+        return _find(self._root, _hash(elem), elem) is not _MISSING
+
+    def __iter__(self) -> Iterator[Any]:
+        return (leaf[1] for leaf in _leaves(self._root))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, elem: Any) -> "PSet":
+        """The set with the element."""
+        root, added = _assoc(self._root, 0, (_hash(elem), elem, None))
+        return self if root is self._root else PSet._make(root, self._len + added)
+
+    def remove(self, elem: Any) -> "PSet":
+        """The set without the element. Raises KeyError if there is no such
+        element."""
+        root = _dissoc(self._root, 0, _hash(elem), elem)
+        if root is self._root:
+            raise KeyError(elem)
+        return PSet._make(_root_of(root), self._len - 1)
+
+    def discard(self, elem: Any) -> "PSet":
+        """The set without the element, if it is present."""
+        return self.remove(elem) if elem in self else self
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Set):
+            return NotImplemented
+        return len(other) == self._len and all(e in other for e in self)
+
+    def __hash__(self) -> int:
+        if self._cached_hash is None:
+            # the same algorithm as of frozenset
+            self._cached_hash = Set._hash(self)
+        return self._cached_hash
+
+    def __repr__(self) -> str:
+        return "PSet(" + repr(set(self)) + ")" if self._len else "PSet()"
+
+    def __reduce__(self) -> Any:
+        return (PSet, (list(self),))
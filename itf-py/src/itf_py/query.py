@@ -0,0 +1,133 @@
+"""
+Queries over the states of ITF traces, backed by per-variable indexes.
+"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .fingerprint import Fingerprinter
+from .itf import Trace
+
+# A predicate over the values of a state.
+Predicate = Callable[[Mapping[str, Any]], bool]
+
+# An index of a variable: from the fingerprints of the values to the state
+# indices. The values are not compared by the Python equality, since tagged
+# unions and records are named tuples, so the values of different tags,
+# also inside sets, maps and sequences, may be equal as tuples.
+Index = Dict[int, List[int]]
+
+
+class TraceQuery:
+    """Queries over the states of a trace. The results are state indices.
+
+    An index of a variable maps its values to the indices of the states that
+    have these values. The indices are built on first use and reused by the
+    later queries, so keep the query object around when asking many questions
+    about the same trace. The values of missing variables are None.
+    The trace should not be modified while it is queried.
+
+    The values are compared by their fingerprints, see `Fingerprinter`."""
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._fingerprinter = Fingerprinter()
+        self._indexes: Dict[str, Index] = {}
+        self._changes: Dict[str, List[int]] = {}
+
+    def _same(self, a: Any, b: Any) -> bool:
+        digest = self._fingerprinter.digest
+        return a is b or digest(a) == digest(b)
+
+    def index(self, name: str) -> Index:
+        """The index of a variable: from the fingerprints of the values
+        of the variable to the increasing indices of the states."""
+        index = self._indexes.get(name)
+        if index is None:
+            index = {}
+            fingerprint = self._fingerprinter.value
+            for i, state in enumerate(self.trace.states):
+                index.setdefault(fingerprint(state.values.get(name)), []).append(i)
+            self._indexes[name] = index
+        return index
+
+    def where(self, name: str, value: Any) -> List[int]:
+        """The indices of the states, in which the variable equals the value."""
+        return list(self.index(name).get(self._fingerprinter.value(value), []))
+
+    def select(self, *predicates: Predicate, **equalities: Any) -> List[int]:
+        """The indices of the states, in which every variable equals the value
+        given by its keyword argument, and every predicate holds.
+
+        The candidate states are taken from the index of the most selective
+        equality, and only the candidates are checked against the rest.
+        For example, `select(lambda v: v["x"] > 3, lastAction=...)`."""
+        states = self.trace.states
+        if equalities:
+            candidates = min(
+                (self.where(name, value) for name, value in equalities.items()),
+                key=len,
+            )
+        else:
+            candidates = list(range(len(states)))
+        return [
+            i
+            for i in candidates
+            if all(
+                self._same(states[i].values.get(n), v) for n, v in equalities.items()
+            )
+            and all(p(states[i].values) for p in predicates)
+        ]
+
+    def project(
+        self, *names: str, indices: Optional[Iterable[int]] = None
+    ) -> List[Tuple[Any, ...]]:
+        """The values of the variables in the states with the given indices,
+        or in all states. The missing values are None."""
+        states = self.trace.states
+        if indices is None:
+            indices = range(len(states))
+        return [tuple(states[i].values.get(n) for n in names) for i in indices]
+
+    def changes(self, name: str) -> List[int]:
+        """The indices of the states, in which the variable has a different
+        value than in the previous state."""
+        changes = self._changes.get(name)
+        if changes is None:
+            changes = []
+            prev: Any = None
+            for i, state in enumerate(self.trace.states):
+                value = state.values.get(name)
+                if i > 0 and not self._same(value, prev):
+                    changes.append(i)
+                prev = value
+            self._changes[name] = changes
+        return changes
+
+    def first_change(self, name: str, start: int = 0) -> Optional[int]:
+        """The index of the first state from `start` on that changes
+        the variable, if any."""
+        changes = self.changes(name)
+        pos = bisect_left(changes, start)
+        return changes[pos] if pos < len(changes) else None
+
+    def last_change(self, name: str, stop: Optional[int] = None) -> Optional[int]:
+        """The index of the last state before `stop` that changes the variable,
+        if any."""
+        changes = self.changes(name)
+        pos = len(changes) if stop is None else bisect_left(changes, stop)
+        return changes[pos - 1] if pos > 0 else None
+
+    def group_by_tag(self, name: str) -> Dict[str, List[int]]:
+        """Group the indices of the states by the tag of a tagged union,
+        e.g., by the tag of `lastAction`. The states, in which the variable
+        is missing or is not a tagged union, are skipped."""
+        states = self.trace.states
+        groups: Dict[str, List[int]] = {}
+        for positions in self.index(name).values():
+            cls = states[positions[0]].values.get(name).__class__
+            if hasattr(cls, "_itf_variant"):
+                groups.setdefault(cls.__name__, []).extend(positions)
+        for positions in groups.values():
+            positions.sort()
+        return groups
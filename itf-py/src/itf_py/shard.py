@@ -0,0 +1,327 @@
+"""
+Sharded ITF traces: a long trace that is split into several trace files.
+
+Every shard is a complete ITF trace in JSON, so it can be read on its own,
+e.g., by `iter_states` or in parallel by `load_traces`. The manifest lists
+the shards in order, with the numbers of their states:
+
+    {
+      "format": "itf-shards", "version": 1, "complete": true,
+      "#meta": {...}, "params": [...], "vars": [...], "loop": null,
+      "states": 25000,
+      "shards": [
+        {"file": "trace-00000.itf.json", "firstState": 0, "states": 10000,
+         "bytes": 1234567},
+        ...
+      ]
+    }
+
+The manifest is rewritten whenever a shard is completed, so the completed
+shards can be consumed while the trace is still being written.
+"""
+
+import json
+import os
+import tempfile
+from bisect import bisect_right
+from collections import OrderedDict
+from types import TracebackType
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Type, Union
+
+from .itf import State, Trace, trace_from_json
+from .stream import iter_raw_states, iter_states
+from .writer import state_to_text
+
+TracePath = Union[str, "os.PathLike[str]"]
+
+MANIFEST = "manifest.json"
+FORMAT = "itf-shards"
+VERSION = 1
+
+# the default number of states in a shard
+MAX_SHARD_STATES = 10000
+
+
+class ShardedTraceWriter:
+    """Write the states of a trace incrementally into a directory of shards.
+
+        with ShardedTraceWriter(directory, vars=["x", "y"]) as writer:
+            for state in simulate():
+                writer.append(state)
+
+    A new shard is started when the current shard has `max_states` states,
+    or when its text has at least `max_bytes` bytes, if given. The metadata of
+    every shard is the metadata of the trace extended with `shard` and
+    `firstState`. The loop of the trace, if any, may be set until the writer
+    is closed, and it is stored in the manifest only."""
+
+    def __init__(
+        self,
+        directory: TracePath,
+        meta: Optional[Dict[str, Any]] = None,
+        params: Iterable[str] = (),
+        vars: Iterable[str] = (),
+        max_states: int = MAX_SHARD_STATES,
+        max_bytes: Optional[int] = None,
+        prefix: str = "trace",
+    ):
+        if max_states < 1:
+            raise ValueError("A shard has at least one state")
+        self.directory = os.fspath(directory)
+        self.meta: Dict[str, Any] = dict(meta or {})
+        self.params = list(params)
+        self.vars = list(vars)
+        self.loop: Optional[int] = None
+        self.max_states = max_states
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.shards: List[Dict[str, Any]] = []
+        self._file: Optional[IO[str]] = None
+        self._name = ""
+        # the states in the completed shards, and in the current shard
+        self._done = 0
+        self._states = 0
+        # the text of `state_to_text` is ASCII, so its length is its size
+        self._bytes = 0
+        self._closed = False
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_manifest(complete=False)
+
+    def __len__(self) -> int:
+        """The number of the states that have been appended."""
+        return self._done + self._states
+
+    def append(self, state: State) -> None:
+        """Append a state to the current shard, starting a new shard first if
+        the current one is full."""
+        if self._closed:
+            raise ValueError("The sharded trace has been closed")
+        if self._file is None:
+            self._start_shard()
+        assert self._file is not None
+        text = state_to_text(state)
+        if self._states > 0:
+            text = ", " + text
+        self._file.write(text)
+        self._states += 1
+        self._bytes += len(text)
+        if self._states >= self.max_states or (
+            self.max_bytes is not None and self._bytes >= self.max_bytes
+        ):
+            self._finish_shard()
+
+    def extend(self, states: Iterable[State]) -> None:
+        """Append the states one by one."""
+        for state in states:
+            self.append(state)
+
+    def close(self) -> None:
+        """Complete the current shard and the manifest."""
+        if self._closed:
+            return
+        if self._file is not None:
+            self._finish_shard()
+        self._closed = True
+        self._write_manifest(complete=True)
+
+    def __enter__(self) -> "ShardedTraceWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            # keep the completed shards, and leave the manifest incomplete
+            self._file.close()
+            self._file = None
+
+    def _start_shard(self) -> None:
+        name = f"{self.prefix}-{len(self.shards):05d}.itf.json"
+        meta = dict(self.meta, shard=len(self.shards), firstState=self._done)
+        self._file = open(os.path.join(self.directory, name), "w", encoding="utf-8")
+        header = (
+            '{"#meta": '
+            + json.dumps(meta)
+            + ', "params": '
+            + json.dumps(self.params)
+            + ', "vars": '
+            + json.dumps(self.vars)
+            + ', "loop": null, "states": ['
+        )
+        self._file.write(header)
+        self._name = name
+        self._states = 0
+        self._bytes = len(header)
+
+    def _finish_shard(self) -> None:
+        assert self._file is not None
+        self._file.write("]}")
+        self._file.close()
+        self._file = None
+        shard = {
+            "file": self._name,
+            "firstState": self._done,
+            "states": self._states,
+            "bytes": self._bytes + 2,
+        }
+        self._done += self._states
+        self._states = 0
+        self.shards.append(shard)
+        self._write_manifest(complete=False)
+
+    def _write_manifest(self, complete: bool) -> None:
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            "complete": complete,
+            "#meta": self.meta,
+            "params": self.params,
+            "vars": self.vars,
+            "loop": self.loop,
+            "states": len(self),
+            "shards": self.shards,
+        }
+        # write to a temporary file first, so readers never see a partial manifest
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp, os.path.join(self.directory, MANIFEST))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def write_sharded_trace(
+    trace: Trace,
+    directory: TracePath,
+    max_states: int = MAX_SHARD_STATES,
+    max_bytes: Optional[int] = None,
+) -> None:
+    """Split a Trace into shards in a directory, see `ShardedTraceWriter`."""
+    with ShardedTraceWriter(
+        directory, trace.meta, trace.params, trace.vars, max_states, max_bytes
+    ) as writer:
+        writer.loop = trace.loop
+        writer.extend(trace.states)
+
+
+class ShardedTrace:
+    """The states of a sharded trace with random access.
+
+    Accessing `trace[i]` decodes the shard of the state i, and the last
+    `cached_shards` decoded shards are kept in memory. Iterating over the
+    states reads the shards one state at a time. The shards that are listed
+    in the manifest when the trace is opened, or refreshed, are visible."""
+
+    def __init__(
+        self,
+        directory: TracePath,
+        use_var_types: bool = True,
+        intern: bool = False,
+        cached_shards: int = 2,
+    ):
+        self.directory = os.fspath(directory)
+        self.use_var_types = use_var_types
+        self.intern = intern
+        self.cached_shards = cached_shards
+        self._cache: "OrderedDict[int, Trace]" = OrderedDict()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Read the manifest again, to see the shards that have been completed
+        since the trace was opened."""
+        with open(os.path.join(self.directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            raise ValueError("Not a manifest of a sharded ITF trace")
+        if manifest.get("version") != VERSION:
+            version = manifest.get("version")
+            raise ValueError(f"Unsupported version of sharded ITF trace: {version}")
+        self.complete: bool = manifest["complete"]
+        self.meta: Dict[str, Any] = manifest["#meta"]
+        self.params: List[str] = manifest["params"]
+        self.vars: List[str] = manifest["vars"]
+        self.loop: Optional[int] = manifest["loop"]
+        self.shards: List[Dict[str, Any]] = manifest["shards"]
+        self._starts: List[int] = [s["firstState"] for s in self.shards]
+        self._len: int = sum(s["states"] for s in self.shards)
+
+    @property
+    def paths(self) -> List[str]:
+        """The paths of the shard files, e.g., to load them with `load_traces`."""
+        return [os.path.join(self.directory, s["file"]) for s in self.shards]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index: int) -> State:
+        """The state at the given index."""
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("state index out of range")
+        k = bisect_right(self._starts, index) - 1
+        state: State = self.load_shard(k).states[index - self._starts[k]]
+        return state
+
+    def __iter__(self) -> Iterator[State]:
+        for path in self.paths:
+            yield from iter_states(
+                path, use_var_types=self.use_var_types, intern=self.intern
+            )
+
+    def load_shard(self, k: int) -> Trace:
+        """Decode the shard k as a Trace."""
+        trace = self._cache.get(k)
+        if trace is not None:
+            self._cache.move_to_end(k)
+            return trace
+        with open(self.paths[k], "r", encoding="utf-8") as f:
+            data = json.load(f)
+        trace = trace_from_json(data, self.use_var_types, self.intern)
+        if self.cached_shards > 0:
+            self._cache[k] = trace
+            if len(self._cache) > self.cached_shards:
+                self._cache.popitem(last=False)
+        return trace
+
+    def to_trace(self) -> Trace:
+        """Decode all states into a Trace."""
+        return Trace(
+            meta=self.meta,
+            params=self.params,
+            vars=self.vars,
+            states=list(self),
+            loop=self.loop,
+        )
+
+
+def open_sharded_trace(directory: TracePath) -> ShardedTrace:
+    """Open a sharded trace by the directory of its manifest."""
+    return ShardedTrace(directory)
+
+
+def merge_sharded_trace(directory: TracePath, fileobj: IO[str]) -> None:
+    """Write a sharded trace as a single JSON trace to a file object, state
+    by state, as `dump_trace` does. The JSON of the states is copied from
+    the shards without decoding the values."""
+    sharded = ShardedTrace(directory)
+    fileobj.write('{"#meta": ' + json.dumps(sharded.meta))
+    fileobj.write(', "params": ' + json.dumps(sharded.params))
+    fileobj.write(', "vars": ' + json.dumps(sharded.vars))
+    fileobj.write(', "loop": ' + json.dumps(sharded.loop))
+    fileobj.write(', "states": [')
+    first = True
+    for path in sharded.paths:
+        for raw_state in iter_raw_states(path):
+            if not first:
+                fileobj.write(", ")
+            fileobj.write(json.dumps(raw_state))
+            first = False
+    fileobj.write("]}")
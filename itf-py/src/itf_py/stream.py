@@ -0,0 +1,252 @@
+"""
+Incremental reading of ITF traces, one state at a time.
+"""
+
+import codecs
+import json
+import os
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .itf import Decoder, State, ValuePool, compile_var_decoders, state_from_json
+
+# a path to a trace file or a file object opened in text or binary mode
+TraceSource = Union[str, "os.PathLike[str]", IO[Any]]
+
+# the default number of characters to read from a file at once
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+
+# the states of the scanner
+_START = 0
+_KEY = 1
+_COLON = 2
+_VALUE = 3
+_STATES = 4
+_DONE = 5
+
+
+@dataclass
+class TraceHeader:
+    """Everything in an ITF trace except its states."""
+
+    meta: Dict[str, Any] = field(default_factory=dict)
+    params: List[str] = field(default_factory=list)
+    vars: List[str] = field(default_factory=list)
+    loop: Optional[int] = None
+
+
+class TraceScanner:
+    """An incremental scanner of the ITF JSON text.
+
+    The text is fed in chunks via `feed`. The method `events` produces the
+    top-level fields of the trace as `("field", (key, value))` and the raw
+    JSON states as `("state", raw_state)` as soon as they are complete.
+    Only the text of the current field or state is kept in memory."""
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._scan = _START
+        self._key = ""
+        # do not retry decoding an incomplete value before the buffer grows
+        self._retry_len = 0
+
+    def feed(self, text: str) -> None:
+        """Add the next chunk of the JSON text."""
+        if self._pos > CHUNK_SIZE and self._pos * 2 > len(self._buf):
+            self._buf = self._buf[self._pos :]
+            self._retry_len -= self._pos
+            self._pos = 0
+        self._buf += text
+
+    def feed_eof(self) -> None:
+        """Signal that the whole JSON text has been fed."""
+        self._eof = True
+
+    @property
+    def done(self) -> bool:
+        """Whether the whole trace object has been scanned."""
+        return self._scan == _DONE
+
+    def events(self) -> Iterator[Tuple[str, Any]]:
+        """Produce the events that are complete in the text fed so far."""
+        while True:
+            if not self._skip_whitespace():
+                return
+            ch = self._buf[self._pos]
+            if self._scan == _START:
+                self._expect(ch, "{")
+                self._scan = _KEY
+            elif self._scan == _KEY:
+                if ch == "}":
+                    self._pos += 1
+                    self._scan = _DONE
+                elif ch == ",":
+                    self._pos += 1
+                else:
+                    key = self._decode()
+                    if key is None:
+                        return
+                    self._key = key[0]
+                    self._scan = _COLON
+            elif self._scan == _COLON:
+                self._expect(ch, ":")
+                self._scan = _VALUE
+            elif self._scan == _VALUE:
+                if self._key == "states":
+                    self._expect(ch, "[")
+                    self._scan = _STATES
+                else:
+                    value = self._decode()
+                    if value is None:
+                        return
+                    self._scan = _KEY
+                    yield ("field", (self._key, value[0]))
+            elif self._scan == _STATES:
+                if ch == "]":
+                    self._pos += 1
+                    self._scan = _KEY
+                elif ch == ",":
+                    self._pos += 1
+                else:
+                    raw_state = self._decode()
+                    if raw_state is None:
+                        return
+                    yield ("state", raw_state[0])
+            else:
+                raise ValueError(f"Unexpected text after the trace at {self._pos}")
+
+    def _skip_whitespace(self) -> bool:
+        """Skip whitespace, returning False if more text is needed."""
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        if pos < len(buf):
+            return True
+        if self._eof and self._scan != _DONE:
+            raise ValueError("Unexpected end of the ITF trace")
+        return False
+
+    def _expect(self, ch: str, expected: str) -> None:
+        if ch != expected:
+            raise ValueError(f"Expected '{expected}' at {self._pos}, found '{ch}'")
+        self._pos += 1
+
+    def _decode(self) -> Optional[Tuple[Any]]:
+        """Decode the JSON value at the current position, returning None
+        if the value is not complete yet."""
+        if not self._eof and len(self._buf) < self._retry_len:
+            return None
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+            # a number at the end of the buffer may continue in the next chunk
+            complete = end < len(self._buf) or not self._buf[end - 1].isdigit()
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            complete = False
+        if not complete and not self._eof:
+            self._retry_len = self._pos + 2 * (len(self._buf) - self._pos) + 1
+            return None
+        self._pos = end
+        self._retry_len = 0
+        return (value,)
+
+
+def _open(source: TraceSource) -> Tuple[IO[Any], bool]:
+    """Open the source for reading, unless it is a file object already."""
+    if hasattr(source, "read"):
+        return source, False  # type: ignore[return-value]
+    return open(source, "r", encoding="utf-8"), True
+
+
+def _scan_events(
+    source: TraceSource,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Tuple[str, Any]]:
+    """Scan the events of a trace stored in a file or a file object."""
+    fileobj, should_close = _open(source)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    scanner = TraceScanner()
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                if isinstance(chunk, bytes):
+                    scanner.feed(decoder.decode(b"", final=True))
+                scanner.feed_eof()
+                yield from scanner.events()
+                return
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk)
+            scanner.feed(chunk)
+            yield from scanner.events()
+    finally:
+        if should_close:
+            fileobj.close()
+
+
+def _set_header_field(header: TraceHeader, key: str, value: Any) -> None:
+    """Store a top-level field of the trace in the header."""
+    if key == "#meta":
+        header.meta = value
+    elif key == "params":
+        header.params = value
+    elif key == "vars":
+        header.vars = value
+    elif key == "loop":
+        header.loop = value
+
+
+def iter_states(
+    source: TraceSource,
+    chunk_size: int = CHUNK_SIZE,
+    use_var_types: bool = True,
+    intern: bool = False,
+) -> Iterator[State]:
+    """Deserialize the states of an ITF trace one by one.
+
+    The source is either a path or a file object opened in text or binary mode.
+    Only the current state is kept in memory, not the whole trace.
+    If `#meta.varTypes` precedes the states, the states are decoded
+    according to the variable types, unless `use_var_types` is False.
+    If `intern` is True, equal values across the states are represented by
+    the same object, as in `trace_from_json`."""
+    pool = ValuePool() if intern else None
+    decoders: Dict[str, Decoder] = {}
+    for kind, payload in _scan_events(source, chunk_size):
+        if kind == "state":
+            yield state_from_json(payload, decoders, pool)
+        elif use_var_types and payload[0] == "#meta" and isinstance(payload[1], dict):
+            decoders = compile_var_decoders(payload[1], pool)
+
+
+def iter_raw_states(
+    source: TraceSource,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Read the states of an ITF trace one by one as JSON, without decoding
+    their values, e.g., to copy them to another trace."""
+    for kind, payload in _scan_events(source, chunk_size):
+        if kind == "state":
+            yield payload
+
+
+def read_trace_header(
+    source: TraceSource,
+    chunk_size: int = CHUNK_SIZE,
+) -> TraceHeader:
+    """Read the fields `#meta`, `params`, `vars`, and `loop` of an ITF trace.
+
+    Since the fields may follow the states, the whole file is scanned.
+    The states are skipped without being deserialized."""
+    header = TraceHeader()
+    for kind, payload in _scan_events(source, chunk_size):
+        if kind == "field":
+            _set_header_field(header, *payload)
+    return header
@@ -0,0 +1,248 @@
+"""
+Parser of the Apalache types that are found in `#meta.varTypes` of ITF traces.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ITFType:
+    """The base class of the types."""
+
+
+@dataclass(frozen=True)
+class PrimType(ITFType):
+    """A built-in type: `Int`, `Bool`, `Str`, or `Real`."""
+
+    name: str
+
+
+@dataclass(frozen=True)
+class ConstType(ITFType):
+    """An uninterpreted type such as `PID` or `UNIT`."""
+
+    name: str
+
+
+@dataclass(frozen=True)
+class VarType(ITFType):
+    """A type variable such as `a`."""
+
+    name: str
+
+
+@dataclass(frozen=True)
+class SetType(ITFType):
+    """A set type: `Set(elem)`."""
+
+    elem: ITFType
+
+
+@dataclass(frozen=True)
+class SeqType(ITFType):
+    """A sequence type: `Seq(elem)`."""
+
+    elem: ITFType
+
+
+@dataclass(frozen=True)
+class FunType(ITFType):
+    """A function type: `(arg -> res)`."""
+
+    arg: ITFType
+    res: ITFType
+
+
+@dataclass(frozen=True)
+class TupleType(ITFType):
+    """A tuple type: `<<elem_1, ..., elem_n>>`."""
+
+    elems: Tuple[ITFType, ...]
+
+
+@dataclass(frozen=True)
+class RecordType(ITFType):
+    """A record type: `{ f_1: T_1, ..., f_n: T_n }`, possibly with a row variable."""
+
+    fields: Tuple[Tuple[str, ITFType], ...]
+    row: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class VariantType(ITFType):
+    """A variant type: `Tag_1(T_1) | ... | Tag_n(T_n)`, possibly with a row variable."""
+
+    options: Tuple[Tuple[str, ITFType], ...]
+    row: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class OperType(ITFType):
+    """An operator type: `(arg_1, ..., arg_n) => res`."""
+
+    args: Tuple[ITFType, ...]
+    res: ITFType
+
+
+_PRIMITIVE_TYPES = {"Int", "Bool", "Str", "Real"}
+
+_TOKEN = re.compile(r"\s*(<<|>>|->|=>|[A-Za-z_][A-Za-z0-9_]*|[(){}\[\]<>,:|])")
+
+
+def _tokenize(text: str) -> List[str]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            raise ValueError(f"Unexpected character at {pos} in type: {text}")
+        tokens.append(m.group(1))
+        pos = m.end()
+    return tokens
+
+
+class _TypeParser:
+    """A recursive-descent parser of the Apalache type syntax."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[str]:
+        pos = self.pos + offset
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def advance(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of type: {self.text}")
+        self.pos += 1
+        return token
+
+    def expect(self, expected: str) -> None:
+        token = self.advance()
+        if token != expected:
+            raise ValueError(f"Expected '{expected}', found '{token}' in: {self.text}")
+
+    def parse(self) -> ITFType:
+        result = self.parse_type()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected '{self.peek()}' in type: {self.text}")
+        return result
+
+    def parse_type(self) -> ITFType:
+        left = self.parse_union()
+        if self.peek() == "->":
+            self.advance()
+            return FunType(left, self.parse_type())
+        if self.peek() == "=>":
+            self.advance()
+            return OperType((left,), self.parse_type())
+        return left
+
+    def parse_union(self) -> ITFType:
+        if not self.is_variant_option():
+            return self.parse_primary()
+        options = []
+        row = None
+        while True:
+            if self.is_variant_option():
+                tag = self.advance()
+                self.expect("(")
+                options.append((tag, self.parse_type()))
+                self.expect(")")
+            else:
+                row = self.advance()
+                break
+            if self.peek() != "|":
+                break
+            self.advance()
+        return VariantType(tuple(options), row)
+
+    def is_variant_option(self) -> bool:
+        token = self.peek()
+        return (
+            token is not None
+            and token[0].isalpha()
+            and token not in ("Set", "Seq", "Variant")
+            and self.peek(1) == "("
+        )
+
+    def parse_primary(self) -> ITFType:
+        token = self.advance()
+        if token == "(":
+            return self.parse_parens()
+        if token == "<<":
+            elems = self.parse_list(">>", self.parse_type)
+            return TupleType(tuple(elems))
+        if token in ("{", "["):
+            return self.parse_record("}" if token == "{" else "]")
+        if token in ("Set", "Seq") and self.peek() == "(":
+            self.advance()
+            elem = self.parse_type()
+            self.expect(")")
+            return SetType(elem) if token == "Set" else SeqType(elem)
+        if token == "Variant" and self.peek() == "(":
+            self.advance()
+            variant = self.parse_type()
+            self.expect(")")
+            return variant
+        if token in _PRIMITIVE_TYPES:
+            return PrimType(token)
+        if token[0].isupper():
+            return ConstType(token)
+        if token[0].isalpha() or token[0] == "_":
+            return VarType(token)
+        raise ValueError(f"Unexpected '{token}' in type: {self.text}")
+
+    def parse_parens(self) -> ITFType:
+        if self.peek() == ")":
+            # an operator without arguments: () => T
+            self.advance()
+            self.expect("=>")
+            return OperType((), self.parse_type())
+        first = self.parse_type()
+        if self.peek() == ",":
+            self.advance()
+            args = [first] + self.parse_list(")", self.parse_type)
+            self.expect("=>")
+            return OperType(tuple(args), self.parse_type())
+        self.expect(")")
+        return first
+
+    def parse_record(self, closing: str) -> ITFType:
+        fields = []
+        row = None
+        while self.peek() != closing:
+            name = self.advance()
+            if self.peek() == ":":
+                self.advance()
+                fields.append((name, self.parse_type()))
+            else:
+                row = name
+            if self.peek() != closing:
+                self.expect(",")
+        self.advance()
+        return RecordType(tuple(fields), row)
+
+    def parse_list(
+        self, closing: str, parse_elem: Callable[[], ITFType]
+    ) -> List[ITFType]:
+        elems = []
+        while self.peek() != closing:
+            elems.append(parse_elem())
+            if self.peek() != closing:
+                self.expect(",")
+        self.advance()
+        return elems
+
+
+def parse_type(text: str) -> ITFType:
+    """Parse an Apalache type, e.g., `Set({ ip: Str, port: Int })`.
+
+    Raises ValueError if the text is not a type."""
+    return _TypeParser(text).parse()
@@ -0,0 +1,208 @@
+"""
+Writing ITF traces as JSON text, state by state.
+"""
+
+import json
+from json.encoder import encode_basestring_ascii
+from typing import IO, Any, Callable, Dict, List, Tuple
+
+from .itf import LazyValues, State, Trace, value_to_json
+from .persistent import PMap, PSet
+
+# A function that produces the JSON text of the Python values of a fixed class.
+TextEncoder = Callable[[Any], str]
+
+# the text encoders of the classes that have been serialized so far
+_text_encoders: Dict[type, TextEncoder] = {}
+
+# evict the encoders when there are too many classes, e.g., dynamic records
+_MAX_ENCODERS = 4096
+
+
+def value_to_text(val: Any) -> str:
+    """Serialize a Python value into JSON text. The result is the same as
+    `json.dumps(value_to_json(val))`, but no intermediate JSON objects are built.
+    The values that are nested too deeply for recursion are encoded with
+    `value_to_json_iterative`, and their text is produced with a stack."""
+    try:
+        return _value_to_text(val)
+    except RecursionError:
+        from .iterative import value_to_json_iterative
+
+        return _json_to_text_iterative(value_to_json_iterative(val))
+
+
+def _value_to_text(val: Any) -> str:
+    encoder = _text_encoders.get(val.__class__)
+    if encoder is None:
+        encoder = _make_text_encoder(val)
+        if len(_text_encoders) >= _MAX_ENCODERS:
+            _text_encoders.clear()
+        _text_encoders[val.__class__] = encoder
+    return encoder(val)
+
+
+def _make_text_encoder(val: Any) -> TextEncoder:
+    """Choose the text encoder of the class of the value, following the cases
+    of `value_to_json`."""
+    cls = val.__class__
+    if cls is bool:
+        return _bool_to_text
+    elif isinstance(val, str):
+        return encode_basestring_ascii
+    elif cls is int:
+        return _int_to_text
+    elif isinstance(val, tuple) and not hasattr(val, "_fields"):
+        return _tuple_to_text
+    elif isinstance(val, (frozenset, PSet)):
+        return _set_to_text
+    elif isinstance(val, (dict, PMap)):
+        return _map_to_text
+    elif isinstance(val, list):
+        return _list_to_text
+    elif isinstance(val, tuple) and not hasattr(val, "__dict__"):
+        fields = tuple(val._fields)  # type: ignore[attr-defined]
+        if not hasattr(cls, "_itf_variant"):
+            return _make_record_text_encoder(fields)
+        else:
+            return _make_variant_text_encoder(cls.__name__, fields)
+    else:
+        # objects, subclasses of bool and int, and unserializable values
+        return _json_to_text
+
+
+def _bool_to_text(val: Any) -> str:
+    return "true" if val else "false"
+
+
+def _int_to_text(val: Any) -> str:
+    return f'{{"#bigint": "{val}"}}'
+
+
+def _tuple_to_text(val: Any) -> str:
+    return '{"#tup": [' + ", ".join(map(_value_to_text, val)) + "]}"
+
+
+def _set_to_text(val: Any) -> str:
+    return '{"#set": [' + ", ".join(map(_value_to_text, val)) + "]}"
+
+
+def _map_to_text(val: Any) -> str:
+    pairs = [f"[{_value_to_text(k)}, {_value_to_text(v)}]" for k, v in val.items()]
+    return '{"#map": [' + ", ".join(pairs) + "]}"
+
+
+def _list_to_text(val: Any) -> str:
+    return "[" + ", ".join(map(_value_to_text, val)) + "]"
+
+
+def _json_to_text(val: Any) -> str:
+    return json.dumps(value_to_json(val))
+
+
+def _fields_to_text(keys: Tuple[str, ...], val: Any) -> str:
+    return "{" + ", ".join([k + _value_to_text(v) for k, v in zip(keys, val)]) + "}"
+
+
+def _make_record_text_encoder(fields: Tuple[str, ...]) -> TextEncoder:
+    keys = tuple(encode_basestring_ascii(f) + ": " for f in fields)
+
+    def record_to_text(val: Any) -> str:
+        return _fields_to_text(keys, val)
+
+    return record_to_text
+
+
+def _make_variant_text_encoder(tag_name: str, fields: Tuple[str, ...]) -> TextEncoder:
+    prefix = '{"tag": ' + encode_basestring_ascii(tag_name) + ', "value": '
+    if len(fields) == 0:
+        # No fields: {"tag": "Banana", "value": null}
+        text = prefix + "null}"
+
+        def variant_to_text(val: Any) -> str:
+            return text
+
+    elif fields == ("value",):
+        # Single field named "value": {"tag": "Banana", "value": ...}
+        def variant_to_text(val: Any) -> str:
+            return prefix + _value_to_text(val[0]) + "}"
+
+    else:
+        # Multiple fields or a non-value field:
+        #   {"tag": "Banana", "value": {...}}
+        keys = tuple(encode_basestring_ascii(f) + ": " for f in fields)
+
+        def variant_to_text(val: Any) -> str:
+            return prefix + _fields_to_text(keys, val) + "}"
+
+    return variant_to_text
+
+
+def _raw_to_text(raw: Any) -> str:
+    """The text of the JSON of a value, the same as `json.dumps(raw)`."""
+    try:
+        return json.dumps(raw)
+    except RecursionError:
+        return _json_to_text_iterative(raw)
+
+
+def _json_to_text_iterative(raw: Any) -> str:
+    """The text of the JSON of a value, as `json.dumps(raw)`, with an explicit
+    stack instead of recursion."""
+    parts: List[str] = []
+    # the JSON values to write, and the text between them, the next one on top
+    stack: List[Tuple[bool, Any]] = [(False, raw)]
+    while stack:
+        is_text, item = stack.pop()
+        cls = item.__class__
+        if is_text:
+            parts.append(item)
+        elif cls is dict:
+            tokens: List[Tuple[bool, Any]] = [(True, "{")]
+            for i, (k, v) in enumerate(item.items()):
+                key = encode_basestring_ascii(k) + ": "
+                tokens += ((True, ", " + key if i else key), (False, v))
+            tokens.append((True, "}"))
+            stack.extend(reversed(tokens))
+        elif cls is list:
+            tokens = [(True, "[")]
+            for i, v in enumerate(item):
+                if i:
+                    tokens.append((True, ", "))
+                tokens.append((False, v))
+            tokens.append((True, "]"))
+            stack.extend(reversed(tokens))
+        else:
+            parts.append(json.dumps(item))
+    return "".join(parts)
+
+
+def state_to_text(state: State) -> str:
+    """Serialize a single State into JSON text, the same as
+    `json.dumps(state_to_json(state))`."""
+    parts = ['"#meta": ' + json.dumps(state.meta)]
+    if isinstance(state.values, LazyValues):
+        # reuse the JSON of the variables that have not been decoded
+        for k, raw in state.values.json_items():
+            parts.append(encode_basestring_ascii(k) + ": " + _raw_to_text(raw))
+    else:
+        for k, v in state.values.items():
+            parts.append(encode_basestring_ascii(k) + ": " + value_to_text(v))
+    return "{" + ", ".join(parts) + "}"
+
+
+def dump_trace(trace: Trace, fileobj: IO[str]) -> None:
+    """Write a Trace as JSON text to a file object, state by state.
+
+    The text is the same as `json.dumps(trace_to_json(trace))`, but only
+    the text of the current state is kept in memory."""
+    fileobj.write('{"#meta": ' + json.dumps(trace.meta))
+    fileobj.write(', "params": ' + json.dumps(trace.params))
+    fileobj.write(', "vars": ' + json.dumps(trace.vars))
+    fileobj.write(', "loop": ' + json.dumps(trace.loop))
+    fileobj.write(', "states": [')
+    for i, state in enumerate(trace.states):
+        if i > 0:
+            fileobj.write(", ")
+        fileobj.write(state_to_text(state))
+    fileobj.write("]}")
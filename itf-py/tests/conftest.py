@@ -0,0 +1,4 @@
+from pathlib import Path
+
+# the example trace that is shared by the tests
+TFTP_TRACE = Path(__file__).parents[2] / "examples" / "tftp-trace.itf.json"
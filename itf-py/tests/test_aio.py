@@ -0,0 +1,95 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from itf_py.aio import aiter_states
+from itf_py.itf import State, trace_from_json
+
+from .conftest import TFTP_TRACE
+
+TRACE_JSON = {
+    "#meta": {"varTypes": {"x": "Int", "s": "Str"}},
+    "vars": ["x", "s"],
+    "states": [
+        {"#meta": {"no": 0}, "x": {"#bigint": "42"}, "s": "λ"},
+        {"#meta": {"no": 1}, "x": {"#bigint": "43"}, "s": "μ"},
+    ],
+}
+
+
+async def collect(data, chunk_size=1 << 16, pieces=1, **kwargs):
+    """Feed the data to a stream in pieces, and collect the states."""
+    reader = asyncio.StreamReader()
+
+    async def send():
+        step = max(1, len(data) // pieces)
+        for i in range(0, len(data), step):
+            reader.feed_data(data[i : i + step])
+            await asyncio.sleep(0)
+        reader.feed_eof()
+
+    sender = asyncio.create_task(send())
+    states = [s async for s in aiter_states(reader, chunk_size, **kwargs)]
+    await sender
+    return states
+
+
+class TestAiterStates:
+    """Test reading ITF traces from asyncio streams."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64, 1 << 16])
+    def test_aiter_states(self, chunk_size):
+        """Test that the states are the same as of trace_from_json"""
+        data = json.dumps(TRACE_JSON).encode("utf-8")
+        states = asyncio.run(collect(data, chunk_size, pieces=5))
+        assert states == trace_from_json(TRACE_JSON).states
+
+    def test_aiter_states_tftp(self):
+        """Test reading the TFTP example with an explicit executor"""
+        data = TFTP_TRACE.read_bytes()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            states = asyncio.run(
+                collect(data, chunk_size=4096, pieces=10, executor=executor)
+            )
+        assert states == trace_from_json(json.loads(data)).states
+
+    def test_aiter_states_stalled_sender(self):
+        """Test that the complete states are yielded before more text arrives"""
+
+        async def first_state_before_eof():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'{"vars": ["x"], "states": [{"x": 1}, ')
+            states = aiter_states(reader)
+            first = await asyncio.wait_for(states.__anext__(), timeout=5)
+            assert not reader.at_eof()
+            reader.feed_data(b'{"x": 2}]}')
+            reader.feed_eof()
+            return [first] + [s async for s in states]
+
+        states = asyncio.run(first_state_before_eof())
+        assert [s.values["x"] for s in states] == [1, 2]
+
+    def test_aiter_states_truncated(self):
+        """Test that a truncated trace is reported"""
+        data = json.dumps(TRACE_JSON).encode("utf-8")[:-10]
+        with pytest.raises(ValueError):
+            asyncio.run(collect(data))
+
+    def test_aiter_states_pipe(self, tmp_path):
+        """Test reading the states from a subprocess over a pipe"""
+        path = tmp_path / "trace.itf.json"
+        path.write_text(json.dumps(TRACE_JSON))
+
+        async def read_from_cat():
+            proc = await asyncio.create_subprocess_exec(
+                "cat", str(path), stdout=asyncio.subprocess.PIPE
+            )
+            assert proc.stdout is not None
+            states = [s async for s in aiter_states(proc.stdout, chunk_size=16)]
+            await proc.wait()
+            return states
+
+        states = asyncio.run(read_from_cat())
+        assert states[1] == State(meta={"no": 1}, values={"x": 43, "s": "μ"})
@@ -0,0 +1,100 @@
+import json
+from enum import Enum, IntEnum
+
+import pytest
+
+from itf_py.binary import open_binary_trace, write_binary_trace
+from itf_py.itf import (
+    ImmutableDict,
+    ImmutableList,
+    ITFUnserializable,
+    State,
+    Trace,
+    trace_from_json,
+    value_from_json,
+)
+
+from .conftest import TFTP_TRACE
+
+
+class TestBinaryTrace:
+    """Test the binary format of traces."""
+
+    def test_roundtrip_values(self, tmp_path):
+        """Test that all kinds of values are restored with their types"""
+        values = {
+            "b": True,
+            "n": None,
+            "i": -42,
+            "big": -(2**100),
+            "s": "héllo",
+            "l": ImmutableList([1, "a"]),
+            "t": ("a", 2**64),
+            "set": frozenset([1, 2]),
+            "m": ImmutableDict({"k": frozenset()}),
+            "r": value_from_json({"a": 1, "b": "x"}),
+            "v": value_from_json({"tag": "Banana", "value": {"length": 5}}),
+            "u": ITFUnserializable("custom"),
+        }
+        trace = Trace(
+            meta={"id": 1},
+            params=[],
+            vars=list(values.keys()),
+            states=[State(meta={"no": 0}, values=values)],
+            loop=0,
+        )
+        path = tmp_path / "trace.itfb"
+        write_binary_trace(trace, path)
+        with open_binary_trace(path) as binary:
+            assert binary.meta == {"id": 1}
+            assert binary.loop == 0
+            restored = binary[0].values
+            assert restored == values
+            for k, v in values.items():
+                assert type(restored[k]) is type(v)
+
+    def test_enum_values(self, tmp_path):
+        """Test that enumerations of strings and integers are stored by their
+        values, as in the JSON"""
+
+        class Color(str, Enum):
+            RED = "red"
+
+        class Size(IntEnum):
+            BIG = 5
+
+        trace = Trace(
+            meta={},
+            params=[],
+            vars=["c", "s"],
+            states=[State(meta={}, values={"c": Color.RED, "s": [Size.BIG]})],
+            loop=None,
+        )
+        path = tmp_path / "trace.itfb"
+        write_binary_trace(trace, path)
+        with open_binary_trace(path) as binary:
+            restored = binary[0].values
+        assert type(restored["c"]) is str and restored["c"] == "red"
+        assert restored["s"] == [5] and type(restored["s"][0]) is int
+
+    def test_random_access(self, tmp_path):
+        """Test decoding single states of the TFTP example"""
+        with open(TFTP_TRACE, "r") as f:
+            trace = trace_from_json(json.load(f))
+        path = tmp_path / "tftp.itfb"
+        write_binary_trace(trace, path)
+        with open_binary_trace(path) as binary:
+            assert len(binary) == len(trace.states)
+            assert binary.vars == trace.vars
+            for i in [50, 0, 97, -1]:
+                assert binary[i] == trace.states[i]
+            with pytest.raises(IndexError):
+                binary[len(trace.states)]
+            assert binary.to_trace() == trace
+
+    def test_not_binary_trace(self, tmp_path):
+        """Test that other files are rejected"""
+        path = tmp_path / "trace.itf.json"
+        path.write_text(TFTP_TRACE.read_text())
+        with pytest.raises(ValueError):
+            open_binary_trace(path)
@@ -0,0 +1,141 @@
+import json
+from array import array
+
+import pytest
+
+from itf_py.columnar import ColumnarTrace, extract_ints
+from itf_py.itf import State, Trace, trace_from_json
+
+from .conftest import TFTP_TRACE
+
+
+def make_trace():
+    return Trace(
+        meta={},
+        params=[],
+        vars=["clock", "big", "pc"],
+        loop=None,
+        states=[
+            State(meta={}, values={"clock": 0, "big": 2**70, "pc": "init"}),
+            State(meta={}, values={"clock": 1, "big": 1, "pc": ("a", 1)}),
+            State(meta={}, values={"clock": 5, "big": -1, "pc": ("b", 2)}),
+        ],
+    )
+
+
+class TestColumnarTrace:
+    """Test the columnar view of traces."""
+
+    def test_columns(self):
+        """Test that integers are stored in arrays, unless they are too big"""
+        columns = make_trace().columns()
+        assert isinstance(columns, ColumnarTrace)
+        assert columns.vars == ["clock", "big", "pc"]
+        assert len(columns) == 3
+        assert columns["clock"] == array("q", [0, 1, 5])
+        assert columns["big"] == [2**70, 1, -1]
+        assert columns["pc"] == ["init", ("a", 1), ("b", 2)]
+
+    def test_columns_missing_and_bool(self):
+        """Test that missing values and Booleans are kept as objects"""
+        trace = Trace(
+            meta={},
+            params=[],
+            vars=["x", "b"],
+            loop=None,
+            states=[
+                State(meta={}, values={"x": 1, "b": True}),
+                State(meta={}, values={"b": False}),
+            ],
+        )
+        columns = trace.columns()
+        assert columns["x"] == [1, None]
+        assert columns["b"] == [True, False]
+
+    def test_slices(self):
+        """Test slicing columns by state ranges"""
+        columns = make_trace().columns()
+        assert columns.column("clock", 1) == array("q", [1, 5])
+        part = columns.slice(0, 2)
+        assert len(part) == 2
+        assert part["pc"] == ["init", ("a", 1)]
+
+    def test_to_numpy(self):
+        """Test conversion to NumPy arrays"""
+        np = pytest.importorskip("numpy")
+        columns = make_trace().columns()
+        clock = columns.to_numpy("clock")
+        assert clock.dtype == np.int64
+        assert clock.tolist() == [0, 1, 5]
+        pc = columns.to_numpy("pc")
+        assert pc.dtype == object
+        assert pc[1] == ("a", 1)
+
+
+RAW_TRACE = {
+    "vars": ["clock", "action"],
+    "states": [
+        {
+            "#meta": {"index": 0},
+            "clock": {"#bigint": "0"},
+            "action": {"tag": "Send", "value": {"msg": {"id": 7, "body": "a"}}},
+        },
+        {
+            "#meta": {"index": 1},
+            "clock": 3,
+            "action": {"tag": "Recv", "value": {"msg": {"id": {"#bigint": "-8"}}}},
+        },
+    ],
+}
+
+
+class TestExtractInts:
+    """Test extraction of integers from the JSON of traces."""
+
+    def test_extract_ints(self):
+        """Test that variables and nested fields are extracted"""
+        np = pytest.importorskip("numpy")
+        clock = extract_ints(RAW_TRACE, "clock")
+        assert clock.dtype == np.int64
+        assert clock.tolist() == [0, 3]
+        ids = extract_ints(RAW_TRACE, "action", ["msg", "id"])
+        assert ids.tolist() == [7, -8]
+
+    def test_extract_ints_out(self):
+        """Test that the preallocated array is filled"""
+        np = pytest.importorskip("numpy")
+        out = np.zeros(2, dtype=np.int64)
+        assert extract_ints(RAW_TRACE, "clock", out=out) is out
+        assert out.tolist() == [0, 3]
+
+    def test_extract_ints_overflow(self):
+        """Test that big integers are extracted into an array of objects,
+        unless the array is given"""
+        np = pytest.importorskip("numpy")
+        data = {"states": [{"x": {"#bigint": str(2**70)}}, {"x": 1}]}
+        big = extract_ints(data, "x")
+        assert big.dtype == object
+        assert big.tolist() == [2**70, 1]
+        out = np.zeros(2, dtype=np.int64)
+        with pytest.raises(OverflowError, match="x do not fit"):
+            extract_ints(data, "x", out=out)
+
+    def test_extract_ints_errors(self):
+        """Test that missing and non-integer values are reported"""
+        pytest.importorskip("numpy")
+        with pytest.raises(ValueError, match="action.msg.body in state 0"):
+            extract_ints(RAW_TRACE, "action", ["msg", "body"])
+        with pytest.raises(ValueError, match="x in state 1"):
+            extract_ints({"states": [{"x": 1}, {"y": 2}]}, "x")
+        with pytest.raises(ValueError):
+            extract_ints({"states": [{"x": True}]}, "x")
+
+    def test_extract_ints_tftp(self):
+        """Test that the values are the same as of the decoded trace"""
+        pytest.importorskip("numpy")
+        with open(TFTP_TRACE) as f:
+            data = json.load(f)
+        trace = trace_from_json(data)
+        assert extract_ints(data, "clock").tolist() == [
+            s.values["clock"] for s in trace.states
+        ]
@@ -0,0 +1,63 @@
+import json
+
+from itf_py.corpus import TraceCorpus
+from itf_py.itf import trace_from_json
+
+from .conftest import TFTP_TRACE
+
+
+def make_trace(xs):
+    return {
+        "vars": ["x", "pc"],
+        "states": [
+            {"x": {"#bigint": str(x)}, "pc": {"tag": "A" if x < 2 else "B", "value": x}}
+            for x in xs
+        ],
+    }
+
+
+class TestTraceCorpus:
+    """Test collections of traces with shared values."""
+
+    def test_add(self):
+        """Test that the traces are decoded as by trace_from_json"""
+        corpus = TraceCorpus()
+        data = make_trace([0, 1, 2])
+        trace = corpus.add(data)
+        assert trace == trace_from_json(data)
+        assert len(corpus) == 1
+        assert corpus[0] is trace
+
+    def test_shared_states(self):
+        """Test that equal values and states are shared by the traces"""
+        corpus = TraceCorpus()
+        a = corpus.add(make_trace([0, 1, 2]))
+        b = corpus.add(make_trace([0, 1, 3]))
+        assert a.states[1].values is b.states[1].values
+        assert a.states[2].values["pc"] is not b.states[2].values["pc"]
+        assert len(corpus.distinct_states()) == 4
+
+    def test_analytics(self):
+        """Test the tag coverage and the histograms"""
+        corpus = TraceCorpus()
+        corpus.add(make_trace([0, 1, 2]))
+        corpus.add(make_trace([0, 0, 3]))
+        assert corpus.tag_coverage("pc") == {"A": 4, "B": 2}
+        histogram = corpus.histogram("x")
+        assert histogram[0] == (0, 3)
+        assert sorted(histogram[1:]) == [(1, 1), (2, 1), (3, 1)]
+
+    def test_tftp_files(self, tmp_path):
+        """Test a corpus of the prefixes of the TFTP example"""
+        with open(TFTP_TRACE) as f:
+            data = json.load(f)
+        paths = []
+        for k in (10, 20, 30):
+            path = tmp_path / f"trace{k}.itf.json"
+            path.write_text(json.dumps(dict(data, states=data["states"][:k])))
+            paths.append(path)
+        corpus = TraceCorpus.from_files(paths)
+        assert [len(t.states) for t in corpus] == [10, 20, 30]
+        assert corpus[2] == trace_from_json(json.loads(paths[2].read_text()))
+        assert len(corpus.distinct_states()) <= 30
+        assert sum(corpus.tag_coverage("lastAction").values()) == 60
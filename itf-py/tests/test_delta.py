@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+from itf_py.delta import DeltaTrace, state_delta, trace_from_delta, trace_to_delta
+from itf_py.fingerprint import state_fingerprints
+from itf_py.itf import ImmutableDict, State, Trace, trace_from_json
+
+from .conftest import TFTP_TRACE
+
+
+def make_trace():
+    big_set = frozenset(range(10))
+    big_map = ImmutableDict({i: str(i) for i in range(10)})
+    return Trace(
+        meta={"id": 1},
+        params=["N"],
+        vars=["s", "m", "x"],
+        loop=None,
+        states=[
+            State(meta={"no": 0}, values={"N": 3, "s": big_set, "m": big_map, "x": 1}),
+            State(
+                meta={"no": 1},
+                values={
+                    "s": (big_set - {0}) | {10},
+                    "m": ImmutableDict({**big_map, 1: "one", 11: "11"}),
+                    "x": 1,
+                },
+            ),
+            State(meta={"no": 2}, values={"s": frozenset(), "m": big_map, "x": 2}),
+        ],
+    )
+
+
+class TestDelta:
+    """Test the delta encoding of traces."""
+
+    def test_state_delta(self):
+        """Test that only the changes are stored"""
+        states = make_trace().states
+        delta = state_delta(states[0], states[1])
+        assert delta["#meta"] == {"no": 1}
+        assert delta["#remove"] == ["N"]
+        assert "#assign" not in delta
+        assert delta["#patch"]["s"] == {
+            "#add": [{"#bigint": "10"}],
+            "#remove": [{"#bigint": "0"}],
+        }
+        put = delta["#patch"]["m"]["#put"]
+        assert len(put) == 2
+        assert [{"#bigint": "1"}, "one"] in put
+        assert [{"#bigint": "11"}, "11"] in put
+        delta = state_delta(states[1], states[2])
+        assert delta["#assign"]["s"] == {"#set": []}
+        assert delta["#assign"]["x"] == {"#bigint": "2"}
+
+    @pytest.mark.parametrize("interval", [1, 2, 64])
+    def test_roundtrip(self, interval):
+        """Test that the states are reconstructed from the deltas"""
+        trace = make_trace()
+        data = json.loads(json.dumps(trace_to_delta(trace, interval)))
+        assert trace_from_delta(data) == trace
+
+    def test_random_access(self):
+        """Test access to the states in arbitrary order"""
+        with open(TFTP_TRACE, "r") as f:
+            trace = trace_from_json(json.load(f))
+        data = trace_to_delta(trace, keyframe_interval=16)
+        assert len(json.dumps(data)) < len(json.dumps(trace_to_delta(trace, 1)))
+        delta_trace = DeltaTrace(data)
+        assert len(delta_trace) == len(trace.states)
+        for i in [50, 17, 16, 97, 0, 49, -1]:
+            assert delta_trace[i] == trace.states[i]
+        with pytest.raises(IndexError):
+            delta_trace[len(trace.states)]
+
+    def test_tags_and_booleans(self):
+        """Test that the changes of tags and of integers to booleans are kept,
+        even though such values are equal in Python"""
+        unit = "U_OF_UNIT"
+        data = {
+            "vars": ["a", "x", "s", "m"],
+            "states": [
+                {
+                    "a": {"tag": "Init", "value": unit},
+                    "x": {"#bigint": "1"},
+                    "s": {"#set": [{"tag": "Init", "value": unit}, 2, 3, 4]},
+                    "m": {
+                        "#map": [[1, {"tag": "Init", "value": unit}], [2, 2], [3, 3]]
+                    },
+                },
+                {
+                    "a": {"tag": "Step", "value": unit},
+                    "x": True,
+                    "s": {"#set": [{"tag": "Step", "value": unit}, 2, 3, 4]},
+                    "m": {
+                        "#map": [[True, {"tag": "Init", "value": unit}], [2, 2], [3, 3]]
+                    },
+                },
+                {
+                    "a": {"tag": "Step", "value": unit},
+                    "x": True,
+                    "s": {"#set": [{"tag": "Step", "value": unit}, 2, 3, 4]},
+                    "m": {
+                        "#map": [[True, {"tag": "Step", "value": unit}], [2, 2], [3, 3]]
+                    },
+                },
+            ],
+        }
+        trace = trace_from_json(data)
+        delta = trace_to_delta(trace)
+        assert set(delta["states"][1]["#assign"]) == {"a", "x"}
+        assert set(delta["states"][1]["#patch"]) == {"s", "m"}
+        assert set(delta["states"][2]["#patch"]) == {"m"}
+        restored = trace_from_delta(json.loads(json.dumps(delta)))
+        assert state_fingerprints(restored.states) == state_fingerprints(trace.states)
+        last = restored.states[2].values
+        assert last["a"].__class__.__name__ == "Step" and last["x"] is True
+        assert [e.__class__.__name__ for e in last["s"] if e not in (2, 3, 4)] == [
+            "Step"
+        ]
+        key = next(k for k in last["m"] if k == 1)
+        assert key is True and last["m"][key].__class__.__name__ == "Step"
@@ -0,0 +1,141 @@
+import json
+import time
+
+from itf_py.diff import (
+    Change,
+    align_states,
+    diff_states,
+    diff_traces,
+    diff_values,
+)
+from itf_py.itf import ImmutableDict, State, Trace, trace_from_json, value_from_json
+from itf_py.persistent import PSet
+
+from .conftest import TFTP_TRACE
+
+
+def make_trace(values):
+    return Trace(
+        meta={},
+        params=[],
+        vars=["x"],
+        states=[
+            State(meta={"index": i}, values={"x": v}) for i, v in enumerate(values)
+        ],
+        loop=None,
+    )
+
+
+class TestDiffValues:
+    """Test structural differences of values."""
+
+    def test_sets_and_maps(self):
+        """Test that sets and maps are compared by their elements and keys"""
+        old = value_from_json({"#map": [["a", {"#set": [1, 2]}], ["b", 1]]})
+        new = value_from_json({"#map": [["a", {"#set": [2, 3]}], ["c", 1]]})
+        assert sorted(diff_values(old, new)) == sorted(
+            [
+                Change(("a",), "removed", 1, None),
+                Change(("a",), "added", None, 3),
+                Change(("b",), "removed", 1, None),
+                Change(("c",), "added", None, 1),
+            ]
+        )
+        assert diff_values(frozenset([1]), PSet([1])) == []
+
+    def test_keys_equal_in_python(self):
+        """Test that the map keys are matched by their fingerprints, not by
+        the Python equality"""
+        old, new = ImmutableDict({1: "a"}), ImmutableDict({True: "a"})
+        assert diff_values(old, new) == [
+            Change((1,), "removed", "a", None),
+            Change((True,), "added", None, "a"),
+        ]
+        init = value_from_json({"tag": "Init", "value": "U_OF_UNIT"})
+        step = value_from_json({"tag": "Step", "value": "U_OF_UNIT"})
+        changes = diff_values(ImmutableDict({init: 1}), ImmutableDict({step: 1}))
+        assert [(c.kind, c.path[0].__class__.__name__) for c in changes] == [
+            ("removed", "Init"),
+            ("added", "Step"),
+        ]
+
+    def test_records_and_variants(self):
+        """Test that records and variants are compared by their fields"""
+        old = value_from_json({"r": {"tag": "A", "value": {"f": 1, "g": [1, 2]}}})
+        new = value_from_json({"r": {"tag": "A", "value": {"f": 1, "g": [1, 3, 4]}}})
+        assert diff_values(old, new) == [
+            Change(("r", "g", 2), "added", None, 4),
+            Change(("r", "g", 1), "changed", 2, 3),
+        ]
+        other = value_from_json({"r": {"tag": "B", "value": {"f": 1, "g": []}}})
+        assert diff_values(old, other) == [Change(("r",), "changed", old.r, other.r)]
+
+
+class TestDiffTraces:
+    """Test aligning and comparing traces."""
+
+    def test_align_states(self):
+        """Test that equal states are aligned and the others are paired"""
+        assert align_states([1, 2, 3], [1, 2, 3]) == [(0, 0), (1, 1), (2, 2)]
+        assert align_states([1, 2, 3], [1, 9, 3]) == [(0, 0), (1, 1), (2, 2)]
+        assert align_states([1, 2, 3, 4], [1, 3, 4]) == [
+            (0, 0),
+            (1, None),
+            (2, 1),
+            (3, 2),
+        ]
+        assert align_states([1, 5, 2, 6, 3], [1, 2, 7, 3, 8]) == [
+            (0, 0),
+            (1, None),
+            (2, 1),
+            (3, 2),
+            (4, 3),
+            (None, 4),
+        ]
+        assert align_states([], [1]) == [(None, 0)]
+
+    def test_diff_traces(self):
+        """Test that the first divergence is reported with its changes"""
+        old = make_trace([1, 2, 3, 4])
+        new = make_trace([1, 2, 30, 4, 5])
+        diff = diff_traces(old, new)
+        assert not diff.equal
+        assert diff.first_divergence is not None
+        assert diff.first_divergence.old_index == 2
+        assert diff.first_divergence.changes == [Change(("x",), "changed", 3, 30)]
+        assert diff.states[1].old_index is None and diff.states[1].new_index == 4
+        assert diff_traces(old, make_trace([1, 2, 3, 4])).equal
+
+    def test_diff_states(self):
+        """Test that added and removed variables are reported"""
+        old = State(meta={}, values={"x": 1, "y": 2})
+        new = State(meta={}, values={"x": 1, "z": 3})
+        assert diff_states(old, new) == [
+            Change(("y",), "removed", 2, None),
+            Change(("z",), "added", None, 3),
+        ]
+
+    def test_diff_tftp(self):
+        """Test that the TFTP example is equal to itself, and a modified copy
+        diverges at the modified state"""
+        with open(TFTP_TRACE) as f:
+            data = json.load(f)
+        original = trace_from_json(data)
+        assert diff_traces(original, trace_from_json(data, intern=True)).equal
+        data["states"][40]["lastAction"] = {"tag": "Modified", "value": "u_OF_UNIT"}
+        modified = diff_traces(original, trace_from_json(data))
+        assert modified.first_divergence is not None
+        assert modified.first_divergence.new_index == 40
+        assert [c.path for c in modified.first_divergence.changes] == [("lastAction",)]
+
+    def test_large_traces(self):
+        """Test that long traces are compared in roughly linear time"""
+        n = 100000
+        old = make_trace(list(range(n)))
+        new = make_trace([v + (v >= n // 2) for v in range(n)])
+        start = time.perf_counter()
+        diff = diff_traces(old, new)
+        assert time.perf_counter() - start < 30
+        assert diff.first_divergence is not None
+        assert diff.first_divergence.old_index == n // 2
+        assert len(diff.alignment) >= n
@@ -0,0 +1,72 @@
+import io
+import json
+from dataclasses import dataclass
+
+from itf_py.itf import (
+    ImmutableDict,
+    ImmutableList,
+    State,
+    Trace,
+    itf_variant,
+    trace_from_json,
+    trace_to_json,
+    value_from_json,
+    value_to_json,
+)
+from itf_py.writer import dump_trace, value_to_text
+
+from .conftest import TFTP_TRACE
+
+
+@itf_variant
+@dataclass(frozen=True)
+class Apple:
+    length: int
+
+
+class TestDumpTrace:
+    """Test writing ITF traces as JSON text."""
+
+    def test_value_to_text(self):
+        """Test that the text is the same as the one by json.dumps"""
+        values = [
+            True,
+            'héllo "world"',
+            -(2**100),
+            ("a", 1),
+            frozenset([1, 2]),
+            ImmutableDict({"k": ImmutableList([False])}),
+            [],
+            value_from_json({"a": 1, "b": {"#tup": []}}),
+            value_from_json({"tag": "Banana", "value": {"length": 5}}),
+            value_from_json({"tag": "Init", "value": "u_OF_UNIT"}),
+            Apple(length=3),
+        ]
+        for v in values:
+            assert value_to_text(v) == json.dumps(value_to_json(v))
+
+    def test_dump_trace(self):
+        """Test writing a trace"""
+        trace = Trace(
+            meta={"id": 23},
+            params=["N"],
+            vars=["pc", "x"],
+            loop=0,
+            states=[
+                State(meta={"no": 0}, values={"N": 3, "pc": "init", "x": 42}),
+                State(meta={"no": 1}, values={"pc": "lock", "x": 43}),
+            ],
+        )
+        out = io.StringIO()
+        dump_trace(trace, out)
+        assert json.loads(out.getvalue()) == trace_to_json(trace)
+
+    def test_dump_trace_tftp(self):
+        """Test that the TFTP example is written as by json.dumps"""
+        with open(TFTP_TRACE, "r") as f:
+            data = json.load(f)
+        for lazy in [False, True]:
+            trace = trace_from_json(data, lazy=lazy)
+            out = io.StringIO()
+            dump_trace(trace, out)
+            assert out.getvalue() == json.dumps(trace_to_json(trace))
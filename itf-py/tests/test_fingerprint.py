@@ -0,0 +1,186 @@
+import json
+import subprocess
+import sys
+from enum import Enum, IntEnum
+from typing import NamedTuple
+
+import pytest
+
+from itf_py.diff import diff_values
+from itf_py.fingerprint import (
+    Fingerprinter,
+    find_loop,
+    find_repeated_states,
+    state_fingerprint,
+    state_fingerprints,
+    validate_loop,
+    value_fingerprint,
+)
+from itf_py.itf import (
+    ImmutableDict,
+    ImmutableList,
+    State,
+    Trace,
+    itf_variant,
+    trace_from_json,
+    value_from_json,
+)
+
+from .conftest import TFTP_TRACE
+
+
+def make_trace(xs, loop=None):
+    return Trace(
+        meta={},
+        params=[],
+        vars=["x"],
+        loop=loop,
+        states=[State(meta={"i": i}, values={"x": x}) for i, x in enumerate(xs)],
+    )
+
+
+class TestFingerprint:
+    """Test the fingerprints of values and states."""
+
+    def test_equal_values(self):
+        """Test that equal values have equal fingerprints"""
+        raw = {"#set": [{"a": 1, "b": [1, 2]}, {"#map": [[1, "x"], [2, "y"]]}]}
+        reordered = {"#set": [{"#map": [[2, "y"], [1, "x"]]}, {"a": 1, "b": [1, 2]}]}
+        assert value_fingerprint(value_from_json(raw)) == value_fingerprint(
+            value_from_json(reordered)
+        )
+        assert value_fingerprint(1, bits=64) < 2**64
+
+    def test_different_values(self):
+        """Test that the kinds of values and the tags are distinguished"""
+
+        @itf_variant
+        class A(NamedTuple):
+            value: int
+
+        @itf_variant
+        class B(NamedTuple):
+            value: int
+
+        values = [
+            1,
+            True,
+            "1",
+            (1,),
+            ImmutableList([1]),
+            frozenset([1]),
+            ImmutableDict({1: 1}),
+            A(1),
+            B(1),
+            value_from_json({"value": 1}),
+        ]
+        assert len({value_fingerprint(v) for v in values}) == len(values)
+
+    def test_stable_across_processes(self):
+        """Test that the fingerprints do not depend on the hash seed"""
+        code = (
+            "from itf_py.fingerprint import value_fingerprint;"
+            "print(value_fingerprint(frozenset(['a', 'b', 'c'])))"
+        )
+        outputs = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                env={"PYTHONHASHSEED": str(seed), "PYTHONPATH": ":".join(sys.path)},
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+            for seed in (1, 2)
+        }
+        assert outputs == {str(value_fingerprint(frozenset(["a", "b", "c"])))}
+
+    def test_state_ignores_meta(self):
+        """Test that the fingerprint of a state ignores its metadata"""
+        a = State(meta={"i": 0}, values={"x": 1, "y": "a"})
+        b = State(meta={"i": 1}, values={"y": "a", "x": 1})
+        assert state_fingerprint(a) == state_fingerprint(b)
+        assert state_fingerprint(a) != state_fingerprint(State({}, {"x": 1}))
+
+    def test_find_repeated_states(self):
+        """Test finding the groups of equal states"""
+        trace = make_trace([1, 2, 1, 3, 2, 1])
+        assert find_repeated_states(trace.states) == [[0, 2, 5], [1, 4]]
+        assert find_repeated_states(make_trace([1, 2]).states) == []
+
+    def test_loop(self):
+        """Test finding and validating the loop of a lasso"""
+        assert find_loop(make_trace([1, 2, 3, 2])) == 1
+        assert find_loop(make_trace([1, 2, 3])) is None
+        assert validate_loop(make_trace([1, 2, 3, 2], loop=1))
+        assert not validate_loop(make_trace([1, 2, 3, 2], loop=0))
+        assert not validate_loop(make_trace([1, 2], loop=5))
+        assert validate_loop(make_trace([1, 2]))
+
+    def test_tftp_interned(self):
+        """Test that the interned and the plain trace have equal fingerprints"""
+        with open(TFTP_TRACE) as f:
+            data = json.load(f)
+        fingerprinter = Fingerprinter()
+        interned = trace_from_json(data, intern=True)
+        expected = state_fingerprints(trace_from_json(data).states)
+        assert state_fingerprints(interned.states, fingerprinter) == expected
+        distinct = []
+        for state in interned.states:
+            if all(state.values != other.values for other in distinct):
+                distinct.append(state)
+        assert len(set(expected)) == len(distinct)
+
+    def test_deep_values(self):
+        """Test that the depth of values is not bounded by the recursion limit"""
+        depth = 10 * sys.getrecursionlimit()
+
+        def deep(last):
+            val = last
+            for _ in range(depth):
+                val = ImmutableList([val])
+            return val
+
+        assert value_fingerprint(deep(1)) == value_fingerprint(deep(1))
+        assert value_fingerprint(deep(1)) != value_fingerprint(deep(2))
+        (change,) = diff_values(deep(1), deep(2))
+        assert len(change.path) == depth and (change.old, change.new) == (1, 2)
+
+    def test_enum_values(self):
+        """Test that the enumerations of strings and integers are fingerprinted
+        by their values, as in the JSON"""
+
+        class Color(str, Enum):
+            RED = "red"
+
+        class Size(IntEnum):
+            BIG = 5
+
+        assert value_fingerprint(Color.RED) == value_fingerprint("red")
+        assert value_fingerprint(Size.BIG) == value_fingerprint(5)
+        assert value_fingerprint([Color.RED]) == value_fingerprint(["red"])
+
+    def test_invalid_bits(self):
+        """Test that only 64 and 128 bits are supported"""
+        with pytest.raises(ValueError):
+            Fingerprinter(bits=32)
+
+
+class TestImmutableListHash:
+    """Test the hash of immutable lists."""
+
+    def test_hash_is_cached(self):
+        """Test that the hash is equal to the hash of the tuple"""
+        lst = ImmutableList([1, 2])
+        assert hash(lst) == hash((1, 2))
+        assert hash(lst) == hash(lst)
+
+    def test_in_place_modification(self):
+        """Test that in-place operators and sorting are forbidden"""
+        lst = ImmutableList([2, 1])
+        with pytest.raises(TypeError):
+            lst += [3]
+        with pytest.raises(TypeError):
+            lst *= 2
+        with pytest.raises(TypeError):
+            lst.sort()
+        assert lst == [2, 1]
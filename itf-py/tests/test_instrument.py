@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from itf_py.instrument import (
+    Profiler,
+    count_kinds,
+    profile_trace_from_json,
+    profile_trace_to_json,
+)
+from itf_py.itf import ValuePool, trace_from_json, trace_to_json, value_from_json
+
+from .conftest import TFTP_TRACE
+
+TRACE_JSON = {
+    "vars": ["x", "s"],
+    "states": [
+        {"#meta": {"no": 0}, "x": {"#bigint": "1"}, "s": {"#set": [{"a": 1}]}},
+        {"#meta": {"no": 1}, "x": 2, "s": {"#set": []}},
+    ],
+}
+
+
+class TestInstrument:
+    """Test profiling of decoding and encoding."""
+
+    def test_count_kinds(self):
+        """Test counting the nodes by their kinds"""
+        val = {
+            "#map": [[{"#tup": [1, "a"]}, {"tag": "T", "value": {"f": [True]}}]],
+        }
+        assert count_kinds(val) == {
+            "#map": 1,
+            "#tup": 1,
+            "int": 1,
+            "str": 1,
+            "variant": 1,
+            "list": 1,
+            "bool": 1,
+        }
+        assert count_kinds({"#bigint": "1"}) == {"#bigint": 1}
+        assert count_kinds({"a": {"#unserializable": "?"}}) == {
+            "record": 1,
+            "#unserializable": 1,
+        }
+
+    def test_profile_trace_from_json(self):
+        """Test that the trace is decoded and the variables are measured"""
+        trace, profile = profile_trace_from_json(TRACE_JSON)
+        assert trace == trace_from_json(TRACE_JSON)
+        assert len(profile.state_seconds) == 2
+        assert set(profile.vars) == {"x", "s"}
+        assert profile.vars["x"].kinds == {"#bigint": 1, "int": 1}
+        assert profile.vars["s"].kinds == {"#set": 2, "record": 1, "int": 1}
+        assert profile.vars["s"].json_bytes == len('{"#set": [{"a": 1}]}{"#set": []}')
+        assert profile.kinds["int"] == 2
+        assert profile.seconds >= sum(profile.state_seconds)
+        assert set(profile.kind_seconds) == {"int", "#set", "record"}
+        assert set(profile.vars["s"].kind_seconds) == {"int", "#set", "record"}
+        assert sum(profile.kind_seconds.values()) <= profile.seconds
+
+    def test_profiler(self):
+        """Test that the profiler measures the time by the kinds of values
+        in the typed and the generic decoders"""
+        data = {
+            "#meta": {"varTypes": {"m": "(Int -> Seq(<<Str, Bool>>))"}},
+            "vars": ["m", "v", "u"],
+            "states": [
+                {
+                    "m": {"#map": [[{"#bigint": "1"}, [{"#tup": ["a", True]}]]]},
+                    "v": {"tag": "A", "value": "u_OF_UNIT"},
+                    "u": {"#unserializable": "Nat"},
+                }
+            ],
+        }
+        profiler = Profiler()
+        trace = trace_from_json(data, profiler=profiler)
+        assert trace == trace_from_json(data)
+        profile = profiler.report()
+        assert set(profile.vars["m"].kind_seconds) == {
+            "#map",
+            "int",
+            "list",
+            "#tup",
+            "str",
+            "bool",
+        }
+        assert set(profile.vars["v"].kind_seconds) == {"variant", "str"}
+        assert set(profile.vars["u"].kind_seconds) == {"#unserializable"}
+        assert profile.vars["m"].kinds["#bigint"] == 1
+        with pytest.raises(ValueError):
+            trace_from_json(data, lazy=True, profiler=profiler)
+
+    def test_profiler_interned(self):
+        """Test that the profiler keeps interning the values"""
+        state = {"s": {"#set": [{"a": {"#tup": [1, "x"]}}]}}
+        data = {"vars": ["s"], "states": [state, dict(state)]}
+        profiler = Profiler()
+        trace = trace_from_json(data, intern=True, profiler=profiler)
+        assert trace == trace_from_json(data)
+        first, second = trace.states
+        assert first.values["s"] is second.values["s"]
+        assert set(profiler.report().kind_seconds) == {
+            "#set",
+            "record",
+            "#tup",
+            "int",
+            "str",
+        }
+
+    def test_profiler_as_pool(self):
+        """Test that the pool of a profiler interns values in the pool of
+        the caller"""
+        pool = ValuePool()
+        profiler = Profiler()
+        timing_pool = profiler.wrap_pool(pool)
+        assert profiler.wrap_pool(timing_pool) is timing_pool
+        a = value_from_json({"#set": [1, 2]}, timing_pool)
+        b = value_from_json({"#set": [1, 2]}, timing_pool)
+        assert a is b and len(pool) == 3
+        assert set(profiler.report().kind_seconds) == {"#set", "int"}
+
+    def test_profile_trace_to_json(self):
+        """Test that the trace is encoded and the variables are measured"""
+        trace = trace_from_json(TRACE_JSON)
+        data, profile = profile_trace_to_json(trace)
+        assert data == trace_to_json(trace)
+        assert profile.vars["x"].kinds == {"#bigint": 2}
+
+    def test_profile_tftp(self):
+        """Test the report of the TFTP example"""
+        with open(TFTP_TRACE) as f:
+            data = json.load(f)
+        trace, profile = profile_trace_from_json(data, intern=True)
+        assert trace == trace_from_json(data)
+        report = json.loads(json.dumps(profile.to_json()))
+        assert report["kinds"]["variant"] > 0
+        assert set(report["vars"]) == set(trace.vars)
+        assert "lastAction" in profile.summary()
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+from itf_py.itf import State, trace_from_json
+from itf_py.stream import TraceHeader, iter_states, read_trace_header
+
+from .conftest import TFTP_TRACE
+
+TRACE_JSON = {
+    "#meta": {"id": 23},
+    "params": ["N"],
+    "vars": ["pc", "x"],
+    "states": [
+        {
+            "#meta": {"no": 0},
+            "N": {"#bigint": "3"},
+            "pc": "init",
+            "x": {"#bigint": "42"},
+        },
+        {
+            "#meta": {"no": 1},
+            "pc": "lock",
+            "x": {"#bigint": "43"},
+        },
+    ],
+    "loop": 1,
+}
+
+
+class TestIterStates:
+    """Test reading ITF traces incrementally."""
+
+    def test_iter_states(self):
+        """Test reading states from a text file object"""
+        text = json.dumps(TRACE_JSON, indent=2)
+        states = list(iter_states(io.StringIO(text)))
+        assert states == [
+            State(meta={"no": 0}, values={"N": 3, "pc": "init", "x": 42}),
+            State(meta={"no": 1}, values={"pc": "lock", "x": 43}),
+        ]
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 7, 64])
+    def test_iter_states_small_chunks(self, chunk_size):
+        """Test that states are read correctly when split across chunks"""
+        text = json.dumps(TRACE_JSON)
+        states = list(iter_states(io.StringIO(text), chunk_size=chunk_size))
+        assert states == trace_from_json(TRACE_JSON).states
+
+    def test_iter_states_binary(self):
+        """Test reading states from a binary file object"""
+        data = json.dumps({"vars": ["s"], "states": [{"s": "λ"}]}).encode()
+        states = list(iter_states(io.BytesIO(data), chunk_size=1))
+        assert states == [State(meta={}, values={"s": "λ"})]
+
+    def test_read_trace_header(self):
+        """Test reading the fields that surround the states"""
+        header = read_trace_header(io.StringIO(json.dumps(TRACE_JSON)))
+        assert header == TraceHeader(
+            meta={"id": 23}, params=["N"], vars=["pc", "x"], loop=1
+        )
+
+    def test_iter_states_truncated(self):
+        """Test that a truncated trace is reported"""
+        text = json.dumps(TRACE_JSON)[:-20]
+        with pytest.raises(ValueError):
+            list(iter_states(io.StringIO(text)))
+
+    def test_iter_states_tftp(self):
+        """Test reading the states of the TFTP example from its path"""
+        with open(TFTP_TRACE, "r") as f:
+            expected = trace_from_json(json.load(f))
+        assert list(iter_states(TFTP_TRACE)) == expected.states
+        header = read_trace_header(str(TFTP_TRACE))
+        assert header.vars == expected.vars
+        assert header.meta == expected.meta
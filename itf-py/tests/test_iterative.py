@@ -0,0 +1,105 @@
+import io
+import json
+import sys
+
+from itf_py.iterative import value_from_json_iterative, value_to_json_iterative
+from itf_py.itf import (
+    ImmutableList,
+    State,
+    Trace,
+    ValuePool,
+    value_from_json,
+    value_to_json,
+)
+from itf_py.writer import _json_to_text_iterative, dump_trace, value_to_text
+
+from .conftest import TFTP_TRACE
+
+
+def tftp_values():
+    with open(TFTP_TRACE) as f:
+        data = json.load(f)
+    return [v for s in data["states"] for k, v in s.items() if k != "#meta"]
+
+
+def deep_json(depth):
+    """A linked list of the given depth, as nested records and tuples."""
+    val = {"#tup": []}
+    for i in range(depth):
+        val = {"head": {"#bigint": str(i)}, "tail": val} if i % 2 else {"#tup": [val]}
+    return val
+
+
+def depth_of(val):
+    """The depth of a linked list that is produced by `deep_json`."""
+    depth = 0
+    while True:
+        if isinstance(val, dict):
+            val = val["tail"] if "tail" in val else val["#tup"]
+        else:
+            val = val.tail if hasattr(val, "tail") else val
+        if len(val) == 0:
+            return depth
+        if not isinstance(val, dict) and not hasattr(val, "tail"):
+            val = val[0]
+        depth += 1
+
+
+class TestIterative:
+    """Test decoding and encoding values with an explicit stack."""
+
+    def test_same_as_recursive(self):
+        """Test that the results are the same as of the recursive functions"""
+        raw = tftp_values()
+        values = [value_from_json(v) for v in raw]
+        assert [value_from_json_iterative(v) for v in raw] == values
+        assert [value_to_json_iterative(v) for v in values] == [
+            value_to_json(v) for v in values
+        ]
+
+    def test_same_classes(self):
+        """Test that the decoded values have the same classes"""
+        val = {"#map": [[[1], {"tag": "A", "value": "u"}]], "x": 1}
+        val = {"a": {"#set": [{"#tup": [val["#map"][0][0], {"#bigint": "5"}]}]}}
+        result = value_from_json_iterative(val)
+        assert result == value_from_json(val)
+        (item,) = result.a
+        assert type(item[0]) is ImmutableList
+        assert type(item[1]) is int
+
+    def test_pool(self):
+        """Test interning the values in a pool"""
+        raw = tftp_values()
+        pool = ValuePool()
+        values = [value_from_json_iterative(v, pool) for v in raw]
+        expected_pool = ValuePool()
+        assert values == [value_from_json(v, expected_pool) for v in raw]
+        assert len(pool) == len(expected_pool)
+
+    def test_deep_values(self):
+        """Test that the depth is not bounded by the recursion limit"""
+        depth = 10 * sys.getrecursionlimit()
+        raw = deep_json(depth)
+        val = value_from_json_iterative(raw)
+        assert depth_of(value_to_json_iterative(val)) == depth_of(raw)
+
+    def test_recursive_falls_back(self):
+        """Test that value_from_json and value_to_json handle deep values"""
+        raw = deep_json(10 * sys.getrecursionlimit())
+        assert depth_of(value_to_json(value_from_json(raw))) == depth_of(raw)
+
+    def test_text_of_deep_values(self):
+        """Test that value_to_text and dump_trace handle deep values"""
+        for raw in tftp_values():
+            assert _json_to_text_iterative(raw) == json.dumps(raw)
+        depth = 10 * sys.getrecursionlimit()
+        val = value_from_json(deep_json(depth))
+        text = value_to_text(val)
+        assert text == _json_to_text_iterative(value_to_json(val))
+        assert text.count('"tail": ') == depth // 2
+        out = io.StringIO()
+        trace = Trace(
+            meta={}, params=[], vars=["x"], states=[State({}, {"x": val})], loop=None
+        )
+        dump_trace(trace, out)
+        assert out.getvalue().endswith(text + "}]}")
@@ -0,0 +1,76 @@
+import io
+import json
+
+import pytest
+
+from itf_py.itf import trace_from_json, trace_to_json
+from itf_py.jsonio import available_backends, dump, dumps, load, loads
+
+from .conftest import TFTP_TRACE
+
+BACKENDS = available_backends()
+
+TRACE = {
+    "#meta": {"format": "ITF"},
+    "params": [],
+    "vars": ["x", "s", "m", "v", "r", "l"],
+    "loop": None,
+    "states": [
+        {
+            "#meta": {"index": 0},
+            "x": {"#bigint": "123456789012345678901234567890"},
+            "s": {"#set": [{"a": 1, "b": [1, 2]}, {"a": 2, "b": []}]},
+            "m": {"#map": [[{"#tup": [1, "a"]}, {"tag": "T", "value": "u"}]]},
+            "v": {"tag": "Some", "value": {"x": {"#bigint": "7"}}},
+            "r": {"f": [[1], {"#set": [[1]]}], "g": {"#unserializable": "?"}},
+            "l": [{"tag": "Empty", "value": {}}],
+        }
+    ],
+}
+
+
+class TestJsonIO:
+    """Test reading and writing traces with the JSON backends."""
+
+    def test_json_backend_is_available(self):
+        """Test that the standard backend is always available"""
+        assert "json" in BACKENDS
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_loads(self, backend):
+        """Test that the values are decoded as by trace_from_json"""
+        trace = loads(json.dumps(TRACE), backend=backend)
+        assert trace == trace_from_json(TRACE)
+        assert trace.states[0].meta == {"index": 0}
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_loads_intern(self, backend):
+        """Test interning the values while parsing"""
+        text = json.dumps(dict(TRACE, states=TRACE["states"] * 2))
+        trace = loads(text, intern=True, backend=backend)
+        assert trace == trace_from_json(json.loads(text))
+        first, second = trace.states
+        assert first.values["s"] is second.values["s"]
+        assert first.values["r"] is second.values["r"]
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_load_tftp(self, backend):
+        """Test loading the TFTP example"""
+        with open(TFTP_TRACE) as f:
+            expected = trace_from_json(json.load(f))
+        with open(TFTP_TRACE) as f:
+            assert load(f, backend=backend) == expected
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_dumps(self, backend):
+        """Test that the text has the JSON of trace_to_json"""
+        trace = trace_from_json(TRACE)
+        assert json.loads(dumps(trace, backend=backend)) == trace_to_json(trace)
+        out = io.StringIO()
+        dump(trace, out, backend=backend)
+        assert json.loads(out.getvalue()) == trace_to_json(trace)
+
+    def test_unknown_backend(self):
+        """Test that unknown backends are rejected"""
+        with pytest.raises(ValueError):
+            loads("{}", backend="yaml")
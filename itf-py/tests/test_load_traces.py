@@ -0,0 +1,128 @@
+import json
+import os
+import pickle
+import shutil
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from itf_py.itf import ImmutableList, trace_from_json, value_from_json
+from itf_py.parallel import (
+    decode_trace_parallel,
+    load_trace_file,
+    load_trace_parallel,
+    load_traces,
+    locate_states,
+)
+
+from .conftest import TFTP_TRACE
+
+
+class ExitingPath(os.PathLike):
+    """A path that terminates the worker process that opens it."""
+
+    def __fspath__(self):
+        os._exit(1)
+
+
+class TestLoadTraces:
+    """Test loading many traces in parallel."""
+
+    @pytest.fixture
+    def trace_dir(self, tmp_path):
+        for i in range(3):
+            shutil.copy(TFTP_TRACE, tmp_path / f"trace{i}.itf.json")
+        (tmp_path / "broken.itf.json").write_text('{"vars": [], "states": [')
+        return tmp_path
+
+    def test_pickle_values(self):
+        """Test that the decoded values survive pickling"""
+        values = [
+            ImmutableList([1, 2]),
+            value_from_json({"a": {"#bigint": "1"}}),
+            value_from_json({"tag": "Banana", "value": {"length": 5}}),
+            value_from_json({"tag": "Init", "value": "u_OF_UNIT"}),
+        ]
+        for v in values:
+            copy = pickle.loads(pickle.dumps(v))
+            assert copy == v
+            assert type(copy) is type(v)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_load_traces(self, trace_dir, workers):
+        """Test that traces are loaded in order and errors are reported"""
+        paths = sorted(trace_dir.iterdir())
+        results = list(load_traces(paths, workers=workers))
+        assert [r.path for r in results] == paths
+        expected = load_trace_file(TFTP_TRACE)
+        assert expected == trace_from_json(json.loads(TFTP_TRACE.read_text()))
+        assert isinstance(results[0].error, ValueError)
+        assert results[0].trace is None
+        for r in results[1:]:
+            assert r.error is None
+            assert r.trace == expected
+
+    def test_load_traces_unordered(self, trace_dir):
+        """Test that all traces are loaded when collected as they complete"""
+        paths = sorted(trace_dir.iterdir())
+        results = list(load_traces(paths, workers=2, ordered=False))
+        assert sorted(r.path for r in results) == paths
+        assert len([r for r in results if r.error is None]) == 3
+
+    @pytest.mark.parametrize("ordered", [True, False])
+    def test_load_traces_pool_errors(self, ordered):
+        """Test that the errors of the pool are reported in the results"""
+
+        class LocalPath(os.PathLike):
+            def __fspath__(self):
+                return str(TFTP_TRACE)
+
+        unpicklable = LocalPath()
+        results = list(load_traces([unpicklable, TFTP_TRACE], 2, ordered))
+        (failed,) = [r for r in results if r.error is not None]
+        (loaded,) = [r for r in results if r.error is None]
+        assert failed.path is unpicklable and failed.trace is None
+        assert loaded.trace == load_trace_file(TFTP_TRACE)
+
+        exiting = ExitingPath()
+        results = list(load_traces([exiting], workers=2, ordered=ordered))
+        assert [r.path for r in results] == [exiting]
+        assert isinstance(results[0].error, BrokenProcessPool)
+
+
+class TestDecodeTraceParallel:
+    """Test decoding the states of a single trace in parallel."""
+
+    def test_locate_states(self):
+        """Test that the states are found in the text with the other fields"""
+        text = '{"vars": ["x"], "states": [ {"x": 1} , {"x": "]"}], "loop": 1}'
+        fields, spans = locate_states(text)
+        assert fields == {"vars": ["x"], "loop": 1}
+        assert [text[s:e] for s, e in spans] == ['{"x": 1}', '{"x": "]"}']
+        with pytest.raises(ValueError):
+            locate_states(text[:-12])
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_decode_trace_parallel(self, workers):
+        """Test that the trace is the same as decoded serially"""
+        text = TFTP_TRACE.read_text()
+        expected = trace_from_json(json.loads(text))
+        assert decode_trace_parallel(text, workers=workers) == expected
+        assert load_trace_parallel(TFTP_TRACE, workers=workers) == expected
+
+    def test_decode_trace_parallel_intern(self):
+        """Test that the values are interned across the chunks"""
+        text = TFTP_TRACE.read_bytes()
+        trace = decode_trace_parallel(text, workers=2, intern=True)
+        assert trace == trace_from_json(json.loads(text), intern=True)
+        first = {}
+        for state in trace.states:
+            for name, value in state.values.items():
+                if name in first and first[name] == value:
+                    assert first[name] is value
+                first.setdefault(name, value)
+
+    def test_decode_trace_parallel_empty(self):
+        """Test a trace without states"""
+        trace = decode_trace_parallel('{"vars": [], "states": []}', workers=1)
+        assert trace.states == [] and trace.vars == []
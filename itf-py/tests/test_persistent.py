@@ -0,0 +1,196 @@
+import pickle
+import random
+
+import pytest
+from frozendict import frozendict
+
+from itf_py.fingerprint import value_fingerprint
+from itf_py.iterative import value_from_json_iterative, value_to_json_iterative
+from itf_py.itf import (
+    ImmutableDict,
+    ValuePool,
+    compile_decoder,
+    trace_from_json,
+    trace_to_json,
+    value_from_json,
+    value_to_json,
+)
+from itf_py.persistent import PMap, PSet
+from itf_py.vartypes import parse_type
+from itf_py.writer import value_to_text
+
+
+class Colliding:
+    """A key whose hash collides with the hashes of other keys."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def __hash__(self):
+        return self.n % 3
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and other.n == self.n
+
+
+class TestPMap:
+    """Test persistent maps."""
+
+    def test_set_and_delete(self):
+        """Test that the updates produce new maps and keep the old ones"""
+        m1 = PMap({"a": 1})
+        m2 = m1.set("b", 2)
+        m3 = m2.delete("a")
+        assert m1 == {"a": 1}
+        assert m2 == {"a": 1, "b": 2}
+        assert m3 == {"b": 2}
+        assert m2.set("a", 1) is m2
+        assert m2["b"] == 2 and m2.get("c") is None and "c" not in m2
+        with pytest.raises(KeyError):
+            m3.delete("a")
+        with pytest.raises(KeyError):
+            m3["a"]
+
+    def test_structural_sharing(self):
+        """Test that an update shares the untouched nodes with the original"""
+        m1 = PMap((i, i) for i in range(10000))
+        m2 = m1.set(5, -5)
+        shared = set(map(id, m1._root.entries)) & set(map(id, m2._root.entries))
+        assert len(shared) == len(m1._root.entries) - 1
+        assert m1[5] == 5 and m2[5] == -5
+
+    def test_hash_and_equality(self):
+        """Test that maps compare and hash as ImmutableDict does"""
+        d = {i: str(i) for i in range(100)}
+        m = PMap(d)
+        assert m == ImmutableDict(d) and ImmutableDict(d) == m
+        assert hash(m) == hash(ImmutableDict(d)) == hash(frozendict(d))
+        assert m != PMap(d).set(0, "x")
+        assert m != PSet(d)
+        assert {m: 1}[ImmutableDict(d)] == 1
+
+    def test_random_updates(self):
+        """Test random updates, with colliding keys, against a dictionary"""
+        rnd = random.Random(42)
+        m, d = PMap(), {}
+        for i in range(5000):
+            key = rnd.choice([rnd.randrange(500), Colliding(rnd.randrange(30))])
+            if rnd.random() < 0.6:
+                m, d[key] = m.set(key, i), i
+            elif key in d:
+                m = m.delete(key)
+                del d[key]
+            assert len(m) == len(d)
+        assert m == d
+        assert dict(m.items()) == d
+        assert sorted(m.values()) == sorted(d.values())
+
+    def test_pickle(self):
+        """Test that maps can be pickled"""
+        m = PMap({"a": frozenset([1]), "b": PSet([2])})
+        assert pickle.loads(pickle.dumps(m)) == m
+        assert repr(m.delete("a")) == "{'b': PSet({2})}"
+
+
+class TestPSet:
+    """Test persistent sets."""
+
+    def test_add_and_remove(self):
+        """Test that the updates produce new sets and keep the old ones"""
+        s1 = PSet([1, 2])
+        s2 = s1.add(3)
+        s3 = s2.remove(1)
+        assert s1 == {1, 2} and s2 == {1, 2, 3} and s3 == {2, 3}
+        assert s2.add(3) is s2
+        assert s3.discard(1) is s3
+        with pytest.raises(KeyError):
+            s3.remove(1)
+        assert s1 | {5} == {1, 2, 5} and s1 & {2} == {2}
+
+    def test_hash_and_equality(self):
+        """Test that sets compare and hash as frozenset does"""
+        elems = ["a", (1, 2), frozenset([3])]
+        assert PSet(elems) == frozenset(elems)
+        assert hash(PSet(elems)) == hash(frozenset(elems))
+        assert {PSet(elems): 1}[frozenset(elems)] == 1
+        assert PSet() == frozenset() and len(PSet([1, 2]).remove(1).remove(2)) == 0
+
+    def test_random_updates(self):
+        """Test random updates, with colliding elements, against a set"""
+        rnd = random.Random(7)
+        p, s = PSet(), set()
+        for _ in range(5000):
+            elem = rnd.choice([rnd.randrange(500), Colliding(rnd.randrange(30))])
+            if rnd.random() < 0.6:
+                p = p.add(elem)
+                s.add(elem)
+            else:
+                p = p.discard(elem)
+                s.discard(elem)
+        assert p == s and len(p) == len(s)
+
+
+JSON_VALUE = {
+    "#map": [
+        [{"#set": [1, 2]}, {"#map": [["a", {"#tup": [1, "b"]}]]}],
+        [{"#set": []}, {"#map": []}],
+    ]
+}
+
+
+class TestPersistentValues:
+    """Test decoding and encoding of persistent values."""
+
+    def test_value_from_json(self):
+        """Test that persistent values are equal to the default ones"""
+        value = value_from_json(JSON_VALUE, persistent=True)
+        assert value.__class__ is PMap
+        assert all(k.__class__ is PSet for k in value)
+        assert value == value_from_json(JSON_VALUE)
+        assert hash(value) == hash(value_from_json(JSON_VALUE))
+        assert value_from_json_iterative(JSON_VALUE, persistent=True) == value
+
+    def test_value_to_json(self):
+        """Test that persistent values round-trip unchanged"""
+        value = value_from_json(JSON_VALUE, persistent=True)
+        assert value_from_json(value_to_json(value)) == value
+        assert value_to_json_iterative(value) == value_to_json(value)
+        assert value_from_json(value_to_json(value.set(3, PSet([4])))) == {
+            **value_from_json(JSON_VALUE),
+            3: frozenset([4]),
+        }
+        assert value_fingerprint(value) == value_fingerprint(
+            value_from_json(JSON_VALUE)
+        )
+        assert value_to_text(PSet(["x"])) == '{"#set": ["x"]}'
+
+    def test_intern(self):
+        """Test that equal persistent values are interned"""
+        pool = ValuePool()
+        a = value_from_json(JSON_VALUE, pool, persistent=True)
+        b = value_from_json(JSON_VALUE, pool, persistent=True)
+        assert a is b
+
+    def test_compile_decoder(self):
+        """Test that the compiled decoders produce persistent values"""
+        decode = compile_decoder(parse_type("Set(Int) -> Str"), persistent=True)
+        value = decode({"#map": [[{"#set": [{"#bigint": "1"}]}, "a"]]})
+        assert value.__class__ is PMap
+        assert value == {frozenset([1]): "a"}
+
+    def test_trace_from_json(self):
+        """Test that the traces round-trip with persistent values"""
+        data = {
+            "#meta": {"varTypes": {"s": "Set(Int)"}},
+            "vars": ["s", "m"],
+            "states": [
+                {"#meta": {"index": 0}, "s": {"#set": [1]}, "m": {"#map": [[1, 2]]}},
+            ],
+        }
+        trace = trace_from_json(data, persistent=True)
+        values = trace.states[0].values
+        assert values["s"].__class__ is PSet and values["m"].__class__ is PMap
+        assert trace == trace_from_json(data)
+        assert trace_to_json(trace) == trace_to_json(trace_from_json(data))
+        with pytest.raises(ValueError):
+            trace_from_json(data, lazy=True, persistent=True)
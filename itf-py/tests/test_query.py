@@ -0,0 +1,136 @@
+import json
+from typing import NamedTuple
+
+from itf_py.itf import State, Trace, itf_variant, trace_from_json
+from itf_py.query import TraceQuery
+
+from .conftest import TFTP_TRACE
+
+
+def make_trace():
+    return Trace(
+        meta={},
+        params=[],
+        vars=["x", "pc"],
+        loop=None,
+        states=[
+            State(meta={}, values={"x": 0, "pc": "init"}),
+            State(meta={}, values={"x": 1, "pc": "init"}),
+            State(meta={}, values={"x": 1, "pc": "run"}),
+            State(meta={}, values={"x": 3, "pc": "run"}),
+            State(meta={}, values={"pc": "done"}),
+        ],
+    )
+
+
+class TestTraceQuery:
+    """Test the queries over the states of traces."""
+
+    def test_index_and_where(self):
+        """Test that the index maps values to the states"""
+        query = make_trace().query()
+        assert isinstance(query, TraceQuery)
+        assert sorted(query.index("x").values()) == [[0], [1, 2], [3], [4]]
+        assert query.index("x") is query.index("x")
+        assert query.where("x", 1) == [1, 2]
+        assert query.where("x", 2) == []
+
+    def test_select(self):
+        """Test selecting the states by equalities and predicates"""
+        query = make_trace().query()
+        assert query.select(x=1, pc="run") == [2]
+        assert query.select(pc="run") == [2, 3]
+        assert query.select(lambda v: v.get("x", 0) >= 1) == [1, 2, 3]
+        assert query.select(lambda v: v["x"] > 1, pc="run") == [3]
+
+    def test_project(self):
+        """Test projecting the states on variables"""
+        query = make_trace().query()
+        assert query.project("pc", "x", indices=[0, 4]) == [("init", 0), ("done", None)]
+        assert len(query.project("x")) == 5
+
+    def test_changes(self):
+        """Test finding the states that change a variable"""
+        query = make_trace().query()
+        assert query.changes("x") == [1, 3, 4]
+        assert query.first_change("x") == 1
+        assert query.first_change("x", start=2) == 3
+        assert query.first_change("x", start=5) is None
+        assert query.last_change("pc") == 4
+        assert query.last_change("pc", stop=4) == 2
+        assert query.last_change("pc", stop=2) is None
+
+    def test_variants_with_equal_payloads(self):
+        """Test that the tagged unions of different tags are different values"""
+
+        @itf_variant
+        class A(NamedTuple):
+            value: int
+
+        @itf_variant
+        class B(NamedTuple):
+            value: int
+
+        trace = Trace(
+            meta={},
+            params=[],
+            vars=["v"],
+            loop=None,
+            states=[State(meta={}, values={"v": c(1)}) for c in (A, B, A)],
+        )
+        query = trace.query()
+        assert query.where("v", A(1)) == [0, 2]
+        assert query.select(v=B(1)) == [1]
+        assert query.changes("v") == [1, 2]
+        assert query.group_by_tag("v") == {"A": [0, 2], "B": [1]}
+
+    def test_nested_variants(self):
+        """Test that the tagged unions of different tags inside sets are
+        different values"""
+
+        @itf_variant
+        class Init(NamedTuple):
+            value: str
+
+        @itf_variant
+        class Step(NamedTuple):
+            value: str
+
+        trace = Trace(
+            meta={},
+            params=[],
+            vars=["a"],
+            loop=None,
+            states=[
+                State(meta={}, values={"a": frozenset([c("U")])})
+                for c in (Init, Step, Init)
+            ],
+        )
+        query = trace.query()
+        assert query.changes("a") == [1, 2]
+        assert query.where("a", frozenset([Step("U")])) == [1]
+        assert query.select(a=frozenset([Init("U")])) == [0, 2]
+
+    def test_unhashable_values(self):
+        """Test that the queries work with unhashable values"""
+        trace = Trace(
+            meta={},
+            params=[],
+            vars=["x"],
+            loop=None,
+            states=[State(meta={}, values={"x": [i % 2]}) for i in range(3)],
+        )
+        query = trace.query()
+        assert query.where("x", [1]) == [1]
+        assert query.select(x=[0]) == [0, 2]
+
+    def test_tftp_group_by_tag(self):
+        """Test grouping the states of the TFTP example by the last action"""
+        with open(TFTP_TRACE) as f:
+            trace = trace_from_json(json.load(f))
+        groups = trace.query().group_by_tag("lastAction")
+        assert sum(len(g) for g in groups.values()) == len(trace.states)
+        for tag, indices in groups.items():
+            assert indices == sorted(indices)
+            for i in indices:
+                assert type(trace.states[i].values["lastAction"]).__name__ == tag
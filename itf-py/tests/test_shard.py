@@ -0,0 +1,119 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from itf_py.itf import State, trace_from_json, trace_to_json
+from itf_py.parallel import load_traces
+from itf_py.shard import (
+    MANIFEST,
+    ShardedTrace,
+    ShardedTraceWriter,
+    merge_sharded_trace,
+    open_sharded_trace,
+    write_sharded_trace,
+)
+
+from .conftest import TFTP_TRACE
+
+
+def load_tftp():
+    with open(TFTP_TRACE) as f:
+        return trace_from_json(json.load(f))
+
+
+class TestShardedTrace:
+    """Test writing and reading sharded traces."""
+
+    def test_roll_over_by_states(self, tmp_path):
+        """Test that the shards have at most max_states states"""
+        trace = load_tftp()
+        write_sharded_trace(trace, tmp_path, max_states=10)
+        sharded = open_sharded_trace(tmp_path)
+        n = len(trace.states)
+        assert len(sharded.shards) == (n + 9) // 10
+        assert [s["states"] for s in sharded.shards[:-1]] == [10] * (n // 10)
+        assert len(sharded) == n
+        assert sharded.complete
+        assert sharded.to_trace() == trace
+
+    def test_roll_over_by_bytes(self, tmp_path):
+        """Test that the shards are started when the text is large enough"""
+        trace = load_tftp()
+        write_sharded_trace(trace, tmp_path, max_bytes=20000)
+        sharded = ShardedTrace(tmp_path)
+        assert len(sharded.shards) > 1
+        largest = max(len(json.dumps(s)) for s in trace_to_json(trace)["states"])
+        for shard, path in zip(sharded.shards, sharded.paths):
+            assert shard["bytes"] == Path(path).stat().st_size
+            assert shard["bytes"] < 20000 + largest + 1000
+        assert list(sharded) == trace.states
+
+    def test_random_access(self, tmp_path):
+        """Test that any state is accessed by its index"""
+        trace = load_tftp()
+        write_sharded_trace(trace, tmp_path, max_states=7)
+        sharded = ShardedTrace(tmp_path, cached_shards=1)
+        for i in [0, 6, 7, 50, len(trace.states) - 1, -1, 3]:
+            assert sharded[i] == trace.states[i]
+        with pytest.raises(IndexError):
+            sharded[len(trace.states)]
+
+    def test_shards_are_traces(self, tmp_path):
+        """Test that every shard is a trace on its own"""
+        trace = load_tftp()
+        write_sharded_trace(trace, tmp_path, max_states=25)
+        sharded = ShardedTrace(tmp_path)
+        results = list(load_traces(sharded.paths, workers=1))
+        states = [s for r in results for s in r.trace.states]
+        assert states == trace.states
+        assert results[1].trace.meta["firstState"] == 25
+
+    def test_incremental_writer(self, tmp_path):
+        """Test that the completed shards are visible while writing"""
+        writer = ShardedTraceWriter(tmp_path, vars=["x"], max_states=2)
+        reader = ShardedTrace(tmp_path)
+        assert len(reader) == 0 and not reader.complete
+        for i in range(3):
+            writer.append(State(meta={"index": i}, values={"x": i}))
+        reader.refresh()
+        assert len(reader) == 2 and not reader.complete
+        writer.loop = 1
+        writer.close()
+        reader.refresh()
+        assert len(reader) == 3 and reader.complete and reader.loop == 1
+        assert reader[2].values == {"x": 2}
+        with pytest.raises(ValueError):
+            writer.append(State(meta={}, values={"x": 3}))
+
+    def test_merge(self, tmp_path):
+        """Test that the shards are merged into a single trace"""
+        trace = load_tftp()
+        trace.loop = 3
+        write_sharded_trace(trace, tmp_path, max_states=10)
+        out = io.StringIO()
+        merge_sharded_trace(tmp_path, out)
+        assert trace_from_json(json.loads(out.getvalue())) == trace
+        expected = [json.dumps(s) for s in trace_to_json(trace)["states"]]
+        assert out.getvalue().endswith('"states": [' + ", ".join(expected) + "]}")
+
+    def test_decoding_options(self, tmp_path):
+        """Test that the states are decoded with the options of the trace,
+        both by iteration and by index"""
+        with open(TFTP_TRACE) as f:
+            data = json.load(f)
+        write_sharded_trace(load_tftp(), tmp_path, max_states=10)
+        untyped = trace_from_json(data, use_var_types=False)
+        sharded = ShardedTrace(tmp_path, use_var_types=False, intern=True)
+        states = list(sharded)
+        assert states == untyped.states
+        assert [sharded[i] for i in range(len(sharded))] == untyped.states
+        # the values that do not change are shared within the shards
+        assert states[1].values["packets"] is states[2].values["packets"]
+
+    def test_not_a_manifest(self, tmp_path):
+        """Test that other JSON files are rejected"""
+        (tmp_path / MANIFEST).write_text('{"format": "other"}')
+        with pytest.raises(ValueError):
+            ShardedTrace(tmp_path)
@@ -1,4 +1,15 @@
-from itf_py.itf import state_from_json
+import pickle
+
+import pytest
+
+from itf_py.itf import (
+    LazyValues,
+    SlotValues,
+    VarIndex,
+    state_from_json,
+    state_to_json,
+)
+from itf_py.writer import state_to_text
 
 
 class TestStateFromJson:
@@ -14,3 +25,89 @@ class TestStateFromJson:
         result = state_from_json(input)
         assert result.meta == {"id": 1}
         assert result.values == {"x": 42, "y": "hello"}
+
+    def test_state_from_json_lazy(self):
+        """Test decoding a state lazily"""
+        input = {
+            "#meta": {"id": 1},
+            "x": {"#bigint": "42"},
+            "y": {"#set": ["a"]},
+        }
+        result = state_from_json(input, lazy=True)
+        assert isinstance(result.values, LazyValues)
+        assert not result.values.is_decoded("x")
+        assert result.values["x"] == 42
+        assert result.values.is_decoded("x")
+        assert not result.values.is_decoded("y")
+        assert list(result.values) == ["x", "y"]
+        assert result.values == {"x": 42, "y": frozenset(["a"])}
+
+    def test_state_from_json_lazy_to_json(self):
+        """Test that the undecoded values are serialized from their JSON"""
+        input = {
+            "#meta": {"id": 1},
+            "x": {"#bigint": "42"},
+            "y": {"#set": ["a"]},
+        }
+        result = state_from_json(input, lazy=True)
+        result.values["x"] = 43
+        assert state_to_json(result) == {
+            "#meta": {"id": 1},
+            "x": {"#bigint": "43"},
+            "y": {"#set": ["a"]},
+        }
+        assert not result.values.is_decoded("y")
+
+    def test_state_from_json_lazy_pickle(self):
+        """Test that lazy values survive pickling"""
+        result = state_from_json({"x": {"#bigint": "42"}}, lazy=True)
+        copy = pickle.loads(pickle.dumps(result))
+        assert copy == result
+        assert copy.values["x"] == 42
+
+    def test_state_from_json_lazy_pickle_assigned(self):
+        """Test that the assigned lazy values are serialized after pickling"""
+        result = state_from_json({"x": {"#bigint": "42"}, "y": "a"}, lazy=True)
+        result.values["x"] = 5
+        copy = pickle.loads(pickle.dumps(result))
+        assert copy.values["x"] == 5
+        assert state_to_json(copy) == {"#meta": {}, "x": {"#bigint": "5"}, "y": "a"}
+        assert state_to_text(copy) == state_to_text(result)
+
+    def test_state_from_json_compact(self):
+        """Test storing the values of a state in slots"""
+        index = VarIndex(["x", "y"])
+        result = state_from_json(
+            {"y": "hello", "x": {"#bigint": "42"}}, var_index=index
+        )
+        values = result.values
+        assert isinstance(values, SlotValues)
+        assert values == {"x": 42, "y": "hello"}
+        assert list(values) == ["x", "y"]
+        values["z"] = 1
+        del values["x"]
+        assert values == {"y": "hello", "z": 1}
+        assert index.names == ["x", "y", "z"]
+        assert "x" not in values and len(values) == 2
+        assert state_to_json(result) == {
+            "#meta": {},
+            "y": "hello",
+            "z": {"#bigint": "1"},
+        }
+
+    def test_state_from_json_compact_pickle(self):
+        """Test that values in slots survive pickling"""
+        result = state_from_json({"x": {"#bigint": "42"}}, var_index=VarIndex(["x"]))
+        copy = pickle.loads(pickle.dumps(result))
+        assert copy == result
+        assert isinstance(copy.values, SlotValues)
+
+    def test_state_from_json_exclusive_options(self):
+        """Test that the lazy decoding is not combined with other options"""
+        raw = {"x": {"#bigint": "42"}}
+        with pytest.raises(ValueError):
+            state_from_json(raw, lazy=True, persistent=True)
+        with pytest.raises(ValueError):
+            state_from_json(raw, lazy=True, var_index=VarIndex(["x"]))
+        with pytest.raises(TypeError):
+            state_from_json(raw, None, None, True)
@@ -0,0 +1,94 @@
+import os
+import shutil
+
+import itf_py
+from itf_py import cache
+from itf_py.cache import load_trace
+from itf_py.parallel import load_trace_file
+
+from .conftest import TFTP_TRACE
+
+
+def cache_entries(cache_dir):
+    return sorted(p.name for p in cache_dir.iterdir())
+
+
+class TestTraceCache:
+    """Test the persistent cache of decoded traces."""
+
+    def test_load_trace_cached(self, tmp_path):
+        """Test that the decoded trace is stored and reused"""
+        cache_dir = tmp_path / "cache"
+        expected = load_trace_file(TFTP_TRACE)
+        assert load_trace(TFTP_TRACE, cache_dir=cache_dir) == expected
+        entries = cache_entries(cache_dir)
+        assert len(entries) == 1
+        assert load_trace(TFTP_TRACE, cache_dir=cache_dir) == expected
+        assert cache_entries(cache_dir) == entries
+        assert load_trace(TFTP_TRACE) == expected
+
+    def test_load_trace_changed_file(self, tmp_path):
+        """Test that a changed file gets a new entry"""
+        cache_dir = tmp_path / "cache"
+        path = tmp_path / "trace.itf.json"
+        path.write_text('{"vars": ["x"], "states": [{"x": 1}]}')
+        assert load_trace(path, cache_dir=cache_dir).states[0].values == {"x": 1}
+        path.write_text('{"vars": ["x"], "states": [{"x": 2}]}')
+        assert load_trace(path, cache_dir=cache_dir).states[0].values == {"x": 2}
+        assert len(cache_entries(cache_dir)) == 2
+
+    def test_load_trace_corrupt_entry(self, tmp_path):
+        """Test that a corrupt entry is replaced"""
+        cache_dir = tmp_path / "cache"
+        expected = load_trace(TFTP_TRACE, cache_dir=cache_dir)
+        (entry,) = cache_dir.iterdir()
+        entry.write_bytes(b"garbage")
+        assert load_trace(TFTP_TRACE, cache_dir=cache_dir) == expected
+        assert entry.stat().st_size > len(b"garbage")
+
+    def test_eviction(self, tmp_path):
+        """Test that the least recently used entries are evicted"""
+        cache_dir = tmp_path / "cache"
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"trace{i}.itf.json"
+            shutil.copy(TFTP_TRACE, path)
+            with open(path, "a") as f:
+                f.write(" " * i)
+            paths.append(path)
+        load_trace(paths[0], cache_dir=cache_dir)
+        (first,) = cache_dir.iterdir()
+        size = first.stat().st_size
+        os.utime(first, (0, 0))
+        load_trace(paths[1], cache_dir=cache_dir)
+        load_trace(paths[2], cache_dir=cache_dir, max_cache_bytes=2 * size)
+        entries = cache_entries(cache_dir)
+        assert len(entries) == 2
+        assert first.name not in entries
+
+    def test_version_of_source_checkout(self, monkeypatch):
+        """Test that the key depends on the sources without package metadata"""
+
+        def not_found(name):
+            raise cache.metadata.PackageNotFoundError(name)
+
+        monkeypatch.setattr(cache.metadata, "version", not_found)
+        cache._library_version.cache_clear()
+        try:
+            version = cache._library_version()
+        finally:
+            cache._library_version.cache_clear()
+        release, digest = version.split("+")
+        assert release == itf_py.__version__
+        assert len(digest) == 16
+
+    def test_entry_evicted_while_reading(self, tmp_path, monkeypatch):
+        """Test that an entry removed concurrently is a cache miss"""
+        cache_dir = tmp_path / "cache"
+        expected = load_trace(TFTP_TRACE, cache_dir=cache_dir)
+
+        def evicted(path, *args):
+            raise FileNotFoundError(path)
+
+        monkeypatch.setattr(cache.os, "utime", evicted)
+        assert load_trace(TFTP_TRACE, cache_dir=cache_dir) == expected
@@ -1,4 +1,6 @@
-from itf_py.itf import State, Trace, trace_from_json
+import pytest
+
+from itf_py.itf import SlotValues, State, Trace, trace_from_json
 
 
 class TestTraceFromJson:
@@ -37,3 +39,56 @@ class TestTraceFromJson:
             ],
         )
         assert output == expected, f"{output} != {expected}"
+
+    def test_trace_from_json_interned(self):
+        """Test that values are shared between states when interning"""
+        input = {
+            "vars": ["s", "x"],
+            "states": [
+                {"s": {"#set": [{"#bigint": "1"}]}, "x": {"#bigint": "1"}},
+                {"s": {"#set": [{"#bigint": "1"}]}, "x": {"#bigint": "2"}},
+            ],
+        }
+        output = trace_from_json(input, intern=True)
+        assert output == trace_from_json(input)
+        s0, s1 = [state.values["s"] for state in output.states]
+        assert s0 is s1
+
+    def test_trace_from_json_lazy(self):
+        """Test that a lazy trace is equal to the eagerly decoded one"""
+        input = {
+            "#meta": {"varTypes": {"x": "Int", "y": "Set(Str)"}},
+            "vars": ["x", "y"],
+            "states": [
+                {"x": {"#bigint": "1"}, "y": {"#set": ["a"]}},
+                {"x": {"#bigint": "2"}, "y": {"#set": []}},
+            ],
+        }
+        output = trace_from_json(input, lazy=True)
+        assert output == trace_from_json(input)
+        assert output.states[1].values["y"] == frozenset()
+
+    def test_trace_from_json_compact(self):
+        """Test that a compact trace is equal to the trace of dictionaries"""
+        input = {
+            "#meta": {"varTypes": {"x": "Int", "y": "Set(Str)"}},
+            "params": ["p"],
+            "vars": ["x", "y"],
+            "states": [
+                {"p": 0, "x": {"#bigint": "1"}, "y": {"#set": ["a"]}},
+                {"p": 0, "x": {"#bigint": "2"}, "y": {"#set": []}, "z": "extra"},
+            ],
+        }
+        output = trace_from_json(input, compact=True)
+        assert output == trace_from_json(input)
+        values = output.states[1].values
+        assert isinstance(values, SlotValues)
+        assert list(values) == ["p", "x", "y", "z"]
+        assert values["z"] == "extra"
+        assert "z" not in output.states[0].values
+        assert output.states[0].values._index is values._index
+
+    def test_trace_from_json_lazy_and_compact(self):
+        """Test that the options lazy and compact are exclusive"""
+        with pytest.raises(ValueError):
+            trace_from_json({"vars": [], "states": []}, lazy=True, compact=True)
@@ -1,6 +1,14 @@
 from frozendict import frozendict
 
-from itf_py.itf import ImmutableList, ITFUnserializable, value_from_json
+from itf_py.itf import (
+    ImmutableList,
+    ITFUnserializable,
+    RecordClassCache,
+    ValuePool,
+    record_class_cache_clear,
+    record_class_cache_info,
+    value_from_json,
+)
 
 
 class TestValueFromJson:
@@ -135,3 +143,57 @@ class TestValueFromJson:
         """Test decoding unserializable values"""
         result = value_from_json({"#unserializable": "custom_object"})
         assert result == ITFUnserializable(value="custom_object")
+
+    def test_value_from_json_records_share_class(self):
+        """Test that records of the same shape share one class"""
+        r1 = value_from_json({"a": "f", "b": "g"})
+        r2 = value_from_json({"a": "h", "b": "i"})
+        assert type(r1) is type(r2)
+        v1 = value_from_json({"tag": "Banana", "value": {"length": 5}})
+        v2 = value_from_json({"tag": "Banana", "value": {"length": 6}})
+        assert type(v1) is type(v2)
+        assert type(v1) is not type(value_from_json({"tag": "Apple", "value": 1}))
+
+    def test_value_from_json_record_cache_info(self):
+        """Test the hit and miss counters of the record class cache"""
+        record_class_cache_clear()
+        value_from_json({"#set": [{"x": 1, "y": 2}, {"x": 3, "y": 4}]})
+        info = record_class_cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
+        assert info.currsize == 1
+
+    def test_record_class_cache_eviction(self):
+        """Test that the record class cache evicts the least recently used class"""
+        cache = RecordClassCache(maxsize=2)
+        a = cache.get("Rec", ("a",), False)
+        cache.get("Rec", ("b",), False)
+        assert cache.get("Rec", ("a",), False) is a
+        cache.get("Rec", ("c",), False)
+        assert cache.info().currsize == 2
+        # ("b",) was evicted, whereas ("a",) was recently used
+        assert cache.get("Rec", ("a",), False) is a
+        misses = cache.info().misses
+        cache.get("Rec", ("b",), False)
+        assert cache.info().misses == misses + 1
+
+    def test_value_from_json_interned(self):
+        """Test that equal values are interned as the same object"""
+        pool = ValuePool()
+        m = {"#map": [["a", {"#set": [{"#bigint": "1"}]}]]}
+        v1 = value_from_json({"x": m, "y": {"#tup": [m, 2]}}, pool)
+        v2 = value_from_json({"#tup": [m, 2]}, pool)
+        assert v1.x is v1.y[0]
+        assert v1.y is v2
+        assert v1.x == value_from_json(m)
+
+    def test_value_from_json_interned_keeps_types(self):
+        """Test that interning does not mix up equal values of different types"""
+        pool = ValuePool()
+        s1 = value_from_json({"#set": [1]}, pool)
+        s2 = value_from_json({"#set": [True]}, pool)
+        assert s1 is not s2
+        assert next(iter(s2)) is True
+        r = value_from_json({"a": 1}, pool)
+        t = value_from_json({"#tup": [1]}, pool)
+        assert type(r) is not type(t)
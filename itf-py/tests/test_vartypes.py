@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+from itf_py.itf import (
+    compile_decoder,
+    compile_var_decoders,
+    trace_from_json,
+    value_from_json,
+)
+from itf_py.vartypes import (
+    ConstType,
+    FunType,
+    OperType,
+    PrimType,
+    RecordType,
+    SeqType,
+    SetType,
+    TupleType,
+    VariantType,
+    VarType,
+    parse_type,
+)
+
+from .conftest import TFTP_TRACE
+
+INT = PrimType("Int")
+STR = PrimType("Str")
+
+
+class TestParseType:
+    """Test parsing Apalache types."""
+
+    def test_parse_simple_types(self):
+        """Test parsing primitive, uninterpreted types, and type variables"""
+        assert parse_type("Int") == INT
+        assert parse_type("Bool") == PrimType("Bool")
+        assert parse_type("PID") == ConstType("PID")
+        assert parse_type("a") == VarType("a")
+
+    def test_parse_collections(self):
+        """Test parsing sets, sequences, functions, and tuples"""
+        assert parse_type("Set(Int)") == SetType(INT)
+        assert parse_type("Seq(Str)") == SeqType(STR)
+        assert parse_type("(Str -> Set(Int))") == FunType(STR, SetType(INT))
+        assert parse_type("<<Str, Int>>") == TupleType((STR, INT))
+
+    def test_parse_records_and_variants(self):
+        """Test parsing records and variants"""
+        assert parse_type("{ a: Int, b: Str }") == RecordType((("a", INT), ("b", STR)))
+        assert parse_type("{ a: Int, r }") == RecordType((("a", INT),), "r")
+        assert parse_type("A({ x: Int }) | B(UNIT)") == VariantType(
+            (("A", RecordType((("x", INT),))), ("B", ConstType("UNIT")))
+        )
+
+    def test_parse_operators(self):
+        """Test parsing operator types"""
+        assert parse_type("(Int, Str) => Bool") == OperType(
+            (INT, STR), PrimType("Bool")
+        )
+        assert parse_type("() => Int") == OperType((), INT)
+
+    def test_parse_errors(self):
+        """Test that malformed types are rejected"""
+        for text in ["Set(Int", "{ a: }", "Int Str", "<<Int, >>>", "#"]:
+            with pytest.raises(ValueError):
+                parse_type(text)
+
+
+class TestCompileDecoder:
+    """Test decoding values according to their types."""
+
+    def test_decode_collections(self):
+        """Test that typed decoding agrees with value_from_json"""
+        cases = [
+            ("Int", {"#bigint": "123456789012345678901234567890"}),
+            ("Set(Int)", {"#set": [{"#bigint": "1"}, {"#bigint": "2"}]}),
+            ("Seq(Str)", ["a", "b"]),
+            ("(Str -> Int)", {"#map": [["a", {"#bigint": "1"}]]}),
+            ("<<Str, Int>>", {"#tup": ["a", {"#bigint": "1"}]}),
+            ("{ a: Int, b: Str }", {"a": {"#bigint": "1"}, "b": "x"}),
+        ]
+        for text, val in cases:
+            expected = value_from_json(val)
+            result = compile_decoder(parse_type(text))(val)
+            assert result == expected
+            assert type(result) is type(expected)
+
+    def test_decode_variants(self):
+        """Test decoding tagged unions"""
+        decode = compile_decoder(parse_type("A({ x: Int }) | B(UNIT)"))
+        a = {"tag": "A", "value": {"x": {"#bigint": "1"}}}
+        b = {"tag": "B", "value": "u_OF_UNIT"}
+        for val in [a, b]:
+            result = decode(val)
+            assert type(result) is type(value_from_json(val))
+            assert result == value_from_json(val)
+        assert decode(a).x == 1
+        assert decode(b).value == "u_OF_UNIT"
+
+    def test_decode_unexpected_shape(self):
+        """Test that values not matching the type fall back to value_from_json"""
+        decode = compile_decoder(parse_type("{ a: Int, r }"))
+        val = {"a": {"#bigint": "1"}, "b": "x"}
+        assert decode(val) == value_from_json(val)
+        decode = compile_decoder(parse_type("<<Str, Int>>"))
+        for val in [{"#tup": ["a", 1, "extra"]}, {"#tup": ["a"]}]:
+            assert decode(val) == value_from_json(val)
+
+    def test_decode_unserializable(self):
+        """Test that unserializable values of any type are decoded as by
+        value_from_json"""
+        val = {"#unserializable": "Nat"}
+        texts = [
+            "Int",
+            "Bool",
+            "Set(Int)",
+            "Seq(Int)",
+            "(Str -> Int)",
+            "<<Str, Int>>",
+            "{ a: Int }",
+            "A(Int) | B(UNIT)",
+        ]
+        for text in texts:
+            assert compile_decoder(parse_type(text))(val) == value_from_json(val)
+        decode = compile_decoder(parse_type("Seq(Set(Int))"))
+        assert decode([val]) == value_from_json([val])
+        data = {
+            "#meta": {"varTypes": {"x": "Set(Int)"}},
+            "vars": ["x"],
+            "states": [{"x": val}],
+        }
+        assert trace_from_json(data) == trace_from_json(data, use_var_types=False)
+
+    def test_compile_var_decoders_skips_bad_types(self):
+        """Test that variables with unparseable types are left out"""
+        decoders = compile_var_decoders({"varTypes": {"x": "Int", "y": "Set("}})
+        assert set(decoders.keys()) == {"x"}
+
+    def test_trace_from_json_with_var_types(self):
+        """Test that typed and generic decoding of the TFTP example agree"""
+        with open(TFTP_TRACE, "r") as f:
+            data = json.load(f)
+        typed = trace_from_json(data)
+        generic = trace_from_json(data, use_var_types=False)
+        assert typed == generic